@@ -1,22 +1,47 @@
 """
 API Routes with enhanced features
 """
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Query as QueryParam
-from fastapi.responses import JSONResponse
+from fastapi import (
+    APIRouter, UploadFile, File, HTTPException, Depends, Header, Request, Response, Query as QueryParam
+)
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
+import anyio
+import asyncio
+import json
+import math
+import os
 import time
+import uuid
+import zipfile
 from datetime import datetime
 from typing import Optional, List
 
-from services.pdf_processor import process_pdf
-from services.vector_service import search_vector_db
-from services.llm_service import ask_llm
+from services.pdf_processor import UploadTooLarge, spool_fileobj, spool_upload
+from services.ingest_queue import (
+    IngestQueueFull, enqueue_ingest, find_pending_job, free_slots, get_job_progress, ingest_owner, upload_path
+)
+from services.upload_sessions import (
+    UploadBodyMismatch, UploadRangeError, UploadSessionNotFound, complete_session, create_session,
+    discard_session, finish_session, get_session, write_range
+)
+from services.vector_service import search_vector_db, search_vector_db_batch, get_doc_id_by_hash
+from services.llm_service import (
+    LLM_DISABLED_MESSAGE, LLM_ERROR_MESSAGE, LLMUnavailable, ask_llm_async, llm_stats, stream_llm
+)
+from services.answer_cache import (
+    get_answer, hit_rate, make_key, normalize_question, set_answer, source_doc_ids
+)
+from services.single_flight import SingleFlight
+from services.context_builder import build_context
+from services.reindex import ReindexInProgress, reindex_all
 from models.schemas import (
-    QuestionRequest, QuestionResponse, DocumentUploadResponse,
-    HealthCheck, StatsResponse, DocumentInfo, QueryHistory
+    QuestionRequest, QuestionResponse, BatchQuestionResponse, DocumentUploadResponse,
+    HealthCheck, StatsResponse, DocumentInfo, QueryHistory, IngestStatus, ReindexResponse,
+    BatchUploadItem, BatchUploadResponse, UploadSessionInfo
 )
-from db.database import get_db
+from db.database import AsyncSessionLocal, get_db
 from db.models import Document, Query
 from config.settings import settings
 from utils.logger import logger
@@ -25,6 +50,61 @@ router = APIRouter()
 
 # ============= Question Answering =============
 
+NO_RESULTS_MESSAGE = "No relevant documents found. Please upload PDFs first."
+
+_ask_flight = SingleFlight()  # coalesces identical concurrent /ask requests
+
+def _llm_failed(answer: str) -> bool:
+    """The LLM answered with the disabled / error placeholder instead of an answer"""
+    return answer in (LLM_DISABLED_MESSAGE, LLM_ERROR_MESSAGE)
+
+def _cacheable(answer: str) -> bool:
+    """Real answers only; never cache the disabled / error placeholders"""
+    return bool(answer) and not _llm_failed(answer)
+
+def _retry_after(e: LLMUnavailable) -> str:
+    """Retry-After header value (whole seconds, at least 1)"""
+    return str(max(1, math.ceil(e.retry_after)))
+
+def _build_prompt(question: str, context: str) -> str:
+    """RAG prompt: assembled context, then the question"""
+    return f"""You are an academic assistant. Answer the question using ONLY the context below.
+If the answer is not in the context, say "I don't know based on the provided documents."
+
+Context:
+{context}
+
+Question:
+{question}
+
+Answer:"""
+
+async def _answer_question(question: str, k: int, scope: List[str]) -> dict:
+    """Retrieval, answer cache and LLM call for one question (shared by coalesced callers)"""
+    # Search vector database (scoped to the requested documents, if any);
+    # off the event loop, since query embedding and scoring are CPU-bound
+    context_chunks = await asyncio.to_thread(search_vector_db, question, k=k, doc_id=scope or None)
+    if not context_chunks:
+        return {"sources": [], "answer": None, "cached": False}
+    return await _generate_answer(question, k, scope, context_chunks)
+
+async def _generate_answer(question: str, k: int, scope: List[str], context_chunks: List[dict]) -> dict:
+    """Answer cache and LLM call for retrieved chunks"""
+    # Same question over the same context: reuse the answer
+    cache_key = make_key(question, k, scope, context_chunks)
+    cached = await get_answer(cache_key)
+    if cached:
+        logger.info("⚡ Answer served from cache")
+        return {"sources": context_chunks, "answer": cached["answer"], "cached": True}
+    
+    # Build context (merged, deduplicated, within the token budget) and get LLM response
+    context, context_stats = build_context(context_chunks)
+    logger.info(f"🤖 Calling LLM ({context_stats['tokens']} context tokens, {context_stats['tokens_saved']} saved)...")
+    answer = await ask_llm_async(_build_prompt(question, context))
+    if _cacheable(answer):
+        await set_answer(cache_key, {"answer": answer}, source_doc_ids(context_chunks))
+    return {"sources": context_chunks, "answer": answer, "cached": False, "context": context_stats}
+
 @router.post(
     "/ask",
     response_model=QuestionResponse,
@@ -36,6 +116,7 @@ async def ask_question(
     question: str = QueryParam(..., min_length=3, max_length=1000, description="Your question"),
     k: int = QueryParam(default=5, ge=1, le=20, description="Number of context chunks to retrieve"),
     doc_id: Optional[str] = QueryParam(None, description="Search in specific document"),
+    doc_ids: Optional[List[str]] = QueryParam(None, description="Search in several documents"),
     db: AsyncSession = Depends(get_db)
 ):
     """Ask a question and get RAG-based answer"""
@@ -44,8 +125,13 @@ async def ask_question(
     try:
         logger.info(f"📝 Question received: {question[:100]}...")
         
-        # 1️⃣ Search vector database
-        context_chunks = search_vector_db(question, k=k, doc_id=doc_id)
+        # 1️⃣ Retrieve and answer; identical questions in flight share one retrieval + LLM call
+        scope = ([doc_id] if doc_id else []) + (doc_ids or [])
+        flight_key = (normalize_question(question), k, tuple(sorted(scope)))
+        result, shared = await _ask_flight.do(flight_key, lambda: _answer_question(question, k, scope))
+        if shared:
+            logger.info("🔗 Joined an identical question already in flight")
+        context_chunks, answer = result["sources"], result["answer"]
         
         if not context_chunks:
             # Save query to database
@@ -61,7 +147,7 @@ async def ask_question(
             
             return QuestionResponse(
                 status="no_results",
-                message="No relevant documents found. Please upload PDFs first.",
+                message=NO_RESULTS_MESSAGE,
                 question=question,
                 answer=None,
                 sources=[],
@@ -69,26 +155,15 @@ async def ask_question(
                 response_time=time.time() - start_time
             )
         
-        # 2️⃣ Build context
-        context = "\n\n".join([chunk["content"] for chunk in context_chunks])
-        
-        # 3️⃣ Create RAG prompt
-        prompt = f"""You are an academic assistant. Answer the question using ONLY the context below.
-If the answer is not in the context, say "I don't know based on the provided documents."
-
-Context:
-{context}
-
-Question:
-{question}
-
-Answer:"""
-        
-        # 4️⃣ Get LLM response
-        logger.info("🤖 Calling LLM...")
-        answer = ask_llm(prompt)
+        # the placeholder is not an answer: record it as an error and answer 503
+        if _llm_failed(answer):
+            logger.warning(f"⚠️ {answer}; no answer generated")
+            db.add(Query(question=question, k_value=k, doc_id=doc_id, status="error",
+                         error_message=answer, response_time=time.time() - start_time))
+            await db.commit()
+            raise HTTPException(status_code=503, detail=f"{answer}, no answer generated")
         
-        # 5️⃣ Save to database
+        # 2️⃣ Save to database (one row per caller, coalesced or not)
         query_record = Query(
             question=question,
             answer=answer,
@@ -109,9 +184,29 @@ Answer:"""
             answer=answer.strip(),
             sources=context_chunks,
             count=len(context_chunks),
-            response_time=time.time() - start_time
+            response_time=time.time() - start_time,
+            cached=result["cached"],
+            context_tokens=result.get("context", {}).get("tokens"),
+            tokens_saved=result.get("context", {}).get("tokens_saved")
         )
         
+    except LLMUnavailable as e:
+        logger.warning(f"⏳ {e}; rejecting question")
+        try:
+            db.add(Query(question=question, k_value=k, doc_id=doc_id, status="error",
+                         error_message=str(e), response_time=time.time() - start_time))
+            await db.commit()
+        except Exception:
+            pass
+        raise HTTPException(
+            status_code=503,
+            detail=f"{e}, retry later",
+            headers={"Retry-After": _retry_after(e)}
+        )
+        
+    except HTTPException:
+        raise
+        
     except Exception as e:
         logger.error(f"❌ Error in ask endpoint: {e}", exc_info=True)
         
@@ -135,21 +230,369 @@ Answer:"""
             detail=f"Error answering question: {str(e)}"
         )
 
+def _sse(event: str, data: dict) -> str:
+    """One Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+async def _record_query(**fields) -> Optional[int]:
+    """Insert a Query row outside the request session (streams outlive it)"""
+    async with AsyncSessionLocal() as session:
+        record = Query(**fields)
+        session.add(record)
+        await session.commit()
+        return record.id
+
+@router.post(
+    "/ask/stream",
+    tags=["RAG"],
+    summary="Ask a question (streaming)",
+    description="Server-Sent Events: a `sources` event, then `token` events as the answer is "
+                "generated, then `done` (or `error`)",
+    response_class=StreamingResponse
+)
+async def ask_question_stream(
+    question: str = QueryParam(..., min_length=3, max_length=1000, description="Your question"),
+    k: int = QueryParam(default=5, ge=1, le=20, description="Number of context chunks to retrieve"),
+    doc_id: Optional[str] = QueryParam(None, description="Search in specific document"),
+    doc_ids: Optional[List[str]] = QueryParam(None, description="Search in several documents")
+):
+    """Stream a RAG answer; the Query row is written once the stream ends"""
+    start_time = time.time()
+    logger.info(f"📝 Streaming question received: {question[:100]}...")
+    
+    scope = ([doc_id] if doc_id else []) + (doc_ids or [])
+    try:
+        context_chunks = await asyncio.to_thread(search_vector_db, question, k=k, doc_id=scope or None)
+    except Exception as e:
+        logger.error(f"❌ Error in ask stream endpoint: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error answering question: {str(e)}")
+    
+    async def events():
+        tokens: List[str] = []
+        context_stats = {}
+        first_token_time = None
+        record = {"question": question, "k_value": k, "doc_id": doc_id, "chunks_used": len(context_chunks),
+                  "status": "cancelled", "error_message": "Client disconnected"}
+        recorded = False
+        try:
+            yield _sse("sources", {"sources": context_chunks, "count": len(context_chunks)})
+            
+            if not context_chunks:
+                record.update(status="no_results", error_message=None, response_time=time.time() - start_time)
+                query_id = await _record_query(**record)
+                recorded = True
+                yield _sse("done", {"status": "no_results", "message": NO_RESULTS_MESSAGE,
+                                    "response_time": record["response_time"], "query_id": query_id})
+                return
+            
+            cache_key = make_key(question, k, scope, context_chunks)
+            cached = await get_answer(cache_key)
+            if cached:
+                # a cached answer arrives as a single token
+                first_token_time = time.time() - start_time
+                tokens.append(cached["answer"])
+                yield _sse("token", {"text": cached["answer"]})
+            else:
+                context, context_stats = build_context(context_chunks)
+                async for token in stream_llm(_build_prompt(question, context)):
+                    if not tokens and _llm_failed(token):
+                        # the disabled / error placeholder arrives as the only token; it is not an answer
+                        record.update(status="error", error_message=token, response_time=time.time() - start_time)
+                        await _record_query(**record)
+                        recorded = True
+                        logger.warning(f"⚠️ {token}; no answer generated")
+                        yield _sse("error", {"detail": f"{token}, no answer generated"})
+                        return
+                    if first_token_time is None:
+                        first_token_time = time.time() - start_time
+                    tokens.append(token)
+                    yield _sse("token", {"text": token})
+                if _cacheable("".join(tokens)):
+                    await set_answer(cache_key, {"answer": "".join(tokens)}, source_doc_ids(context_chunks))
+            
+            answer = "".join(tokens).strip()
+            record.update(answer=answer, status="success", error_message=None,
+                          response_time=time.time() - start_time)
+            query_id = await _record_query(**record)
+            recorded = True
+            logger.info(f"✅ Question streamed in {record['response_time']:.2f}s "
+                        f"(first token {first_token_time or 0:.2f}s)")
+            yield _sse("done", {"status": "success", "response_time": record["response_time"],
+                                "first_token_time": first_token_time, "query_id": query_id,
+                                "cached": cached is not None,
+                                "context_tokens": context_stats.get("tokens"),
+                                "tokens_saved": context_stats.get("tokens_saved")})
+        
+        except LLMUnavailable as e:
+            # headers are already sent, so the refusal arrives as an error event
+            logger.warning(f"⏳ {e}; rejecting streamed question")
+            record.update(status="error", error_message=str(e))
+            yield _sse("error", {"detail": f"{e}, retry later", "retry_after": int(_retry_after(e))})
+        
+        except Exception as e:
+            logger.error(f"❌ Error in ask stream endpoint: {e}", exc_info=True)
+            record.update(status="error", error_message=str(e))
+            yield _sse("error", {"detail": f"Error answering question: {str(e)}"})
+        
+        finally:
+            if not recorded:
+                # also runs when the client disconnects and the stream is cancelled
+                record.update(answer="".join(tokens) or None, response_time=time.time() - start_time)
+                with anyio.CancelScope(shield=True):
+                    try:
+                        await _record_query(**record)
+                    except Exception as e:
+                        logger.error(f"❌ Could not record streamed query: {e}")
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # identity encoding keeps GZipMiddleware from buffering tokens
+        headers={"Cache-Control": "no-cache", "Content-Encoding": "identity", "X-Accel-Buffering": "no"}
+    )
+
+@router.post(
+    "/ask/batch",
+    response_model=BatchQuestionResponse,
+    tags=["RAG"],
+    summary="Ask many questions",
+    description="Answer a list of questions in one call; results keep the request order"
+)
+async def ask_batch(
+    questions: List[QuestionRequest],
+    db: AsyncSession = Depends(get_db)
+):
+    """Retrieve for every question in one pass, generate concurrently and record all rows in one commit"""
+    start_time = time.time()
+    limit = settings.ASK_BATCH_MAX_QUESTIONS
+    accepted = questions[:limit]
+    scopes = [([request.doc_id] if request.doc_id else []) + (request.doc_ids or []) for request in accepted]
+    logger.info(f"📝 Batch of {len(questions)} questions received")
+    
+    # 1️⃣ Retrieval for every question in one pass over the index
+    try:
+        sources = await asyncio.to_thread(
+            search_vector_db_batch,
+            [request.question for request in accepted],
+            [request.k for request in accepted],
+            [scope or None for scope in scopes]
+        )
+    except Exception as e:
+        logger.error(f"❌ Error in ask batch endpoint: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error answering questions: {str(e)}")
+    
+    # 2️⃣ Generate concurrently, at most ASK_BATCH_CONCURRENCY LLM calls at once;
+    #    repeated questions in the batch share one call
+    limiter = asyncio.Semaphore(settings.ASK_BATCH_CONCURRENCY)
+    flight = SingleFlight()
+    
+    async def generate(i: int) -> dict:
+        async with limiter:
+            return await _generate_answer(accepted[i].question, accepted[i].k, scopes[i], sources[i])
+    
+    async def answer(i: int) -> QuestionResponse:
+        request, context_chunks = accepted[i], sources[i]
+        item = {"question": request.question, "sources": context_chunks, "count": len(context_chunks)}
+        if not context_chunks:
+            return QuestionResponse(status="no_results", message=NO_RESULTS_MESSAGE,
+                                    response_time=time.time() - start_time, **item)
+        try:
+            flight_key = (normalize_question(request.question), request.k, tuple(sorted(scopes[i])))
+            result, _ = await flight.do(flight_key, lambda: generate(i))
+        except LLMUnavailable as e:
+            return QuestionResponse(status="error", message=f"{e}, retry later",
+                                    response_time=time.time() - start_time, **item)
+        except Exception as e:
+            logger.error(f"❌ Error answering batch question {i}: {e}")
+            return QuestionResponse(status="error", message=f"Error answering question: {str(e)}",
+                                    response_time=time.time() - start_time, **item)
+        if _llm_failed(result["answer"]):
+            return QuestionResponse(status="error", message=f"Error answering question: {result['answer']}",
+                                    response_time=time.time() - start_time, **item)
+        return QuestionResponse(
+            status="success",
+            answer=result["answer"].strip(),
+            response_time=time.time() - start_time,
+            cached=result["cached"],
+            context_tokens=result.get("context", {}).get("tokens"),
+            tokens_saved=result.get("context", {}).get("tokens_saved"),
+            **item
+        )
+    
+    results = list(await asyncio.gather(*(answer(i) for i in range(len(accepted)))))
+    results += [QuestionResponse(status="rejected", question=request.question,
+                                 message=f"More than {limit} questions in batch")
+                for request in questions[limit:]]
+    
+    # 3️⃣ Record every answered question in one commit
+    db.add_all([
+        Query(
+            question=item.question,
+            answer=item.answer,
+            k_value=request.k,
+            doc_id=request.doc_id,
+            chunks_used=item.count if item.status == "success" else None,
+            status=item.status,
+            error_message=item.message if item.status == "error" else None,
+            response_time=item.response_time
+        )
+        for request, item in zip(accepted, results)
+    ])
+    await db.commit()
+    
+    counts = {status: sum(1 for item in results if item.status == status)
+              for status in ("success", "no_results", "error", "rejected")}
+    logger.info(f"✅ Batch of {len(questions)} questions answered in {time.time() - start_time:.2f}s "
+                f"({counts['success']} answered, {counts['error']} failed)")
+    
+    return BatchQuestionResponse(
+        questions=len(questions),
+        answered=counts["success"],
+        no_results=counts["no_results"],
+        failed=counts["error"],
+        rejected=counts["rejected"],
+        results=results,
+        response_time=time.time() - start_time
+    )
+
 # ============= Document Upload =============
 
+async def _find_existing_document(db: AsyncSession, pdf_hash: str) -> Optional[Document]:
+    """
+    Completed document with this content hash.
+    The in-memory hash index also knows documents that are still (or were
+    never fully) ingested, so it only picks which completed row is preferred.
+    """
+    query = select(Document).where(Document.pdf_hash == pdf_hash, Document.status == "completed")
+    doc_id = get_doc_id_by_hash(pdf_hash)
+    if doc_id:
+        query = query.order_by((Document.doc_id == doc_id).desc())
+    result = await db.execute(query.limit(1))
+    return result.scalars().first()
+
+def _spool_path() -> str:
+    return os.path.join(settings.UPLOAD_DIR, f".{uuid.uuid4()}.part")
+
+def _discard(path: str):
+    """Remove a spool file that will not be ingested"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+async def _queue_spooled_upload(
+    db: AsyncSession,
+    response: Response,
+    spool_path: str,
+    pdf_hash: str,
+    file_size: int,
+    filename: str,
+    start_time: float
+) -> DocumentUploadResponse:
+    """
+    Dedupe a fully spooled upload, then record and queue it.
+    The spool file is moved into place or removed; when the upload is not
+    queued (503 on a full queue, or any error) it is moved back to
+    spool_path for the caller to keep or discard.
+    """
+    # Short-circuit byte-identical re-uploads before parsing
+    existing = await _find_existing_document(db, pdf_hash)
+    if existing:
+        await asyncio.to_thread(_discard, spool_path)
+        logger.info(f"♻️ Duplicate upload of {existing.doc_id} ({filename})")
+        response.status_code = 200
+        return DocumentUploadResponse(
+            status="duplicate",
+            doc_id=existing.doc_id,
+            pdf_hash=pdf_hash,
+            filename=existing.filename,
+            pages=existing.pages,
+            chunks=existing.chunks,
+            chunk_size=existing.chunk_size,
+            processing_time=time.time() - start_time,
+            message="Document already uploaded"
+        )
+    
+    # Same content still being ingested: point the caller at that job
+    pending = find_pending_job(pdf_hash)
+    if pending:
+        await asyncio.to_thread(_discard, spool_path)
+        return DocumentUploadResponse(
+            status="processing",
+            doc_id=pending["doc_id"],
+            pdf_hash=pdf_hash,
+            filename=pending["filename"],
+            processing_time=time.time() - start_time,
+            message="Document is already being processed"
+        )
+    
+    # Keep the spooled file; the worker (or a restart) parses it from disk
+    doc_id = str(uuid.uuid4())
+    path = upload_path(doc_id)
+    await asyncio.to_thread(os.replace, spool_path, path)
+    
+    doc_record = Document(
+        doc_id=doc_id,
+        filename=filename,
+        pdf_hash=pdf_hash,
+        file_size=file_size,
+        pages=0,
+        chunks=0,
+        chunk_size=0,
+        status="processing",
+        claimed_by=ingest_owner()
+    )
+    committed = False
+    try:
+        db.add(doc_record)
+        await db.commit()
+        committed = True
+        enqueue_ingest(doc_id, path, pdf_hash, filename)
+    except Exception as e:
+        # nothing was queued: drop the row and hand the file back
+        await asyncio.to_thread(os.replace, path, spool_path)
+        if committed:
+            await db.delete(doc_record)
+            await db.commit()
+        else:
+            await db.rollback()
+        if not isinstance(e, IngestQueueFull):
+            raise
+        logger.warning(f"⏳ {e}; rejecting {filename}")
+        raise HTTPException(
+            status_code=503,
+            detail="Ingest queue is full, retry later",
+            headers={"Retry-After": str(settings.INGEST_RETRY_AFTER_SECONDS)}
+        )
+    
+    logger.info(f"📄 Queued PDF: {filename} ({file_size / 1024 / 1024:.2f}MB) as {doc_id}")
+    
+    return DocumentUploadResponse(
+        status="processing",
+        doc_id=doc_id,
+        pdf_hash=pdf_hash,
+        filename=filename,
+        processing_time=time.time() - start_time,
+        message="Queued for processing"
+    )
+
 @router.post(
     "/upload",
     response_model=DocumentUploadResponse,
+    status_code=202,
     tags=["Documents"],
     summary="Upload PDF",
-    description="Upload and process a PDF document"
+    description="Upload a PDF and queue it for background processing; "
+                "poll /documents/{doc_id}/status for progress"
 )
 async def upload_pdf(
+    response: Response,
     file: UploadFile = File(..., description="PDF file to upload"),
     db: AsyncSession = Depends(get_db)
 ):
-    """Upload and process PDF document"""
+    """Persist the PDF, record it as processing and hand it to the ingest queue"""
     start_time = time.time()
+    spool_path = None
     
     try:
         # Validate file type
@@ -159,82 +602,377 @@ async def upload_pdf(
                 detail="Only PDF files are allowed"
             )
         
-        # Check file size
-        file_size = 0
-        file_bytes = await file.read()
-        file_size = len(file_bytes)
-        await file.seek(0)  # Reset file pointer
-        
+        # Reject oversize bodies before reading them when the size is known
         max_size = settings.MAX_FILE_SIZE_MB * 1024 * 1024
-        if file_size > max_size:
+        if file.size is not None and file.size > max_size:
             raise HTTPException(
                 status_code=400,
                 detail=f"File too large. Max size: {settings.MAX_FILE_SIZE_MB}MB"
             )
         
-        logger.info(f"📄 Processing PDF: {file.filename} ({file_size / 1024 / 1024:.2f}MB)")
+        # Stream to a spool file, hashing and size-checking block by block
+        os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+        spool_path = _spool_path()
+        try:
+            pdf_hash, file_size = await spool_upload(file, spool_path, max_size)
+        except UploadTooLarge:
+            raise HTTPException(
+                status_code=400,
+                detail=f"File too large. Max size: {settings.MAX_FILE_SIZE_MB}MB"
+            )
+        
+        return await _queue_spooled_upload(db, response, spool_path, pdf_hash, file_size,
+                                           file.filename, start_time)
+        
+    except HTTPException:
+        if spool_path:
+            await asyncio.to_thread(_discard, spool_path)
+        raise
+    except Exception as e:
+        logger.error(f"❌ Error uploading PDF: {e}", exc_info=True)
+        if spool_path:
+            await asyncio.to_thread(_discard, spool_path)
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error processing PDF: {str(e)}"
+        )
+
+def _spool_zip(zip_path: str, max_size: int, limit: int) -> List[dict]:
+    """Stream each PDF member of a zip archive to its own spool file (runs in a thread)"""
+    items = []
+    spooled = 0
+    with zipfile.ZipFile(zip_path) as archive:
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+            item = {"filename": os.path.basename(info.filename)}
+            items.append(item)
+            if not info.filename.lower().endswith(".pdf"):
+                item.update(status="rejected", message="Only PDF files are allowed")
+                continue
+            if spooled >= limit:
+                item.update(status="rejected", message=f"More than {settings.BATCH_UPLOAD_MAX_FILES} files in batch")
+                continue
+            path = _spool_path()
+            try:
+                with archive.open(info) as member:
+                    item["pdf_hash"], item["file_size"] = spool_fileobj(member, path, max_size)
+            except UploadTooLarge:
+                item.update(status="rejected", message=f"File too large. Max size: {settings.MAX_FILE_SIZE_MB}MB")
+                continue
+            item["spool_path"] = path
+            spooled += 1
+    return items
+
+@router.post(
+    "/upload/batch",
+    response_model=BatchUploadResponse,
+    status_code=202,
+    tags=["Documents"],
+    summary="Upload several PDFs",
+    description="Upload PDFs and/or zip archives of PDFs in one request; "
+                "each new file is queued like /upload and reported per item"
+)
+async def upload_batch(
+    response: Response,
+    files: List[UploadFile] = File(..., description="PDF files or .zip archives"),
+    db: AsyncSession = Depends(get_db)
+):
+    """Spool every file, drop duplicates, insert rows in one commit and queue what fits"""
+    start_time = time.time()
+    max_size = settings.MAX_FILE_SIZE_MB * 1024 * 1024
+    limit = settings.BATCH_UPLOAD_MAX_FILES
+    os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+    items: List[dict] = []
+    
+    try:
+        # 1️⃣ Spool every PDF (zip members included) to disk, hashing as it streams
+        for file in files:
+            name = file.filename or ""
+            spooled = sum(1 for item in items if "spool_path" in item)
+            if name.lower().endswith(".zip"):
+                zip_path = _spool_path()
+                try:
+                    await spool_upload(file, zip_path, max_size * limit)
+                    items += await asyncio.to_thread(_spool_zip, zip_path, max_size, limit - spooled)
+                except UploadTooLarge:
+                    items.append({"filename": name, "status": "rejected", "message": "Zip archive too large"})
+                except zipfile.BadZipFile:
+                    items.append({"filename": name, "status": "rejected", "message": "Not a valid zip archive"})
+                finally:
+                    await asyncio.to_thread(_discard, zip_path)
+                continue
+            item = {"filename": name}
+            items.append(item)
+            if not name.lower().endswith(".pdf"):
+                item.update(status="rejected", message="Only PDF files are allowed")
+                continue
+            if spooled >= limit:
+                item.update(status="rejected", message=f"More than {limit} files in batch")
+                continue
+            path = _spool_path()
+            try:
+                item["pdf_hash"], item["file_size"] = await spool_upload(file, path, max_size)
+            except UploadTooLarge:
+                item.update(status="rejected", message=f"File too large. Max size: {settings.MAX_FILE_SIZE_MB}MB")
+                continue
+            item["spool_path"] = path
+        
+        # 2️⃣ Duplicates: completed documents, running jobs, earlier files of this batch
+        spooled_items = [item for item in items if "spool_path" in item]
+        hashes = list({item["pdf_hash"] for item in spooled_items})
+        completed = {}
+        if hashes:
+            result = await db.execute(
+                select(Document.pdf_hash, Document.doc_id)
+                .where(Document.pdf_hash.in_(hashes), Document.status == "completed")
+            )
+            completed = dict(result.all())
+        seen = {}
+        new_items = []
+        for item in spooled_items:
+            pdf_hash = item["pdf_hash"]
+            pending = find_pending_job(pdf_hash)
+            doc_id = completed.get(pdf_hash) or (pending["doc_id"] if pending else None) or seen.get(pdf_hash)
+            if doc_id:
+                await asyncio.to_thread(_discard, item.pop("spool_path"))
+                item.update(status="duplicate", doc_id=doc_id, message="Document already uploaded")
+                continue
+            item["doc_id"] = seen[pdf_hash] = str(uuid.uuid4())
+            new_items.append(item)
         
-        # Process PDF
-        result = await process_pdf(file)
+        # 3️⃣ Queue what fits; the rest is refused like a full-queue /upload
+        slots = free_slots()
+        accepted, overflow = new_items[:slots], new_items[slots:]
+        for item in overflow:
+            await asyncio.to_thread(_discard, item.pop("spool_path"))
+            item.update(status="rejected", doc_id=None, message="Ingest queue is full, retry later")
         
-        if result["status"] == "error":
-            # Save error to database
-            doc_record = Document(
-                doc_id=result.get("doc_id", "error"),
-                filename=file.filename,
-                pdf_hash=result.get("pdf_hash", "error"),
-                file_size=file_size,
+        rows = []
+        for item in accepted:
+            await asyncio.to_thread(os.replace, item.pop("spool_path"), upload_path(item["doc_id"]))
+            rows.append(Document(
+                doc_id=item["doc_id"],
+                filename=item["filename"],
+                pdf_hash=item["pdf_hash"],
+                file_size=item["file_size"],
                 pages=0,
                 chunks=0,
                 chunk_size=0,
-                status="failed",
-                error_message=result.get("message"),
-                processing_time=time.time() - start_time
-            )
-            db.add(doc_record)
+                status="processing",
+                claimed_by=ingest_owner()
+            ))
+        if rows:
+            db.add_all(rows)
             await db.commit()
-            
-            raise HTTPException(
-                status_code=500,
-                detail=result["message"]
-            )
         
-        # Save to database
-        doc_record = Document(
-            doc_id=result["doc_id"],
-            filename=file.filename,
-            pdf_hash=result["pdf_hash"],
-            file_size=file_size,
-            pages=result["pages"],
-            chunks=result["chunks"],
-            chunk_size=result["chunk_size"],
-            status="completed",
-            processing_time=time.time() - start_time
-        )
-        db.add(doc_record)
+        for item, row in zip(accepted, rows):
+            try:
+                enqueue_ingest(item["doc_id"], upload_path(item["doc_id"]), item["pdf_hash"], item["filename"])
+                item.update(status="processing", message="Queued for processing")
+            except IngestQueueFull:
+                await db.delete(row)
+                await asyncio.to_thread(_discard, upload_path(item["doc_id"]))
+                item.update(status="rejected", doc_id=None, message="Ingest queue is full, retry later")
         await db.commit()
         
-        logger.info(f"✅ PDF processed successfully in {time.time() - start_time:.2f}s")
+        counts = {status: sum(1 for item in items if item["status"] == status)
+                  for status in ("processing", "duplicate", "rejected")}
+        if any(item.get("message") == "Ingest queue is full, retry later" for item in items):
+            response.headers["Retry-After"] = str(settings.INGEST_RETRY_AFTER_SECONDS)
+        logger.info(f"📦 Batch upload: {counts['processing']} queued, {counts['duplicate']} duplicates, "
+                    f"{counts['rejected']} rejected")
         
-        return DocumentUploadResponse(
-            status="success",
-            doc_id=result["doc_id"],
-            pdf_hash=result["pdf_hash"],
-            filename=file.filename,
-            pages=result["pages"],
-            chunks=result["chunks"],
-            chunk_size=result["chunk_size"],
+        return BatchUploadResponse(
+            files=len(items),
+            queued=counts["processing"],
+            duplicates=counts["duplicate"],
+            rejected=counts["rejected"],
+            items=[BatchUploadItem(**{key: item.get(key) for key in BatchUploadItem.model_fields})
+                   for item in items],
             processing_time=time.time() - start_time
         )
         
-    except HTTPException:
-        raise
     except Exception as e:
-        logger.error(f"❌ Error uploading PDF: {e}", exc_info=True)
+        logger.error(f"❌ Error in batch upload: {e}", exc_info=True)
+        for item in items:
+            if "spool_path" in item:
+                await asyncio.to_thread(_discard, item["spool_path"])
         raise HTTPException(
             status_code=500,
-            detail=f"Error processing PDF: {str(e)}"
+            detail=f"Error processing batch: {str(e)}"
+        )
+
+@router.get(
+    "/documents/{doc_id}/status",
+    response_model=IngestStatus,
+    tags=["Documents"],
+    summary="Ingestion status",
+    description="Progress of a queued or processing upload"
+)
+async def get_document_status(doc_id: str, db: AsyncSession = Depends(get_db)):
+    """Live progress while ingesting, the Document row once finished"""
+    job = get_job_progress(doc_id)
+    if job:
+        return IngestStatus(
+            doc_id=doc_id,
+            filename=job["filename"],
+            status=job["status"],
+            pages_total=job["pages_total"],
+            pages_done=job["pages_done"],
+            chunks_indexed=job["chunks_indexed"],
+            error=job["error"],
+            timings=job["timings"]
+        )
+    
+    result = await db.execute(select(Document).where(Document.doc_id == doc_id))
+    doc = result.scalars().first()
+    if doc is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return IngestStatus(
+        doc_id=doc.doc_id,
+        filename=doc.filename,
+        status=doc.status,
+        pages_total=doc.pages or None,
+        pages_done=doc.pages,
+        chunks_indexed=doc.chunks,
+        error=doc.error_message,
+        processing_time=doc.processing_time,
+        timings=doc.timings
+    )
+
+# ============= Resumable Upload =============
+
+def _session_info(session: dict) -> UploadSessionInfo:
+    return UploadSessionInfo(
+        upload_id=session["upload_id"],
+        filename=session["filename"],
+        size=session["size"],
+        offset=session["offset"],
+        expires_at=datetime.fromtimestamp(session["expires_at"])
+    )
+
+def _range_conflict(e: UploadRangeError) -> HTTPException:
+    """409 carrying the offset the client should resume from"""
+    return HTTPException(status_code=409, detail=str(e), headers={"Upload-Offset": str(e.offset)})
+
+@router.post(
+    "/upload/sessions",
+    response_model=UploadSessionInfo,
+    status_code=201,
+    tags=["Documents"],
+    summary="Start resumable upload",
+    description="Create an upload session, then PUT byte ranges and POST .../complete"
+)
+async def create_upload_session(
+    filename: str = QueryParam(..., description="Name of the PDF being uploaded"),
+    size: int = QueryParam(..., ge=1, description="Total file size in bytes")
+):
+    """Reserve a part file; the size is checked against MAX_FILE_SIZE_MB up front"""
+    if not filename.endswith(".pdf"):
+        raise HTTPException(status_code=400, detail="Only PDF files are allowed")
+    try:
+        session = await asyncio.to_thread(create_session, filename, size)
+    except UploadTooLarge:
+        raise HTTPException(
+            status_code=400,
+            detail=f"File too large. Max size: {settings.MAX_FILE_SIZE_MB}MB"
+        )
+    logger.info(f"📤 Upload session {session['upload_id']} for {filename} ({size / 1024 / 1024:.2f}MB)")
+    return _session_info(session)
+
+@router.get(
+    "/upload/sessions/{upload_id}",
+    response_model=UploadSessionInfo,
+    tags=["Documents"],
+    summary="Resumable upload state",
+    description="Bytes received so far; resume by sending the range that starts at offset"
+)
+async def get_upload_session(upload_id: str):
+    try:
+        return _session_info(await asyncio.to_thread(get_session, upload_id))
+    except UploadSessionNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@router.put(
+    "/upload/sessions/{upload_id}",
+    response_model=UploadSessionInfo,
+    tags=["Documents"],
+    summary="Upload a byte range",
+    description="Request body is the raw bytes of Content-Range (bytes start-end/total); "
+                "without Content-Range the body is appended at the current offset"
+)
+async def put_upload_range(
+    upload_id: str,
+    request: Request,
+    content_range: Optional[str] = Header(None)
+):
+    """Stream one range to disk; a range starting past the received bytes is refused with 409"""
+    try:
+        session = await write_range(upload_id, content_range, request.stream())
+    except UploadSessionNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except UploadRangeError as e:
+        raise _range_conflict(e)
+    except (UploadTooLarge, UploadBodyMismatch) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _session_info(session)
+
+@router.post(
+    "/upload/sessions/{upload_id}/complete",
+    response_model=DocumentUploadResponse,
+    status_code=202,
+    tags=["Documents"],
+    summary="Finish resumable upload",
+    description="Queue the assembled PDF for processing, like /upload"
+)
+async def complete_upload_session(
+    upload_id: str,
+    response: Response,
+    db: AsyncSession = Depends(get_db)
+):
+    """Hash the assembled file and hand it to the ingest queue"""
+    start_time = time.time()
+    # a full queue leaves the session intact so completion can simply be retried
+    if free_slots() <= 0:
+        raise HTTPException(
+            status_code=503,
+            detail="Ingest queue is full, retry later",
+            headers={"Retry-After": str(settings.INGEST_RETRY_AFTER_SECONDS)}
         )
+    try:
+        session, part_path, pdf_hash = await complete_session(upload_id)
+    except UploadSessionNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except UploadRangeError as e:
+        raise _range_conflict(e)
+    
+    # only a queued or duplicate upload ends the session; after a 503 or an error
+    # the part file is back in place and completion can be retried
+    try:
+        result = await _queue_spooled_upload(db, response, part_path, pdf_hash, session["size"],
+                                             session["filename"], start_time)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Error completing upload session {upload_id}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error processing PDF: {str(e)}")
+    await asyncio.to_thread(finish_session, upload_id)
+    return result
+
+@router.delete(
+    "/upload/sessions/{upload_id}",
+    status_code=204,
+    tags=["Documents"],
+    summary="Abort resumable upload"
+)
+async def abort_upload_session(upload_id: str):
+    try:
+        await asyncio.to_thread(get_session, upload_id)
+    except UploadSessionNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    await asyncio.to_thread(discard_session, upload_id)
+    return Response(status_code=204)
 
 # ============= Health & Status =============
 
@@ -284,7 +1022,9 @@ async def get_stats(db: AsyncSession = Depends(get_db)):
             total_documents=doc_count or 0,
             total_queries=query_count or 0,
             total_chunks=int(total_chunks),
-            avg_response_time=float(avg_response_time) if avg_response_time else None
+            avg_response_time=float(avg_response_time) if avg_response_time else None,
+            cache_hit_rate=hit_rate(),
+            llm=llm_stats()
         )
         
     except Exception as e:
@@ -319,6 +1059,25 @@ async def list_documents(
         logger.error(f"Error listing documents: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post(
+    "/documents/reindex",
+    response_model=ReindexResponse,
+    tags=["Documents"],
+    summary="Re-index documents",
+    description="Rebuild chunks and index entries from cached page text with the current chunk settings"
+)
+async def reindex_documents(
+    doc_ids: Optional[List[str]] = QueryParam(None, description="Only these documents (default: all)")
+):
+    """Re-chunk completed documents without re-parsing their PDFs"""
+    try:
+        return await reindex_all(doc_ids)
+    except ReindexInProgress as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error re-indexing documents: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get(
     "/queries",
     response_model=List[QueryHistory],
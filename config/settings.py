@@ -20,8 +20,38 @@ class Settings(BaseSettings):
     LLM_MODEL: str = "llama-3.1-8b-instant"
     LLM_TEMPERATURE: float = 0.3
     LLM_MAX_TOKENS: int = 2048
+    CONTEXT_BUDGET_FACTOR: float = 2.0  # prompt context budget = factor x LLM_MAX_TOKENS tokens
+    CONTEXT_DEDUP_THRESHOLD: float = 0.85  # shared word-trigram ratio above which a passage is a near-duplicate
+    LLM_POOL_SIZE: int = 20  # pooled keep-alive connections to the LLM API
+    LLM_KEEPALIVE_SECONDS: float = 30.0  # idle pooled connections are closed after this
+    LLM_TIMEOUT_SECONDS: float = 60.0  # read/write timeout per LLM call
+    LLM_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    LLM_MAX_RETRIES: int = 2  # retries on timeouts / connection errors / 429 / 5xx
+    LLM_RETRY_BACKOFF_SECONDS: float = 0.5  # retry delay is jittered in [0, base x 2^attempt]
+    LLM_RETRY_BACKOFF_MAX_SECONDS: float = 8.0
+    LLM_MAX_IN_FLIGHT: int = 16  # concurrent LLM calls; more wait in the LLM queue
+    LLM_QUEUE_SIZE: int = 64  # calls waiting for a slot before /ask answers 503
+    LLM_QUEUE_TIMEOUT_SECONDS: float = 10.0  # a waiting call gets 503 after this
+    LLM_BREAKER_FAILURES: int = 5  # consecutive failed calls that open the circuit
+    LLM_BREAKER_RESET_SECONDS: float = 30.0  # calls fail fast this long before a trial call
+    LLM_PROVIDERS: str = "groq"  # fallback order, comma-separated: groq, groq:<model>, stub (offline)
+    LLM_HEDGE_ENABLED: bool = True  # hedge calls still running after the primary's p95 latency
+    LLM_HEDGE_PERCENTILE: float = 95.0
+    LLM_HEDGE_DELAY_SECONDS: float = 3.0  # hedge delay until 20 latencies of the provider are known
+    LLM_STUB_DELAY_SECONDS: float = 0.0  # simulated latency of the stub provider
+    ASK_BATCH_MAX_QUESTIONS: int = 1000  # questions answered per /ask/batch request; the rest are rejected
+    ASK_BATCH_CONCURRENCY: int = 8  # LLM calls one /ask/batch request runs at once
     
-    # Embedding Settings (not used in minimal version)
+    # Answer Cache (repeated questions over the same retrieved context)
+    ANSWER_CACHE_SIZE: int = 1024  # in-process LRU entries; 0 disables the in-process tier
+    ANSWER_CACHE_TTL_SECONDS: int = 3600
+    USE_CACHE: bool = False  # also share cached answers through Redis
+    REDIS_HOST: str = "localhost"
+    REDIS_PORT: int = 6379
+    REDIS_DB: int = 0
+    
+    # Embedding Settings (used when RETRIEVAL_MODE=dense)
+    EMBEDDING_BACKEND: str = "hashing"  # hashing (offline) | sentence-transformers
     EMBEDDING_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
     EMBEDDING_DIMENSION: int = 384
     
@@ -29,13 +59,47 @@ class Settings(BaseSettings):
     CHROMA_PERSIST_DIR: str = "data/chroma"
     DEFAULT_SEARCH_K: int = 5
     MAX_SEARCH_K: int = 20
-    
+    RETRIEVAL_MODE: str = "bm25"  # bm25 | dense
+    DENSE_MIN_SCORE: float = 0.0
+    VECTOR_INDEX_TYPE: str = "flat"  # flat (exact) | ivf (approximate)
+    IVF_NLIST: int = 256  # k-means buckets
+    IVF_NPROBE: int = 8  # buckets scanned per query: higher = better recall, slower
+    EMBEDDING_QUANTIZATION: str = "none"  # none | int8 (4x smaller) | pq (EMBEDDING_DIMENSION*4/PQ_SUBQUANTIZERS x)
+    PQ_SUBQUANTIZERS: int = 96
+    QUANTIZATION_TRAIN_SIZE: int = 4096  # vectors kept in float32 until the quantizer is fitted
+    QUANTIZATION_RESCORE_FACTOR: int = 4  # re-score k * factor candidates in full precision
+
+    # Chunk Store Settings
+    VECTOR_STORE_DIR: str = "data/index"
+    VECTOR_STORE_PERSIST: bool = True
+    VECTOR_STORE_SHARED: bool = False  # enable when running uvicorn --workers N
+    VECTOR_STORE_REFRESH_INTERVAL: float = 1.0  # seconds between sibling-append checks
+
+    # BM25 Keyword Search Settings
+    BM25_K1: float = 1.5
+    BM25_B: float = 0.75
+
     # PDF Processing Settings
     MAX_FILE_SIZE_MB: int = 50
     UPLOAD_DIR: str = "data/uploads"
+    UPLOAD_BLOCK_SIZE: int = 1024 * 1024  # uploads are hashed and spooled to disk in blocks of this size
     ALLOWED_EXTENSIONS: list = [".pdf"]
+    INGEST_WORKERS: int = 2  # process pool for PDF parsing; 0 = run in a thread instead
+    PDF_PARALLEL_PAGE_THRESHOLD: int = 200  # PDFs with at least this many pages are extracted in parallel page ranges
+    INGEST_PAGE_BATCH: int = 16  # pages extracted, chunked and indexed per pipeline step
+    INGEST_CONCURRENCY: int = 2  # background ingest jobs running at once
+    INGEST_QUEUE_SIZE: int = 100  # queued uploads before /upload answers 503
+    INGEST_RETRY_AFTER_SECONDS: int = 30  # Retry-After sent with a full-queue 503
+    BATCH_UPLOAD_MAX_FILES: int = 100  # PDFs accepted per /upload/batch request (zip members included)
+    BULK_INGEST_BATCH_CHUNKS: int = 2048  # bulk CLI: chunks per index append / DB commit
+    UPLOAD_SESSION_TTL_SECONDS: int = 24 * 3600  # idle resumable upload sessions are removed after this
+    
+    # Extracted page text cache (re-chunk / re-index without re-parsing PDFs)
+    TEXT_CACHE_ENABLED: bool = True
+    TEXT_CACHE_DIR: str = "data/text_cache"
+    TEXT_CACHE_COMPRESSION: int = 6  # gzip level 1-9
     
-    # Chunk Settings
+    # Chunk Settings (small < 10k chars <= medium < 50k chars <= large)
     CHUNK_SIZE_SMALL: int = 300
     CHUNK_SIZE_MEDIUM: int = 500
     CHUNK_SIZE_LARGE: int = 800
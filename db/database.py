@@ -1,6 +1,7 @@
 """
 Database connection and session management
 """
+from sqlalchemy import inspect
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import NullPool
@@ -25,11 +26,25 @@ AsyncSessionLocal = sessionmaker(
     autoflush=False,
 )
 
+def _add_missing_columns(conn):
+    """Add nullable columns introduced after a table was created (create_all skips existing tables)"""
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing and column.nullable:
+                column_type = column.type.compile(dialect=conn.dialect)
+                conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}")
+                logger.info(f"🛠️ Added column {table.name}.{column.name}")
+
 async def init_db():
     """Initialize database - create all tables"""
     try:
         async with engine.begin() as conn:
             await conn.run_sync(Base.metadata.create_all)
+            await conn.run_sync(_add_missing_columns)
         logger.info("✅ Database initialized successfully")
     except Exception as e:
         logger.error(f"❌ Database initialization failed: {e}")
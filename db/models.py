@@ -1,7 +1,7 @@
 """
 Database models for document metadata and tracking
 """
-from sqlalchemy import Column, Integer, String, DateTime, Float, Text, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, Float, Text, Boolean, JSON
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
 from datetime import datetime
@@ -21,7 +21,9 @@ class Document(Base):
     chunks = Column(Integer, nullable=False)
     chunk_size = Column(Integer, nullable=False)
     processing_time = Column(Float, nullable=True)  # seconds
+    timings = Column(JSON, nullable=True)  # extraction timings of the background ingest
     status = Column(String(20), default="completed")  # completed, processing, failed
+    claimed_by = Column(String(32), nullable=True)  # ingest owner (process) of a "processing" row
     error_message = Column(Text, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -40,7 +42,7 @@ class Query(Base):
     k_value = Column(Integer, default=5)
     response_time = Column(Float, nullable=True)  # seconds
     chunks_used = Column(Integer, nullable=True)
-    status = Column(String(20), default="success")  # success, no_results, error
+    status = Column(String(20), default="success")  # success, no_results, error, cancelled (stream closed early)
     error_message = Column(Text, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
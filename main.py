@@ -27,6 +27,11 @@ from api.routes import router
 from config.settings import settings
 from utils.logger import logger
 from db.database import init_db, close_db
+from services.vector_service import init_vectorstore
+from services.ingest_pool import shutdown_ingest_pool
+from services.llm_service import close_llm_clients
+from services.answer_cache import close_answer_cache, init_answer_cache
+from services.ingest_queue import start_ingest_workers, stop_ingest_workers, resume_pending_ingests
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -44,11 +49,23 @@ async def lifespan(app: FastAPI):
     os.makedirs(settings.CHROMA_PERSIST_DIR, exist_ok=True)
     os.makedirs("logs", exist_ok=True)
     logger.info("✅ Directories created")
-    
+
+    # Reopen persisted chunk store
+    init_vectorstore()
+    init_answer_cache()
+
+    # Background ingestion (uploads interrupted by a restart are re-queued)
+    start_ingest_workers()
+    await resume_pending_ingests()
+
     yield
     
     # Shutdown
     logger.info("🛑 Shutting down application")
+    await stop_ingest_workers()
+    shutdown_ingest_pool()
+    await close_llm_clients()
+    await close_answer_cache()
     await close_db()
     logger.info("✅ Cleanup completed")
 
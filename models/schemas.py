@@ -12,6 +12,7 @@ class QuestionRequest(BaseModel):
     question: str = Field(..., min_length=3, max_length=1000, description="Question to ask")
     k: int = Field(default=5, ge=1, le=20, description="Number of context chunks")
     doc_id: Optional[str] = Field(None, description="Specific document ID to search in")
+    doc_ids: Optional[List[str]] = Field(None, description="Several document IDs to search in")
     
     @validator('question')
     def question_must_not_be_empty(cls, v):
@@ -33,6 +34,52 @@ class DocumentUploadResponse(BaseModel):
 
 # ============= Response Models =============
 
+class IngestStatus(BaseModel):
+    """Background ingestion progress for one document"""
+    doc_id: str
+    filename: Optional[str] = None
+    status: str = Field(..., description="queued, processing, completed or failed")
+    pages_total: Optional[int] = None
+    pages_done: int = 0
+    chunks_indexed: int = 0
+    error: Optional[str] = None
+    processing_time: Optional[float] = None
+    timings: Optional[Dict[str, Any]] = Field(None, description="Extraction timings (per page, slowest pages) once completed")
+
+class BatchUploadItem(BaseModel):
+    """Outcome for one file (or zip member) of a batch upload"""
+    filename: str
+    status: str = Field(..., description="processing, duplicate or rejected")
+    doc_id: Optional[str] = None
+    pdf_hash: Optional[str] = None
+    message: Optional[str] = None
+
+class BatchUploadResponse(BaseModel):
+    """Response for a multi-file / zip upload"""
+    files: int
+    queued: int
+    duplicates: int
+    rejected: int
+    items: List[BatchUploadItem] = []
+    processing_time: Optional[float] = None
+
+class UploadSessionInfo(BaseModel):
+    """State of a resumable upload session"""
+    upload_id: str
+    filename: str
+    size: int = Field(..., description="Declared total size in bytes")
+    offset: int = Field(..., description="Bytes received so far; the next range starts here")
+    expires_at: datetime
+
+class ReindexResponse(BaseModel):
+    """Result of rebuilding chunks from cached page text"""
+    documents: int
+    rebuilt: int
+    missing: List[str] = Field(default_factory=list, description="Documents without cached text, left unchanged")
+    pages: int
+    chunks: int
+    seconds: float
+
 class ContextChunk(BaseModel):
     """Context chunk with metadata"""
     content: str
@@ -48,6 +95,21 @@ class QuestionResponse(BaseModel):
     count: int = 0
     response_time: Optional[float] = None
     message: Optional[str] = None
+    cached: bool = Field(False, description="Answer reused from the answer cache")
+    context_tokens: Optional[int] = Field(None, description="Estimated tokens of context sent to the LLM")
+    tokens_saved: Optional[int] = Field(None, description="Tokens saved by merging overlaps, dropping "
+                                                          "duplicates and the context budget")
+
+class BatchQuestionResponse(BaseModel):
+    """Answers to a batch of questions, in request order"""
+    questions: int
+    answered: int
+    no_results: int
+    failed: int
+    rejected: int
+    results: List[QuestionResponse] = Field([], description="Per question; status success, no_results, "
+                                                            "error or rejected")
+    response_time: Optional[float] = None
 
 class DocumentInfo(BaseModel):
     """Document information"""
@@ -90,7 +152,10 @@ class StatsResponse(BaseModel):
     total_queries: int
     total_chunks: int
     avg_response_time: Optional[float] = None
-    cache_hit_rate: Optional[float] = None
+    cache_hit_rate: Optional[float] = Field(None, description="Share of answer lookups served from cache")
+    llm: Optional[Dict[str, Any]] = Field(None, description="Per LLM provider: circuit state, in-flight / "
+                                                         "waiting / refused calls and p95 latency; "
+                                                         "hedge and fallback counts")
 
 # ============= Error Models =============
 
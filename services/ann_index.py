@@ -0,0 +1,221 @@
+"""
+Approximate nearest neighbour search (IVF)
+- Vectors are bucketed by their nearest spherical k-means centroid
+- A query scans only the `nprobe` closest buckets
+- Until enough vectors exist to train, search falls back to exact scoring
+Run `python -m services.ann_index` for a recall-vs-exact report on the
+current chunk store.
+"""
+import time
+from array import array
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from services.dense_index import DenseIndex, top_k
+
+_TRAIN_POINTS_PER_LIST = 16   # train once nlist * this many vectors exist
+_MAX_TRAIN_POINTS_PER_LIST = 64
+_ASSIGN_BATCH = 65_536
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray, spherical: bool = True) -> np.ndarray:
+    """
+    Nearest centroid per row, batched to bound memory.
+    Spherical: max inner product. Otherwise: min L2 distance, computed as
+    max(x.c - |c|^2 / 2).
+    """
+    bias = None if spherical else 0.5 * np.einsum("ij,ij->i", centroids, centroids)
+    assignments = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), _ASSIGN_BATCH):
+        block = vectors[start:start + _ASSIGN_BATCH] @ centroids.T
+        if bias is not None:
+            block -= bias
+        assignments[start:start + len(block)] = np.argmax(block, axis=1)
+    return assignments
+
+
+def kmeans(
+    vectors: np.ndarray,
+    n_clusters: int,
+    iterations: int = 10,
+    seed: int = 0,
+    spherical: bool = True
+) -> np.ndarray:
+    """
+    k-means returning (n_clusters, dimension) centroids.
+    Spherical mode renormalizes centroids to unit length (cosine clustering).
+    """
+    rng = np.random.default_rng(seed)
+    n_clusters = min(n_clusters, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignments = _assign(vectors, centroids, spherical)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        counts = np.bincount(assignments, minlength=n_clusters)
+        empty = counts == 0
+        if empty.any():
+            sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+            counts[empty] = 1
+        if spherical:
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            centroids = np.divide(sums, norms, out=sums, where=norms > 0)
+        else:
+            centroids = sums / counts[:, None]
+    return centroids.astype(np.float32, copy=False)
+
+
+class IVFIndex:
+    """Inverted-file index over a flat embedding matrix"""
+
+    def __init__(self, dimension: int, nlist: int = 256, nprobe: int = 8, seed: int = 0):
+        self.dimension = dimension
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.seed = seed
+        self.centroids: Optional[np.ndarray] = None
+        self._flat = DenseIndex(dimension)
+        self._lists: List[array] = []
+
+    def __len__(self) -> int:
+        return len(self._flat)
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    @property
+    def vectors(self) -> np.ndarray:
+        return self._flat.vectors
+
+    def _assign_rows(self, rows: range):
+        assignments = _assign(self._flat.vectors[rows.start:rows.stop], self.centroids)
+        for row, list_id in zip(rows, assignments.tolist()):
+            self._lists[list_id].append(row)
+
+    @property
+    def needs_training(self) -> bool:
+        return not self.is_trained and len(self) >= self.nlist * _TRAIN_POINTS_PER_LIST
+
+    def fit(self, vectors: np.ndarray) -> Tuple[np.ndarray, List[array]]:
+        """
+        Centroids and bucket lists for `vectors` (rows 0..n-1) without
+        touching the index, so it can run on a snapshot outside a lock
+        """
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(len(vectors), self.nlist * _MAX_TRAIN_POINTS_PER_LIST)
+        sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+        centroids = kmeans(sample, self.nlist, seed=self.seed)
+        lists = [array("I") for _ in range(len(centroids))]
+        for row, list_id in enumerate(_assign(vectors, centroids).tolist()):
+            lists[list_id].append(row)
+        return centroids, lists
+
+    def install(self, centroids: np.ndarray, lists: List[array], fitted_rows: int):
+        """Make a fit() result live; rows added after the snapshot are bucketed too"""
+        self.centroids, self._lists = centroids, lists
+        self._assign_rows(range(fitted_rows, len(self)))
+
+    def train(self):
+        """Fit centroids on a sample of the stored vectors and bucket every row"""
+        vectors = self._flat.vectors
+        self.install(*self.fit(vectors), len(vectors))
+
+    def add(self, vectors: np.ndarray, train: bool = True) -> range:
+        """
+        Append vectors; trained indexes bucket them with the fixed centroids.
+        With train=False, reaching the training size is left to the caller
+        (see needs_training).
+        """
+        rows = self._flat.add(vectors)
+        if self.is_trained:
+            self._assign_rows(rows)
+        elif train and self.needs_training:
+            self.train()
+        return rows
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int = 5,
+        nprobe: Optional[int] = None,
+        rows: Optional[np.ndarray] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        Top-k (row_id, score) pairs from the nprobe nearest buckets.
+        A search restricted to `rows` (one partition) is scored exactly.
+        """
+        if not self.is_trained or rows is not None:
+            return self._flat.search(query, k, rows=rows)
+
+        query = np.asarray(query, dtype=np.float32)
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        probe = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        candidates = np.concatenate([
+            np.frombuffer(self._lists[list_id], dtype=np.uint32) for list_id in probe
+        ])
+        if len(candidates) == 0:
+            return []
+
+        hits = top_k(self._flat.vectors[candidates] @ query, k)
+        return [(int(candidates[i]), score) for i, score in hits]
+
+
+def recall_report(
+    index: IVFIndex,
+    queries: np.ndarray,
+    k: int = 10,
+    nprobe_values: Sequence[int] = (1, 2, 4, 8, 16, 32, 64)
+) -> List[Dict]:
+    """
+    Recall@k of IVF search against exact search for each nprobe,
+    with mean per-query latency for both.
+    """
+    exact = DenseIndex(index.dimension)
+    exact.add(index.vectors)
+
+    started = time.perf_counter()
+    truth = [{row for row, _ in exact.search(q, k)} for q in queries]
+    exact_ms = (time.perf_counter() - started) * 1000 / max(len(queries), 1)
+
+    report = []
+    for nprobe in nprobe_values:
+        if index.is_trained and nprobe > len(index.centroids):
+            break
+        started = time.perf_counter()
+        found = [{row for row, _ in index.search(q, k, nprobe=nprobe)} for q in queries]
+        latency_ms = (time.perf_counter() - started) * 1000 / max(len(queries), 1)
+        hits = sum(len(f & t) for f, t in zip(found, truth))
+        total = sum(len(t) for t in truth)
+        report.append({
+            "nprobe": nprobe,
+            "recall": hits / total if total else 1.0,
+            "latency_ms": latency_ms,
+            "exact_latency_ms": exact_ms
+        })
+    return report
+
+
+if __name__ == "__main__":
+    from config.settings import settings
+    from services.embeddings import get_embedder
+    from services.chunk_store import ChunkStore
+
+    store = ChunkStore(settings.VECTOR_STORE_DIR)
+    embedder = get_embedder()
+    ivf = IVFIndex(embedder.dimension, nlist=settings.IVF_NLIST, nprobe=settings.IVF_NPROBE)
+    for start in range(0, len(store), 1024):
+        texts = [store.get_text(i) for i in range(start, min(start + 1024, len(store)))]
+        ivf.add(embedder.embed(texts))
+    if not ivf.is_trained and len(ivf):
+        ivf.train()
+
+    rng = np.random.default_rng(0)
+    sample = rng.choice(len(store), min(200, len(store)), replace=False) if len(store) else []
+    queries = embedder.embed([store.get_text(int(i))[:200] for i in sample])
+    print(f"{len(store)} chunks, nlist={settings.IVF_NLIST}")
+    print(f"{'nprobe':>7} {'recall@10':>10} {'ivf ms':>8} {'exact ms':>9}")
+    for row in recall_report(ivf, queries):
+        print(f"{row['nprobe']:>7} {row['recall']:>10.3f} {row['latency_ms']:>8.2f} {row['exact_latency_ms']:>9.2f}")
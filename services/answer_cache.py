@@ -0,0 +1,174 @@
+"""
+Answer cache for repeated questions
+- Key: normalized question, k, document scope and a hash of the retrieved
+  context, so an answer is only reused for the same evidence
+- In-process tier: LRU bounded by ANSWER_CACHE_SIZE, entries expire after
+  ANSWER_CACHE_TTL_SECONDS
+- Optional Redis tier (USE_CACHE) shared across workers and restarts; any
+  async client with get / set(ex=) / delete / sadd / smembers / expire
+  works, so tests plug in a local stand-in
+- Entries are tagged with the doc_ids of their sources and dropped by
+  invalidate_documents() when those documents change
+- Hit / miss counters feed /stats cache_hit_rate
+"""
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from config.settings import settings
+from utils.logger import logger
+
+_KEY_PREFIX = "answer-cache:"
+_DOC_PREFIX = "answer-cache:doc:"
+
+_entries: "OrderedDict[str, Tuple[float, Dict, Tuple[str, ...]]]" = OrderedDict()  # key -> (expires_at, value, doc_ids)
+_by_doc: Dict[str, Set[str]] = {}  # doc_id -> keys of entries built from it
+_redis = None
+_stats = {"hits": 0, "misses": 0}
+
+
+def init_answer_cache(redis_client=None):
+    """
+    Reset the in-process tier and attach the Redis tier.
+    Without an explicit client, one is created from REDIS_* when USE_CACHE is set.
+    """
+    global _redis
+    clear()
+    _redis = redis_client
+    if _redis is None and settings.USE_CACHE:
+        try:
+            import redis.asyncio as redis
+
+            _redis = redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=settings.REDIS_DB)
+            logger.info(f"🗄️ Answer cache using Redis at {settings.REDIS_HOST}:{settings.REDIS_PORT}")
+        except ImportError:
+            logger.warning("⚠️ USE_CACHE is set but the redis package is not installed; in-process cache only")
+
+
+async def close_answer_cache():
+    global _redis
+    if _redis is not None and hasattr(_redis, "aclose"):
+        await _redis.aclose()
+    _redis = None
+
+
+def clear():
+    _entries.clear()
+    _by_doc.clear()
+    _stats.update(hits=0, misses=0)
+
+
+def normalize_question(question: str) -> str:
+    """Case, whitespace and trailing punctuation do not change the question"""
+    return " ".join(question.lower().split()).rstrip("?!. ")
+
+
+def make_key(question: str, k: int, scope: Optional[List[str]], context_chunks: List[Dict]) -> str:
+    context = hashlib.md5()
+    for chunk in context_chunks:
+        context.update(chunk["content"].encode("utf-8"))
+        context.update(b"\x1f")
+    parts = [normalize_question(question), k, sorted(scope or []), context.hexdigest()]
+    return hashlib.sha1(json.dumps(parts).encode("utf-8")).hexdigest()
+
+
+def source_doc_ids(context_chunks: List[Dict]) -> Tuple[str, ...]:
+    return tuple(sorted({chunk["metadata"].get("doc_id") for chunk in context_chunks} - {None}))
+
+
+def _drop(key: str):
+    entry = _entries.pop(key, None)
+    if entry is None:
+        return
+    for doc_id in entry[2]:
+        keys = _by_doc.get(doc_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del _by_doc[doc_id]
+
+
+def _remember(key: str, value: Dict, doc_ids: Tuple[str, ...], expires_at: float):
+    if settings.ANSWER_CACHE_SIZE <= 0:
+        return
+    _drop(key)
+    _entries[key] = (expires_at, value, doc_ids)
+    for doc_id in doc_ids:
+        _by_doc.setdefault(doc_id, set()).add(key)
+    while len(_entries) > settings.ANSWER_CACHE_SIZE:
+        _drop(next(iter(_entries)))
+
+
+async def get_answer(key: str) -> Optional[Dict]:
+    """Cached value for key (in-process first, then Redis), counting hits and misses"""
+    entry = _entries.get(key)
+    if entry is not None:
+        if entry[0] > time.time():
+            _entries.move_to_end(key)
+            _stats["hits"] += 1
+            return entry[1]
+        _drop(key)
+
+    if _redis is not None:
+        try:
+            raw = await _redis.get(_KEY_PREFIX + key)
+            if raw is not None:
+                record = json.loads(raw)
+                # keep the local copy no longer than Redis does (-1: no expiry, -2: already gone)
+                remaining_ms = await _redis.pttl(_KEY_PREFIX + key)
+                if remaining_ms == -1:
+                    remaining_ms = settings.ANSWER_CACHE_TTL_SECONDS * 1000
+                if remaining_ms > 0:
+                    _remember(key, record["value"], tuple(record["doc_ids"]),
+                              time.time() + remaining_ms / 1000)
+                _stats["hits"] += 1
+                return record["value"]
+        except Exception as e:
+            logger.warning(f"⚠️ Redis answer cache read failed: {e}")
+
+    _stats["misses"] += 1
+    return None
+
+
+async def set_answer(key: str, value: Dict, doc_ids: Iterable[str]):
+    doc_ids = tuple(doc_ids)
+    ttl = settings.ANSWER_CACHE_TTL_SECONDS
+    _remember(key, value, doc_ids, time.time() + ttl)
+
+    if _redis is not None:
+        try:
+            await _redis.set(_KEY_PREFIX + key, json.dumps({"value": value, "doc_ids": doc_ids}), ex=ttl)
+            for doc_id in doc_ids:
+                await _redis.sadd(_DOC_PREFIX + doc_id, key)
+                await _redis.expire(_DOC_PREFIX + doc_id, ttl)
+        except Exception as e:
+            logger.warning(f"⚠️ Redis answer cache write failed: {e}")
+
+
+async def invalidate_documents(doc_ids: Iterable[str]) -> int:
+    """Drop every cached answer built from these documents; returns entries removed"""
+    removed = 0
+    for doc_id in doc_ids:
+        for key in list(_by_doc.get(doc_id, ())):
+            _drop(key)
+            removed += 1
+        if _redis is not None:
+            try:
+                keys = await _redis.smembers(_DOC_PREFIX + doc_id)
+                if keys:
+                    await _redis.delete(*(_KEY_PREFIX + (key.decode() if isinstance(key, bytes) else key)
+                                          for key in keys))
+                await _redis.delete(_DOC_PREFIX + doc_id)
+            except Exception as e:
+                logger.warning(f"⚠️ Redis answer cache invalidation failed: {e}")
+    if removed:
+        logger.info(f"🗑️ Invalidated {removed} cached answers")
+    return removed
+
+
+def hit_rate() -> Optional[float]:
+    """Share of lookups served from the cache since start, None before the first lookup"""
+    lookups = _stats["hits"] + _stats["misses"]
+    return _stats["hits"] / lookups if lookups else None
@@ -0,0 +1,367 @@
+"""
+Append-only chunk store
+- In-memory when no directory is given
+- Otherwise a flat on-disk segment that is memory-mapped on open:
+    texts.bin      concatenated UTF-8 chunk texts
+    metadata.jsonl one JSON record (id + metadata) per chunk
+    offsets.bin    uint64 pairs (text_end, meta_end) per chunk
+  offsets.bin is written last, so it is the commit log: a chunk exists
+  only once its offsets entry is fully on disk.
+- Dense embeddings can be persisted alongside (embeddings.f32, one
+  float32 row per chunk id, always a prefix of the store, tagged with the
+  embedder in embeddings.json) so reopening never re-embeds stored chunks
+- Chunks are never rewritten; tombstones.bin lists [start, stop) chunk id
+  spans (uint64 pairs) that readers must skip, e.g. a failed ingest
+- Several processes may open the same directory: appends are serialized
+  with an exclusive file lock and readers pick up new chunks via refresh().
+  A rebuild swaps a new directory in while holding that lock; writers of
+  the retired store get StoreReplaced and must reopen
+"""
+import json
+import mmap
+import os
+import threading
+from array import array
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process use only
+    fcntl = None
+
+TEXTS_FILE = "texts.bin"
+METADATA_FILE = "metadata.jsonl"
+OFFSETS_FILE = "offsets.bin"
+LOCK_FILE = "store.lock"
+EMBEDDINGS_FILE = "embeddings.f32"
+EMBEDDINGS_META_FILE = "embeddings.json"
+TOMBSTONES_FILE = "tombstones.bin"
+
+_OFFSET_FIELDS = 2
+_OFFSET_ITEMSIZE = array("Q").itemsize
+_RECORD_SIZE = _OFFSET_FIELDS * _OFFSET_ITEMSIZE
+
+
+class StoreReplaced(Exception):
+    """The directory now holds a different store (swapped in by a rebuild); reopen it"""
+
+
+def _fsync(f):
+    f.flush()
+    os.fsync(f.fileno())
+
+
+class ChunkStore:
+    """Append-only store of chunk texts and metadata, addressed by chunk id"""
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory
+        self._ids: List[str] = []
+        self._metadata: List[Dict] = []
+        self._texts: List[str] = []  # memory mode only
+        self._offsets = array("Q")
+        self._tombstones = array("Q")  # flat [start, stop) pairs
+        self._mmap: Optional[mmap.mmap] = None
+        self._mmap_size = 0
+        self._map_lock = threading.Lock()  # remap must not close a map another thread is reading
+        self._vector_dim: Optional[int] = None  # set by bind_vectors()
+        if directory:
+            self._open()
+
+    # ---------- lifecycle ----------
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def locked(self):
+        """
+        Hold the writer lock across several steps (a rebuild's last copy and
+        directory swap); no other writer, in any process, appends meanwhile
+        """
+        return self._locked() if self.directory else nullcontext()
+
+    @contextmanager
+    def _locked(self):
+        """Exclusive inter-process lock for writers"""
+        with open(self._path(LOCK_FILE), "ab") as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        for name in (TEXTS_FILE, METADATA_FILE, OFFSETS_FILE, TOMBSTONES_FILE):
+            open(self._path(name), "ab").close()
+
+        with self._locked():
+            self._inode = os.stat(self._path(OFFSETS_FILE)).st_ino
+            self.refresh()
+            self._recover(len(self))
+        self._remap()
+
+    def is_replaced(self) -> bool:
+        """True once the directory holds a different store (swapped in by a rebuild)"""
+        if not self.directory:
+            return False
+        try:
+            return os.stat(self._path(OFFSETS_FILE)).st_ino != self._inode
+        except FileNotFoundError:
+            return True
+
+    def _recover(self, committed: int):
+        """Drop bytes written after the last committed chunk (torn append)"""
+        text_end, meta_end = self._ends(committed - 1) if committed else (0, 0)
+        for name, end in ((TEXTS_FILE, text_end), (METADATA_FILE, meta_end),
+                          (OFFSETS_FILE, committed * _RECORD_SIZE)):
+            if os.path.getsize(self._path(name)) != end:
+                with open(self._path(name), "r+b") as f:
+                    f.truncate(end)
+
+    def _remap(self):
+        if self.is_replaced():
+            # never map the texts of the store that took this one's place
+            raise StoreReplaced(f"{self.directory} was replaced")
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        size = os.path.getsize(self._path(TEXTS_FILE))
+        if size:
+            with open(self._path(TEXTS_FILE), "rb") as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._mmap_size = size
+
+    def refresh(self) -> range:
+        """
+        Load chunks committed by other processes since the last read.
+        Cheap when nothing changed: a single stat of offsets.bin.
+        Returns the range of newly visible chunk ids.
+        """
+        first = len(self)
+        if not self.directory:
+            return range(first, first)
+
+        self._refresh_tombstones()
+        committed = os.path.getsize(self._path(OFFSETS_FILE)) // _RECORD_SIZE
+        if committed <= first:
+            return range(first, first)
+
+        with open(self._path(OFFSETS_FILE), "rb") as f:
+            f.seek(first * _RECORD_SIZE)
+            self._offsets.frombytes(f.read((committed - first) * _RECORD_SIZE))
+
+        meta_start = self._ends(first - 1)[1] if first else 0
+        meta_end = self._ends(committed - 1)[1]
+        with open(self._path(METADATA_FILE), "rb") as f:
+            f.seek(meta_start)
+            data = f.read(meta_end - meta_start)
+        for line in data.splitlines():
+            record = json.loads(line)
+            self._ids.append(record["id"])
+            self._metadata.append(record["metadata"])
+        return range(first, committed)
+
+    def _refresh_tombstones(self):
+        """Load tombstones written by other processes (a torn last pair is ignored)"""
+        known = len(self._tombstones) * _OFFSET_ITEMSIZE
+        try:
+            size = os.path.getsize(self._path(TOMBSTONES_FILE))
+        except FileNotFoundError:
+            return
+        size -= (size - known) % _RECORD_SIZE
+        if size > known:
+            with open(self._path(TOMBSTONES_FILE), "rb") as f:
+                f.seek(known)
+                self._tombstones.frombytes(f.read(size - known))
+
+    def close(self):
+        with self._map_lock:
+            if self._mmap is not None:
+                self._mmap.close()
+                self._mmap = None
+
+    # ---------- reads ----------
+
+    def __len__(self) -> int:
+        return len(self._metadata)
+
+    def _ends(self, chunk_id: int) -> Tuple[int, int]:
+        base = chunk_id * _OFFSET_FIELDS
+        return self._offsets[base], self._offsets[base + 1]
+
+    def get_text(self, chunk_id: int) -> str:
+        if not self.directory:
+            return self._texts[chunk_id]
+        start = self._ends(chunk_id - 1)[0] if chunk_id else 0
+        end = self._ends(chunk_id)[0]
+        with self._map_lock:
+            if end > self._mmap_size:
+                self._remap()
+            data = self._mmap[start:end] if end > start else b""
+        return data.decode("utf-8")
+
+    def get_id(self, chunk_id: int) -> str:
+        return self._ids[chunk_id]
+
+    def get_metadata(self, chunk_id: int) -> Dict:
+        return self._metadata[chunk_id]
+
+    def tombstones(self) -> List[Tuple[int, int]]:
+        """[start, stop) chunk id spans to skip, in the order they were written"""
+        return list(zip(self._tombstones[0::2], self._tombstones[1::2]))
+
+    def get_record(self, chunk_id: int) -> Dict:
+        return {
+            "id": self._ids[chunk_id],
+            "content": self.get_text(chunk_id),
+            "metadata": self._metadata[chunk_id]
+        }
+
+    # ---------- writes ----------
+
+    def append(self, records: List[Tuple[str, str, Dict]]) -> range:
+        """
+        Append (id, text, metadata) records durably.
+        Chunks committed by other processes are loaded first, so the
+        returned range of assigned chunk ids may not start at the old len().
+        Raises StoreReplaced once a rebuild has swapped the directory.
+        """
+        if not self.directory:
+            first = len(self)
+            for record_id, text, metadata in records:
+                self._ids.append(record_id)
+                self._texts.append(text)
+                self._metadata.append(metadata)
+            return range(first, len(self))
+
+        with self._locked():
+            if self.is_replaced():
+                raise StoreReplaced(f"{self.directory} was replaced")
+            self.refresh()
+            self._recover(len(self))
+            return self._append_locked(records)
+
+    def tombstone(self, spans: List[Tuple[int, int]]):
+        """Durably mark [start, stop) chunk id spans as deleted"""
+        pairs = array("Q", [bound for span in spans for bound in span])
+        if not self.directory:
+            self._tombstones.extend(pairs)
+            return
+
+        with self._locked():
+            if self.is_replaced():
+                raise StoreReplaced(f"{self.directory} was replaced")
+            self._refresh_tombstones()
+            path = self._path(TOMBSTONES_FILE)
+            with open(path, "r+b") as f:
+                f.truncate(len(self._tombstones) * _OFFSET_ITEMSIZE)  # torn pair
+            with open(path, "ab") as f:
+                f.write(pairs.tobytes())
+                _fsync(f)
+            self._tombstones.extend(pairs)
+
+    def _append_locked(self, records: List[Tuple[str, str, Dict]]) -> range:
+        first = len(self)
+        text_end, meta_end = self._ends(first - 1) if first else (0, 0)
+        new_offsets = array("Q")
+        with open(self._path(TEXTS_FILE), "ab") as texts_f, \
+                open(self._path(METADATA_FILE), "ab") as meta_f:
+            for record_id, text, metadata in records:
+                text_bytes = text.encode("utf-8")
+                meta_bytes = json.dumps(
+                    {"id": record_id, "metadata": metadata}, ensure_ascii=False
+                ).encode("utf-8") + b"\n"
+                texts_f.write(text_bytes)
+                meta_f.write(meta_bytes)
+                text_end += len(text_bytes)
+                meta_end += len(meta_bytes)
+                new_offsets.extend((text_end, meta_end))
+            _fsync(texts_f)
+            _fsync(meta_f)
+
+        with open(self._path(OFFSETS_FILE), "ab") as offsets_f:
+            offsets_f.write(new_offsets.tobytes())
+            _fsync(offsets_f)
+
+        self._offsets.extend(new_offsets)
+        for record_id, _, metadata in records:
+            self._ids.append(record_id)
+            self._metadata.append(metadata)
+        return range(first, len(self))
+
+    # ---------- embeddings ----------
+
+    def bind_vectors(self, embedder: str, dimension: int):
+        """
+        Use the persisted embeddings of this embedder (name + dimension);
+        embeddings written by any other embedder are discarded.
+        """
+        self._vector_dim = dimension
+        if not self.directory:
+            return
+        tag = {"embedder": embedder, "dimension": dimension}
+        with self._locked():
+            try:
+                with open(self._path(EMBEDDINGS_META_FILE), encoding="utf-8") as f:
+                    current = json.load(f)
+            except (FileNotFoundError, ValueError):
+                current = None
+            if current != tag:
+                open(self._path(EMBEDDINGS_FILE), "wb").close()
+                tmp = self._path(EMBEDDINGS_META_FILE + ".tmp")
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(tag, f)
+                    _fsync(f)
+                os.replace(tmp, self._path(EMBEDDINGS_META_FILE))
+
+    def _vector_row_size(self) -> int:
+        return self._vector_dim * np.dtype(np.float32).itemsize
+
+    def vector_count(self) -> int:
+        """Chunks (from id 0) whose embeddings are persisted"""
+        if not self.directory or self._vector_dim is None:
+            return 0
+        try:
+            rows = os.path.getsize(self._path(EMBEDDINGS_FILE)) // self._vector_row_size()
+        except FileNotFoundError:
+            return 0
+        return min(rows, len(self))
+
+    def get_vectors(self, chunk_ids) -> np.ndarray:
+        """Persisted embeddings of chunk ids (a range or a list), all below vector_count()"""
+        rows = os.path.getsize(self._path(EMBEDDINGS_FILE)) // self._vector_row_size()
+        matrix = np.memmap(self._path(EMBEDDINGS_FILE), dtype=np.float32, mode="r",
+                           shape=(rows, self._vector_dim))
+        if isinstance(chunk_ids, range):
+            return np.array(matrix[chunk_ids.start:chunk_ids.stop])
+        return matrix[np.asarray(chunk_ids, dtype=np.int64)]
+
+    def append_vectors(self, start: int, vectors: np.ndarray):
+        """
+        Persist embeddings of chunk ids from `start` on. Rows already on
+        disk (written by a sibling process) are skipped; rows that would
+        leave a gap are not written, so the file stays a prefix.
+        """
+        if not self.directory or self._vector_dim is None or not len(vectors):
+            return
+        row_size = self._vector_row_size()
+        with self._locked():
+            if self.is_replaced():
+                return
+            path = self._path(EMBEDDINGS_FILE)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            rows = size // row_size
+            if size != rows * row_size:
+                with open(path, "r+b") as f:
+                    f.truncate(rows * row_size)  # torn row
+            if rows < start or rows >= start + len(vectors):
+                return
+            with open(path, "ab") as f:
+                f.write(np.ascontiguousarray(vectors[rows - start:], dtype=np.float32).tobytes())
+                _fsync(f)
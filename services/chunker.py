@@ -0,0 +1,163 @@
+"""
+Native recursive text chunker
+- Same separator priorities, sizes and overlap rules as langchain's
+  RecursiveCharacterTextSplitter (separators kept at the start of the
+  following piece, chunks whitespace-stripped)
+- Works on [start, end) character offsets of the source text and only
+  slices strings for the final chunks
+- No third-party imports, so spawned ingest workers start quickly
+Run `python -m services.chunker [file]` to benchmark it against the
+langchain splitter.
+"""
+import time
+from typing import List, Sequence, Tuple
+
+DEFAULT_SEPARATORS = ("\n\n", "\n", ".", " ", "")
+
+Span = Tuple[int, int]
+
+
+def _boundaries(text: str, start: int, end: int, separator: str) -> List[int]:
+    """
+    Piece boundaries of text[start:end] split on separator, which stays at
+    the start of the following piece. Pieces are contiguous, so piece i is
+    [bounds[i], bounds[i + 1]); empty pieces are dropped.
+    """
+    if separator == "":
+        return list(range(start, end + 1))
+    bounds = [start]
+    parts = text[start:end].split(separator)
+    pos = start + len(parts[0])
+    step = len(separator)
+    for part in parts[1:]:
+        if pos > bounds[-1]:
+            bounds.append(pos)
+        pos += step + len(part)
+    if end > bounds[-1]:
+        bounds.append(end)
+    return bounds
+
+
+class TextChunker:
+    """Recursive character chunker returning chunk offsets"""
+
+    def __init__(self, chunk_size: int, chunk_overlap: int, separators: Sequence[str] = DEFAULT_SEPARATORS):
+        if chunk_overlap > chunk_size:
+            raise ValueError(f"chunk_overlap ({chunk_overlap}) is larger than chunk_size ({chunk_size})")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.separators = tuple(separators)
+
+    def split_spans(self, text: str) -> List[Span]:
+        """[start, end) offsets of each chunk in text, in order"""
+        spans: List[Span] = []
+        self._split(text, 0, len(text), self.separators, spans)
+        return spans
+
+    def split_text(self, text: str) -> List[str]:
+        return [text[start:end] for start, end in self.split_spans(text)]
+
+    def _split(self, text: str, start: int, end: int, separators: Tuple[str, ...], out: List[Span]):
+        separator, finer = separators[-1], ()
+        for i, candidate in enumerate(separators):
+            if candidate == "":
+                separator = candidate
+                break
+            if text.find(candidate, start, end) != -1:
+                separator, finer = candidate, separators[i + 1:]
+                break
+
+        bounds = _boundaries(text, start, end, separator)
+        size = self.chunk_size
+        run = None  # first piece of the current run of pieces shorter than chunk_size
+        for i in range(len(bounds) - 1):
+            if bounds[i + 1] - bounds[i] < size:
+                if run is None:
+                    run = i
+                continue
+            if run is not None:
+                self._merge(text, bounds, run, i, out)
+                run = None
+            if finer:
+                self._split(text, bounds[i], bounds[i + 1], finer, out)
+            else:
+                out.append((bounds[i], bounds[i + 1]))
+        if run is not None:
+            self._merge(text, bounds, run, len(bounds) - 1, out)
+
+    def _merge(self, text: str, bounds: List[int], lo: int, hi: int, out: List[Span]):
+        """Greedily pack pieces lo..hi-1 into chunks, carrying chunk_overlap chars over"""
+        size, overlap = self.chunk_size, self.chunk_overlap
+        first = lo  # pieces first..i-1 form the chunk being built
+        total = 0
+        for i in range(lo, hi):
+            length = bounds[i + 1] - bounds[i]
+            if total + length > size and i > first:
+                self._emit(text, bounds[first], bounds[i], out)
+                while total > overlap or (total + length > size and total > 0):
+                    total -= bounds[first + 1] - bounds[first]
+                    first += 1
+            total += length
+        self._emit(text, bounds[first], bounds[hi], out)
+
+    @staticmethod
+    def _emit(text: str, start: int, end: int, out: List[Span]):
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        if end > start:
+            out.append((start, end))
+
+
+def benchmark(text: str, chunk_size: int, chunk_overlap: int, repeat: int = 3) -> dict:
+    """Throughput of TextChunker vs RecursiveCharacterTextSplitter on text"""
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    langchain = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap, separators=list(DEFAULT_SEPARATORS))
+    native = TextChunker(chunk_size, chunk_overlap)
+
+    def best_of(fn):
+        best, result = float("inf"), None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = fn(text)
+            best = min(best, time.perf_counter() - started)
+        return best, result
+
+    langchain_seconds, expected = best_of(langchain.split_text)
+    native_seconds, chunks = best_of(native.split_text)
+    return {
+        "chars": len(text),
+        "chunks": len(chunks),
+        "identical": chunks == expected,
+        "langchain_mb_s": len(text) / langchain_seconds / 1e6,
+        "native_mb_s": len(text) / native_seconds / 1e6,
+        "speedup": langchain_seconds / native_seconds
+    }
+
+
+if __name__ == "__main__":
+    import random
+    import sys
+
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], encoding="utf-8", errors="ignore") as f:
+            sample = f.read()
+    else:
+        rng = random.Random(0)
+        words = ["pdf", "index", "chunk", "query", "answer", "retrieval", "document", "page", "a", "of"]
+        paragraphs = []
+        for _ in range(20_000):
+            sentences = [" ".join(rng.choice(words) for _ in range(rng.randint(4, 18))) + "."
+                         for _ in range(rng.randint(1, 6))]
+            paragraphs.append("\n".join(sentences) if rng.random() < 0.3 else " ".join(sentences))
+        sample = "\n\n".join(paragraphs)
+
+    print(f"{len(sample) / 1e6:.1f}M characters")
+    print(f"{'size':>5} {'overlap':>7} {'chunks':>7} {'langchain':>10} {'native':>8} {'speedup':>8} {'same':>5}")
+    for size, overlap in ((300, 50), (500, 100), (800, 150)):
+        row = benchmark(sample, size, overlap)
+        print(f"{size:>5} {overlap:>7} {row['chunks']:>7} {row['langchain_mb_s']:>8.1f}MB/s "
+              f"{row['native_mb_s']:>6.1f}MB/s {row['speedup']:>7.1f}x {str(row['identical']):>5}")
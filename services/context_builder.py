@@ -0,0 +1,138 @@
+"""
+Token-budgeted context assembly for RAG prompts
+- Retrieved chunks of the same document that overlap (or are consecutive)
+  are merged back into one passage using their char_start / char_end
+  offsets, so the chunk_overlap text is sent once
+- Passages that are near-duplicates of a higher-ranked one (same text in
+  two PDFs, repeated boilerplate) are dropped
+- Passages are added in relevance order until the token budget
+  (CONTEXT_BUDGET_FACTOR x LLM_MAX_TOKENS) is used up; the passage that
+  crosses the budget is cut at a word boundary
+- Tokens are estimated at ~4 characters each (no tokenizer dependency)
+"""
+from typing import Dict, List, Optional, Tuple
+
+from config.settings import settings
+from services.inverted_index import tokenize
+
+_CHARS_PER_TOKEN = 4
+_MIN_TRUNCATED_TOKENS = 32  # smaller leftovers of the budget are not worth a cut passage
+SEPARATOR = "\n\n"
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + _CHARS_PER_TOKEN - 1) // _CHARS_PER_TOKEN
+
+
+def context_budget() -> int:
+    """Prompt context budget in tokens"""
+    return int(settings.LLM_MAX_TOKENS * settings.CONTEXT_BUDGET_FACTOR)
+
+
+def _has_offsets(chunk: Dict) -> bool:
+    metadata = chunk["metadata"]
+    return ("char_start" in metadata and "char_end" in metadata
+            and metadata["char_end"] - metadata["char_start"] == len(chunk["content"]))
+
+
+def _merge_overlapping(chunks: List[Dict]) -> Tuple[List[Dict], int]:
+    """
+    Passages (text, rank) from retrieved chunks; rank is the best retrieval
+    position among the merged chunks. Returns (passages, chunks merged away).
+    """
+    passages = []
+    by_doc: Dict[Optional[str], List[Tuple[int, Dict]]] = {}
+    for rank, chunk in enumerate(chunks):
+        if _has_offsets(chunk):
+            by_doc.setdefault(chunk["metadata"].get("doc_id"), []).append((rank, chunk))
+        else:
+            passages.append({"text": chunk["content"], "rank": rank})
+
+    merged = 0
+    for members in by_doc.values():
+        members.sort(key=lambda member: member[1]["metadata"]["char_start"])
+        current = None
+        for rank, chunk in members:
+            metadata = chunk["metadata"]
+            start, end = metadata["char_start"], metadata["char_end"]
+            consecutive = current is not None and metadata.get("chunk_index") is not None \
+                and metadata.get("chunk_index") == current["last_index"] + 1
+            if current is not None and (start <= current["end"] or consecutive):
+                if end > current["end"]:
+                    if start >= current["end"]:
+                        # consecutive chunks are separated by whitespace only
+                        current["text"] += "\n" + chunk["content"]
+                    else:
+                        current["text"] += chunk["content"][current["end"] - start:]
+                    current["end"] = end
+                current["rank"] = min(current["rank"], rank)
+                current["last_index"] = max(current["last_index"], metadata.get("chunk_index", -1))
+                merged += 1
+                continue
+            current = {"text": chunk["content"], "rank": rank, "end": end,
+                       "last_index": metadata.get("chunk_index", -1)}
+            passages.append(current)
+
+    passages.sort(key=lambda passage: passage["rank"])
+    return passages, merged
+
+
+def _shingles(text: str) -> set:
+    words = tokenize(text)
+    if len(words) < 3:
+        return set(words)
+    return set(zip(words, words[1:], words[2:]))
+
+
+def _truncate(text: str, tokens: int) -> str:
+    cut = text[:tokens * _CHARS_PER_TOKEN]
+    space = cut.rfind(" ")
+    return (cut[:space] if space > len(cut) // 2 else cut).rstrip()
+
+
+def build_context(chunks: List[Dict], budget: Optional[int] = None) -> Tuple[str, Dict]:
+    """
+    Prompt context from retrieved chunks (best first).
+    Returns (context, stats) with tokens_before (chunks joined verbatim),
+    tokens, tokens_saved, and merged / duplicates / truncated passage counts.
+    """
+    budget = context_budget() if budget is None else budget
+    tokens_before = estimate_tokens(SEPARATOR.join(chunk["content"] for chunk in chunks))
+    passages, merged = _merge_overlapping(chunks)
+
+    kept: List[str] = []
+    kept_shingles: List[set] = []
+    used = 0
+    duplicates = truncated = 0  # truncated: passages cut or left out by the budget
+    for position, passage in enumerate(passages):
+        shingles = _shingles(passage["text"])
+        if any(shingles and other and len(shingles & other) / min(len(shingles), len(other))
+               >= settings.CONTEXT_DEDUP_THRESHOLD for other in kept_shingles):
+            duplicates += 1
+            continue
+
+        cost = estimate_tokens(passage["text"]) + (estimate_tokens(SEPARATOR) if kept else 0)
+        if used + cost > budget:
+            remaining = budget - used - (estimate_tokens(SEPARATOR) if kept else 0)
+            if remaining >= _MIN_TRUNCATED_TOKENS or not kept:
+                text = _truncate(passage["text"], max(remaining, 0))
+                if text:
+                    kept.append(text)
+                    used = estimate_tokens(SEPARATOR.join(kept))
+            truncated = len(passages) - position
+            break
+
+        kept.append(passage["text"])
+        kept_shingles.append(shingles)
+        used += cost
+
+    context = SEPARATOR.join(kept)
+    tokens = estimate_tokens(context)
+    return context, {
+        "tokens_before": tokens_before,
+        "tokens": tokens,
+        "tokens_saved": max(tokens_before - tokens, 0),
+        "merged": merged,
+        "duplicates": duplicates,
+        "truncated": truncated
+    }
@@ -0,0 +1,97 @@
+"""
+Dense retrieval engine
+- Embeddings live in one contiguous float32 matrix, grown by doubling
+- A query is scored with a single matrix-vector product and the top-k is
+  selected with argpartition; a block of queries is scored with one
+  matrix-matrix product (search_many)
+- Searches can be restricted to an explicit set of rows (a document
+  partition), which scores only those rows
+"""
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class DenseIndex:
+    """Exact (brute-force) inner-product index over normalized embeddings"""
+
+    def __init__(self, dimension: int, initial_capacity: int = 1024):
+        self.dimension = dimension
+        self._matrix = np.empty((initial_capacity, dimension), dtype=np.float32)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """View of the populated rows"""
+        return self._matrix[:self._size]
+
+    def _reserve(self, needed: int):
+        capacity = self._matrix.shape[0]
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        matrix = np.empty((capacity, self.dimension), dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        self._matrix = matrix
+
+    def add(self, vectors: np.ndarray) -> range:
+        """Append embeddings (n, dimension)"""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dimension)
+        first = self._size
+        self._reserve(first + len(vectors))
+        self._matrix[first:first + len(vectors)] = vectors
+        self._size += len(vectors)
+        return range(first, self._size)
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int = 5,
+        rows: Optional[np.ndarray] = None
+    ) -> List[Tuple[int, float]]:
+        """Return the top-k (row_id, score) pairs, best first"""
+        if self._size == 0 or k <= 0:
+            return []
+        query = np.asarray(query, dtype=np.float32)
+        if rows is not None:
+            scores = self._matrix[rows] @ query
+            return [(int(rows[i]), score) for i, score in top_k(scores, k)]
+
+        return top_k(self.vectors @ query, k)
+
+    def search_many(
+        self,
+        queries: np.ndarray,
+        k: int = 5,
+        rows: Optional[np.ndarray] = None
+    ) -> List[List[Tuple[int, float]]]:
+        """Top-k (row_id, score) pairs for each query row of `queries`, best first"""
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dimension)
+        if self._size == 0 or k <= 0:
+            return [[] for _ in range(len(queries))]
+        if rows is not None:
+            scores = queries @ self._matrix[rows].T
+            return [[(int(rows[i]), score) for i, score in top_k(row, k)] for row in scores]
+        scores = queries @ self.vectors.T
+        return [top_k(row, k) for row in scores]
+
+
+def top_k(scores: np.ndarray, k: int) -> List[Tuple[int, float]]:
+    """argpartition-based top-k over a score vector, skipping -inf entries"""
+    k = min(k, len(scores))
+    if k <= 0:
+        return []
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+    return [(int(i), float(scores[i])) for i in candidates if np.isfinite(scores[i])]
+
+
+def ranges_to_rows(ranges: Sequence[Tuple[int, int]]) -> np.ndarray:
+    """Expand [start, stop) spans into a sorted row id array"""
+    if not ranges:
+        return np.empty(0, dtype=np.int64)
+    return np.concatenate([np.arange(start, stop, dtype=np.int64) for start, stop in ranges])
@@ -0,0 +1,70 @@
+"""
+Local embedders for dense retrieval
+- HashingEmbedder: offline, dependency-free (NumPy only), deterministic
+  across processes and restarts
+- SentenceTransformerEmbedder: optional, needs sentence-transformers
+"""
+import zlib
+from functools import lru_cache
+from typing import List, Optional
+
+import numpy as np
+
+from config.settings import settings
+from services.inverted_index import tokenize
+
+
+@lru_cache(maxsize=200_000)
+def _hash_feature(feature: str):
+    """Stable (bucket hash, sign) for a feature; Python's hash() is salted per process"""
+    h = zlib.crc32(feature.encode("utf-8"))
+    return h, 1.0 if h & 0x80000000 else -1.0
+
+
+class HashingEmbedder:
+    """
+    Signed feature hashing of word unigrams and bigrams into a fixed
+    number of dimensions, L2-normalized so dot product == cosine.
+    """
+
+    def __init__(self, dimension: int = 384):
+        self.dimension = dimension
+        self.name = "hashing"  # persisted embeddings are reused only by the same embedder
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+            for feature in features:
+                h, sign = _hash_feature(feature)
+                vectors[row, h % self.dimension] += sign
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        np.divide(vectors, norms, out=vectors, where=norms > 0)
+        return vectors
+
+
+class SentenceTransformerEmbedder:
+    """Wraps a local sentence-transformers model (optional dependency)"""
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+
+        self._model = SentenceTransformer(model_name)
+        self.name = f"sentence-transformers:{model_name}"
+        self.dimension = self._model.get_sentence_embedding_dimension()
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        return self._model.encode(
+            texts, normalize_embeddings=True, convert_to_numpy=True
+        ).astype(np.float32, copy=False)
+
+
+def get_embedder(backend: Optional[str] = None):
+    """Build the embedder selected by EMBEDDING_BACKEND"""
+    backend = backend or settings.EMBEDDING_BACKEND
+    if backend == "hashing":
+        return HashingEmbedder(settings.EMBEDDING_DIMENSION)
+    if backend == "sentence-transformers":
+        return SentenceTransformerEmbedder(settings.EMBEDDING_MODEL)
+    raise ValueError(f"Unknown embedding backend: {backend}")
@@ -0,0 +1,40 @@
+"""
+Process pool for CPU-bound ingest work (PDF parsing, chunking)
+Keeps PyPDF2 and the text splitter off the event loop so /ask and /health
+stay responsive during large uploads.
+"""
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Optional
+
+from config.settings import settings
+from utils.logger import logger
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+def get_ingest_pool() -> Optional[ProcessPoolExecutor]:
+    """Lazily start the pool; None when INGEST_WORKERS=0 (thread fallback)"""
+    global _pool
+    if _pool is None and settings.INGEST_WORKERS > 0:
+        # spawn: workers must not inherit the event loop, DB engine or open mmaps
+        _pool = ProcessPoolExecutor(
+            max_workers=settings.INGEST_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+        logger.info(f"⚙️ Ingest process pool started ({settings.INGEST_WORKERS} workers)")
+    return _pool
+
+async def run_in_ingest_pool(fn, *args, **kwargs):
+    """Run fn(*args, **kwargs) in the ingest pool and await its result"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_ingest_pool(), partial(fn, *args, **kwargs))
+
+def shutdown_ingest_pool():
+    """Stop worker processes (called on application shutdown)"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
+        logger.info("Ingest process pool stopped")
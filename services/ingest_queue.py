@@ -0,0 +1,287 @@
+"""
+Background ingestion queue
+- /upload persists the PDF, inserts a "processing" Document row and returns 202
+- A fixed number of worker tasks parse, chunk and index queued PDFs
+- The queue is bounded: when it is full, uploads are refused (503) instead
+  of piling up unbounded work
+- Progress (pages done, chunks indexed) is kept in memory per doc_id while
+  a job is queued or running; finished jobs are read back from the DB
+- Chunks of a failed job are purged from the index; interrupted jobs are
+  purged and ingested again from the first page on restart
+- "processing" rows carry the owner (process) ingesting them; every worker
+  resumes at startup, but only rows whose owner is gone, each claimed by
+  exactly one worker (owners hold a lock file while they live)
+"""
+import asyncio
+import os
+import time
+import uuid
+from typing import Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: no inter-process locks, other owners count as gone
+    fcntl = None
+
+from sqlalchemy import select, update
+
+from config.settings import settings
+from db.database import AsyncSessionLocal
+from db.models import Document
+from services.pdf_processor import ingest_pdf
+from services.vector_service import purge_document
+from utils.logger import logger
+
+_queue: Optional[asyncio.Queue] = None
+_workers: List[asyncio.Task] = []
+_jobs: Dict[str, Dict] = {}  # doc_id -> progress of queued / running jobs
+_owner: Optional[str] = None  # claim stamped on the "processing" rows this process ingests
+_owner_lock = None  # owner lock file, held open (and locked) while this process lives
+
+
+class IngestQueueFull(Exception):
+    """Raised when INGEST_QUEUE_SIZE jobs are already waiting"""
+
+
+def upload_path(doc_id: str) -> str:
+    """Where an uploaded PDF is persisted until (and after) ingestion"""
+    return os.path.join(settings.UPLOAD_DIR, f"{doc_id}.pdf")
+
+
+def _owner_path(owner: str) -> str:
+    return os.path.join(settings.UPLOAD_DIR, ".owners", f"{owner}.lock")
+
+
+def _hold_owner_lock(owner: str):
+    """Create and lock the owner's lock file; the lock lasts as long as the file stays open"""
+    os.makedirs(os.path.dirname(_owner_path(owner)), exist_ok=True)
+    f = open(_owner_path(owner), "ab")
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    return f
+
+
+def _owner_alive(owner: str) -> bool:
+    """True while the owner's process still holds its lock (the lock dies with the process)"""
+    if owner == _owner:
+        return True
+    if fcntl is None or not os.path.exists(_owner_path(owner)):
+        return False
+    with open(_owner_path(owner), "ab") as f:
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+        try:
+            os.remove(_owner_path(owner))
+        except FileNotFoundError:
+            pass
+    return False
+
+
+def ingest_owner() -> str:
+    """This process's owner id, stamped as claimed_by on the Document rows it ingests"""
+    global _owner, _owner_lock
+    if _owner is None:
+        owner = uuid.uuid4().hex
+        _owner_lock = _hold_owner_lock(owner)
+        _owner = owner
+    return _owner
+
+
+def _release_owner():
+    global _owner, _owner_lock
+    if _owner is None:
+        return
+    try:
+        os.remove(_owner_path(_owner))
+    except FileNotFoundError:
+        pass
+    _owner_lock.close()
+    _owner, _owner_lock = None, None
+
+
+def start_ingest_workers(concurrency: Optional[int] = None):
+    """Create the queue and worker tasks (called from the app lifespan)"""
+    global _queue
+    if _workers:
+        return
+    _queue = asyncio.Queue(maxsize=settings.INGEST_QUEUE_SIZE)
+    concurrency = concurrency or settings.INGEST_CONCURRENCY
+    for n in range(concurrency):
+        _workers.append(asyncio.create_task(_worker(n), name=f"ingest-worker-{n}"))
+    logger.info(f"📥 Ingest queue started ({concurrency} workers, {settings.INGEST_QUEUE_SIZE} slots)")
+
+
+async def stop_ingest_workers():
+    """Cancel worker tasks; unfinished jobs stay "processing" and resume on restart"""
+    global _queue
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+    _queue = None
+    _jobs.clear()
+    _release_owner()
+
+
+def enqueue_ingest(doc_id: str, path: str, pdf_hash: str, filename: str) -> Dict:
+    """Queue a persisted PDF for ingestion; raises IngestQueueFull when saturated"""
+    if _queue is None:
+        start_ingest_workers()
+    job = {
+        "doc_id": doc_id,
+        "pdf_hash": pdf_hash,
+        "filename": filename,
+        "path": path,
+        "status": "queued",
+        "pages_total": None,
+        "pages_done": 0,
+        "chunks_indexed": 0,
+        "error": None,
+        "timings": None,
+        "queued_at": time.time(),
+        "started_at": None
+    }
+    try:
+        _queue.put_nowait(job)
+    except asyncio.QueueFull:
+        raise IngestQueueFull(f"Ingest queue is full ({settings.INGEST_QUEUE_SIZE} jobs)")
+    _jobs[doc_id] = job
+    return job
+
+
+def get_job_progress(doc_id: str) -> Optional[Dict]:
+    """Snapshot of a queued / running job, or None once it has finished"""
+    job = _jobs.get(doc_id)
+    return dict(job) if job else None
+
+
+def find_pending_job(pdf_hash: str) -> Optional[Dict]:
+    """Queued / running job for the same content, so re-uploads attach to it"""
+    for job in _jobs.values():
+        if job["pdf_hash"] == pdf_hash:
+            return dict(job)
+    return None
+
+
+def queue_depth() -> int:
+    return _queue.qsize() if _queue is not None else 0
+
+
+def free_slots() -> int:
+    """Jobs that can still be queued before IngestQueueFull"""
+    if _queue is None:
+        return settings.INGEST_QUEUE_SIZE
+    return _queue.maxsize - _queue.qsize()
+
+
+async def wait_for_ingest():
+    """Block until every queued job has finished (tests, graceful drains)"""
+    if _queue is not None:
+        await _queue.join()
+
+
+async def _update_document(doc_id: str, **fields):
+    """Write job results back to the Document row"""
+    async with AsyncSessionLocal() as session:
+        await session.execute(update(Document).where(Document.doc_id == doc_id).values(**fields))
+        await session.commit()
+
+
+async def _run_job(job: Dict):
+    job["status"] = "processing"
+    job["started_at"] = time.time()
+
+    def progress(**fields):
+        job.update(fields)
+
+    result = await ingest_pdf(job["path"], job["doc_id"], job["pdf_hash"], job["filename"], progress)
+    elapsed = time.time() - job["queued_at"]
+
+    if result["status"] == "error":
+        job.update(status="failed", error=result.get("message"))
+        await asyncio.to_thread(purge_document, job["doc_id"])
+        await _update_document(job["doc_id"], status="failed", error_message=result.get("message"),
+                               processing_time=elapsed)
+        logger.warning(f"⚠️ Ingest failed for {job['doc_id']}: {result.get('message')}")
+        return
+
+    job.update(status="completed", pages_done=result["pages"], chunks_indexed=result["chunks"],
+               timings=result["timings"])
+    await _update_document(
+        job["doc_id"],
+        status="completed",
+        pages=result["pages"],
+        chunks=result["chunks"],
+        chunk_size=result["chunk_size"],
+        processing_time=elapsed,
+        timings=result["timings"]
+    )
+    logger.info(f"✅ Ingested {job['filename']} ({result['chunks']} chunks) in {elapsed:.2f}s")
+
+
+async def _worker(n: int):
+    while True:
+        job = await _queue.get()
+        try:
+            await _run_job(job)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Ingest worker {n} error on {job['doc_id']}: {e}", exc_info=True)
+            job.update(status="failed", error=str(e))
+            try:
+                await asyncio.to_thread(purge_document, job["doc_id"])
+                await _update_document(job["doc_id"], status="failed", error_message=str(e))
+            except Exception:
+                pass
+        finally:
+            # DB row now carries the final state; drop the in-memory entry
+            _jobs.pop(job["doc_id"], None)
+            _queue.task_done()
+
+
+async def _claim_document(doc_id: str, previous: Optional[str], owner: str) -> bool:
+    """Move a "processing" row from its previous owner to this one; False if another worker got there first"""
+    claimed = Document.claimed_by.is_(None) if previous is None else Document.claimed_by == previous
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            update(Document)
+            .where(Document.doc_id == doc_id, Document.status == "processing", claimed)
+            .values(claimed_by=owner)
+        )
+        await session.commit()
+    return result.rowcount == 1
+
+
+async def resume_pending_ingests() -> int:
+    """
+    Re-queue documents left "processing" by a restart.
+    Every worker runs this at startup, so only rows whose owner is gone are
+    taken over, each by the one worker whose claim lands first. Chunks that
+    already reached the index are purged after the claim, so the job starts
+    over cleanly; rows whose upload file is gone are marked failed.
+    """
+    owner = ingest_owner()
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(select(Document).where(Document.status == "processing"))
+        orphaned = [doc for doc in result.scalars().all()
+                    if doc.claimed_by is None or not _owner_alive(doc.claimed_by)]
+
+    resumed = 0
+    for doc in orphaned:
+        if not await _claim_document(doc.doc_id, doc.claimed_by, owner):
+            continue
+        await asyncio.to_thread(purge_document, doc.doc_id)
+        if not os.path.exists(upload_path(doc.doc_id)):
+            await _update_document(doc.doc_id, status="failed", error_message="Upload lost before ingestion")
+            continue
+        try:
+            enqueue_ingest(doc.doc_id, upload_path(doc.doc_id), doc.pdf_hash, doc.filename)
+            resumed += 1
+        except IngestQueueFull:
+            await _update_document(doc.doc_id, status="failed", error_message="Ingest queue full on restart")
+    if resumed:
+        logger.info(f"📥 Resumed {resumed} interrupted ingest jobs")
+    return resumed
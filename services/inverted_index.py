@@ -0,0 +1,96 @@
+"""
+Inverted index with BM25 scoring
+- Postings are built incrementally as chunks are added
+- Query cost scales with posting-list length, not corpus size
+- Posting lists are sorted by chunk id, so a search restricted to chunk id
+  ranges (one document's partition) bisects straight to the relevant slice
+"""
+import heapq
+import math
+import re
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from operator import itemgetter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokenizer shared by indexing and querying"""
+    return _TOKEN_RE.findall(text.lower())
+
+
+class InvertedIndex:
+    """
+    term -> posting list of (chunk ids, term frequencies).
+    Chunk ids are dense integers assigned in insertion order,
+    so every posting list stays sorted by chunk id.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._doc_lengths = array("I")
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._doc_lengths)
+
+    def add(self, chunk_id: int, text: str):
+        """Index one chunk; ids must be added in order 0, 1, 2, ..."""
+        if chunk_id != len(self._doc_lengths):
+            raise ValueError(f"Expected chunk id {len(self._doc_lengths)}, got {chunk_id}")
+
+        terms = tokenize(text)
+        for term, tf in Counter(terms).items():
+            posting = self._postings.get(term)
+            if posting is None:
+                posting = self._postings[term] = (array("I"), array("I"))
+            posting[0].append(chunk_id)
+            posting[1].append(tf)
+
+        self._doc_lengths.append(len(terms))
+        self._total_length += len(terms)
+
+    def search(
+        self,
+        query: str,
+        k: int = 5,
+        ranges: Optional[Sequence[Tuple[int, int]]] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        Return the top-k (chunk_id, bm25_score) pairs, best first.
+        `ranges` limits scoring to [start, stop) chunk id spans; idf stays global.
+        """
+        n = len(self._doc_lengths)
+        if n == 0 or k <= 0:
+            return []
+
+        avgdl = self._total_length / n or 1.0
+        k1 = self.k1
+        norm_const = k1 * (1 - self.b)
+        norm_scale = k1 * self.b / avgdl
+        lengths = self._doc_lengths
+
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            ids, tfs = posting
+            df = len(ids)
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            if ranges is None:
+                spans = ((0, df),)
+            else:
+                spans = [(bisect_left(ids, start), bisect_left(ids, stop)) for start, stop in ranges]
+            for lo, hi in spans:
+                for i in range(lo, hi):
+                    chunk_id, tf = ids[i], tfs[i]
+                    denom = tf + norm_const + norm_scale * lengths[chunk_id]
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (k1 + 1) / denom
+
+        return heapq.nlargest(k, scores.items(), key=itemgetter(1))
@@ -3,10 +3,28 @@ LLM Service - Safe, Lazy Init, Production Ready
 - No crash on import
 - Works without .env
 - Initializes Groq ONLY when needed
+- ask_llm_async: AsyncGroq on one shared, pooled httpx.AsyncClient
+  (keep-alive connections reused across requests, event loop never blocked)
+- stream_llm: the same call with stream=True, yielding tokens as they arrive
+- ask_llm / LLMService: sync wrapper for scripts, same pool settings
+- LLMScheduler: async calls run under a bounded scheduler (max in-flight
+  calls, a bounded wait queue with an admission timeout, retries with
+  jittered backoff, and a circuit breaker that fails fast while the
+  provider keeps failing); refused calls raise LLMUnavailable
+- Providers (LLM_PROVIDERS, in fallback order): groq, groq:<model> and a
+  deterministic offline stub; each has its own scheduler. A request still
+  running after the primary's p95 latency is hedged to the next provider,
+  the first answer wins, and failed providers fall back to the next one
 """
 
+import asyncio
+import hashlib
 import os
-from typing import Optional
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
 
 # 🚨 Remove proxy env vars BEFORE importing groq
 for k in [
@@ -24,19 +42,267 @@ from dotenv import load_dotenv
 # Load .env if exists (harmless if not)
 load_dotenv()
 
+LLM_DISABLED_MESSAGE = "LLM is disabled (API key not configured)"
+LLM_ERROR_MESSAGE = "LLM error occurred"
+
+
+class LLMUnavailable(Exception):
+    """Raised when the scheduler refuses an LLM call (queue full, no slot in time, circuit open)"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
 # Global state
 _groq_client = None
+_async_groq_client = None
+_async_http_client = None  # pooled connections shared by every async call
+_async_loop = None  # loop the async client's connections belong to
+_closing: set = set()  # aclose() tasks of replaced clients, referenced until they finish
+_schedulers: Dict[str, "LLMScheduler"] = {}  # provider name -> scheduler on _scheduler_loop
+_scheduler_loop = None
+_providers: Optional[List] = None
+_providers_spec: Optional[str] = None  # LLM_PROVIDERS value _providers was built from
+_latencies: Dict[str, deque] = {}  # provider name -> recent successful call durations
+_LATENCY_WINDOW = 200
+_HEDGE_MIN_SAMPLES = 20  # below this, LLM_HEDGE_DELAY_SECONDS is used instead of the percentile
+_hedge_stats = {"hedged": 0, "hedge_wins": 0, "fallbacks": 0}
 _llm_model: Optional[str] = None
 _llm_temperature: Optional[float] = None
 _llm_max_tokens: Optional[int] = None
 
 
+def _load_llm_params():
+    global _llm_model, _llm_temperature, _llm_max_tokens
+    _llm_model = os.getenv("LLM_MODEL", "llama-3.1-8b-instant")
+    _llm_temperature = float(os.getenv("LLM_TEMPERATURE", "0.3"))
+    _llm_max_tokens = int(os.getenv("LLM_MAX_TOKENS", "2048"))
+
+
+def _http_options() -> Dict:
+    """Connection pool limits and timeouts shared by the sync and async clients"""
+    import httpx
+
+    pool_size = int(os.getenv("LLM_POOL_SIZE", "20"))
+    return {
+        "limits": httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=pool_size,
+            keepalive_expiry=float(os.getenv("LLM_KEEPALIVE_SECONDS", "30")),
+        ),
+        "timeout": httpx.Timeout(
+            float(os.getenv("LLM_TIMEOUT_SECONDS", "60")),
+            connect=float(os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", "5")),
+        ),
+    }
+
+
+def _max_retries() -> int:
+    return int(os.getenv("LLM_MAX_RETRIES", "2"))
+
+
+def _is_transient(exc: Exception) -> bool:
+    """Worth retrying: timeouts, connection errors, 408 / 409 / 429 and 5xx"""
+    status = getattr(exc, "status_code", None)
+    if status is not None:
+        return status in (408, 409, 429) or status >= 500
+    try:
+        import httpx
+        from groq import APIConnectionError  # APITimeoutError is a subclass
+
+        if isinstance(exc, (APIConnectionError, httpx.TransportError)):
+            return True
+    except ImportError:
+        pass
+    return isinstance(exc, (asyncio.TimeoutError, ConnectionError))
+
+
+class LLMScheduler:
+    """
+    Admission control for async LLM calls.
+    - At most max_in_flight calls hold a slot; up to queue_size more wait
+      for one, each for at most queue_timeout seconds
+    - call() retries transient errors with full-jitter exponential backoff
+    - Circuit breaker: failure_threshold calls in a row failing with
+      transient errors open it; while open every call is refused, after
+      reset_seconds one trial call (half-open) decides whether it closes
+    """
+
+    def __init__(self, max_in_flight: int = 16, queue_size: int = 64, queue_timeout: float = 10.0,
+                 max_retries: int = 2, backoff: float = 0.5, backoff_max: float = 8.0,
+                 failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.max_in_flight = max_in_flight
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._in_flight = 0
+        self._waiting = 0
+        self._failures = 0  # consecutive transient failures
+        self._opened_at: Optional[float] = None
+        self._probing = False  # half-open trial call in flight
+        self.rejected = 0
+
+    @classmethod
+    def from_env(cls) -> "LLMScheduler":
+        return cls(
+            max_in_flight=int(os.getenv("LLM_MAX_IN_FLIGHT", "16")),
+            queue_size=int(os.getenv("LLM_QUEUE_SIZE", "64")),
+            queue_timeout=float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "10")),
+            max_retries=_max_retries(),
+            backoff=float(os.getenv("LLM_RETRY_BACKOFF_SECONDS", "0.5")),
+            backoff_max=float(os.getenv("LLM_RETRY_BACKOFF_MAX_SECONDS", "8")),
+            failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+            reset_seconds=float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30")),
+        )
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        return "open" if time.monotonic() < self._opened_at + self.reset_seconds else "half-open"
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "in_flight": self._in_flight,
+            "waiting": self._waiting,
+            "rejected": self.rejected,
+        }
+
+    def _refuse(self, message: str, retry_after: float):
+        self.rejected += 1
+        raise LLMUnavailable(message, retry_after)
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one in-flight slot; raises LLMUnavailable instead of waiting without bound"""
+        state = self.state
+        if state == "open":
+            self._refuse("LLM provider circuit is open", self._opened_at + self.reset_seconds - time.monotonic())
+        probe = state == "half-open"
+        if probe:
+            if self._probing:
+                self._refuse("LLM provider circuit is half-open, trial call in flight", self.reset_seconds)
+            self._probing = True
+
+        try:
+            if self._slots.locked():
+                if self._waiting >= self.queue_size:
+                    self._refuse(f"LLM queue is full ({self.queue_size} waiting)", self.queue_timeout)
+                self._waiting += 1
+                try:
+                    await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+                except asyncio.TimeoutError:
+                    self._refuse(f"No LLM slot free within {self.queue_timeout:g}s", self.queue_timeout)
+                finally:
+                    self._waiting -= 1
+            else:
+                await self._slots.acquire()
+            self._in_flight += 1
+            try:
+                yield
+            finally:
+                self._in_flight -= 1
+                self._slots.release()
+        finally:
+            if probe:
+                self._probing = False
+
+    async def call(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """fn() with retries of transient errors; the last error is raised"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                result = await fn()
+            except Exception as e:
+                if not _is_transient(e):
+                    self._record_success()  # the provider answered, the request was bad
+                    raise
+                if attempt == self.max_retries or self.state == "open":
+                    self._record_failure()
+                    raise
+                delay = random.uniform(0, min(self.backoff_max, self.backoff * 2 ** attempt))
+                print(f"⚠️ LLM call failed ({e}); retry {attempt + 1}/{self.max_retries} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+            else:
+                self._record_success()
+                return result
+
+    def _record_success(self):
+        if self._opened_at is not None:
+            print("✅ LLM provider recovered; circuit closed")
+        self._failures = 0
+        self._opened_at = None
+
+    def _record_failure(self):
+        self._failures += 1
+        if self._probing or self._failures >= self.failure_threshold:
+            if self.state != "open":
+                print(f"🔌 LLM circuit opened after {self._failures} failed calls; "
+                      f"failing fast for {self.reset_seconds:g}s")
+            self._opened_at = time.monotonic()
+
+
+def get_scheduler(name: str = "groq") -> LLMScheduler:
+    """Scheduler of a provider on the running event loop (its semaphore belongs to one loop)"""
+    global _scheduler_loop
+
+    loop = asyncio.get_running_loop()
+    if _scheduler_loop is not loop:
+        _schedulers.clear()
+        _scheduler_loop = loop
+    if name not in _schedulers:
+        _schedulers[name] = LLMScheduler.from_env()
+    return _schedulers[name]
+
+
+def _record_latency(name: str, seconds: float):
+    _latencies.setdefault(name, deque(maxlen=_LATENCY_WINDOW)).append(seconds)
+
+
+def latency_percentile(name: str, percentile: float) -> Optional[float]:
+    """Percentile of a provider's recent call durations, None without samples"""
+    samples = sorted(_latencies.get(name, ()))
+    if not samples:
+        return None
+    return samples[min(len(samples) - 1, int(len(samples) * percentile / 100))]
+
+
+def hedge_delay(name: str) -> float:
+    """How long a call to this provider runs before it is hedged"""
+    if len(_latencies.get(name, ())) < _HEDGE_MIN_SAMPLES:
+        return float(os.getenv("LLM_HEDGE_DELAY_SECONDS", "3"))
+    return latency_percentile(name, float(os.getenv("LLM_HEDGE_PERCENTILE", "95")))
+
+
+def _hedge_enabled() -> bool:
+    return os.getenv("LLM_HEDGE_ENABLED", "true").lower() in ("1", "true", "yes")
+
+
+def llm_stats() -> Dict[str, Any]:
+    """Per-provider scheduler state and p95 latency, plus hedge / fallback counters"""
+    return {
+        "providers": {
+            provider.name: {**get_scheduler(provider.name).stats(),
+                            "p95_seconds": latency_percentile(provider.name, 95)}
+            for provider in get_providers()
+        },
+        **_hedge_stats,
+    }
+
+
 def _initialize_groq():
     """
     Initialize Groq client ONCE.
     Safe: does NOT crash app if key is missing.
     """
-    global _groq_client, _llm_model, _llm_temperature, _llm_max_tokens
+    global _groq_client
 
     if _groq_client is not None:
         return
@@ -47,13 +313,15 @@ def _initialize_groq():
         return
 
     try:
+        import httpx
         from groq import Groq
 
-        _groq_client = Groq(api_key=api_key)
-
-        _llm_model = os.getenv("LLM_MODEL", "llama-3.1-8b-instant")
-        _llm_temperature = float(os.getenv("LLM_TEMPERATURE", "0.3"))
-        _llm_max_tokens = int(os.getenv("LLM_MAX_TOKENS", "2048"))
+        _groq_client = Groq(
+            api_key=api_key,
+            http_client=httpx.Client(**_http_options()),
+            max_retries=_max_retries(),
+        )
+        _load_llm_params()
 
         print("✅ Groq initialized")
         print(f"   Model: {_llm_model}")
@@ -63,19 +331,84 @@ def _initialize_groq():
         _groq_client = None
 
 
-def ask_llm(question: str, system_prompt: Optional[str] = None) -> str:
+def _closed(task: asyncio.Task):
+    """Forget a finished aclose() task; a failed close is not worth reporting"""
+    _closing.discard(task)
+    if not task.cancelled():
+        task.exception()
+
+
+def _close_replaced_client(client, client_loop, loop):
     """
-    Ask the LLM safely.
-    Never crashes the app.
+    Best-effort aclose() of a client replaced for another loop: on its own
+    loop while that still runs, otherwise on the current one
     """
+    try:
+        if client_loop is not None and client_loop is not loop and client_loop.is_running():
+            asyncio.run_coroutine_threadsafe(client.aclose(), client_loop)
+            return
+        task = loop.create_task(client.aclose())
+        _closing.add(task)
+        task.add_done_callback(_closed)
+    except Exception as e:
+        print(f"⚠️ Could not close replaced LLM client: {e}")
 
-    if _groq_client is None:
-        _initialize_groq()
 
-    if _groq_client is None:
-        return "LLM is disabled (API key not configured)"
+def _initialize_async_groq():
+    """
+    Initialize the AsyncGroq client for the running event loop.
+    Pooled connections are bound to a loop, so a new loop gets a new client
+    (the previous one is closed).
+    """
+    global _async_groq_client, _async_http_client, _async_loop
+
+    loop = asyncio.get_running_loop()
+    if _async_groq_client is not None and _async_loop is loop:
+        return
+
+    if _async_http_client is not None:
+        _close_replaced_client(_async_http_client, _async_loop, loop)
+        _async_groq_client = _async_http_client = _async_loop = None
+
+    api_key = os.getenv("GROQ_API_KEY")
+    if not api_key:
+        _async_groq_client = None
+        return
+
+    try:
+        import httpx
+        from groq import AsyncGroq
+
+        _async_http_client = httpx.AsyncClient(**_http_options())
+        _async_groq_client = AsyncGroq(
+            api_key=api_key,
+            http_client=_async_http_client,
+            max_retries=0,  # retried by the scheduler, with its backoff and circuit breaker
+        )
+        _async_loop = loop
+        _load_llm_params()
+
+        print(f"✅ Async Groq initialized (pool: {os.getenv('LLM_POOL_SIZE', '20')} connections)")
+
+    except Exception as e:
+        print(f"❌ Async Groq init failed: {e}")
+        _async_groq_client = None
+
+
+async def close_llm_clients():
+    """Close pooled connections (app shutdown)"""
+    global _async_groq_client, _async_http_client, _async_loop, _groq_client
+
+    if _async_http_client is not None and _async_loop is asyncio.get_running_loop():
+        await _async_http_client.aclose()
+    _async_groq_client = _async_http_client = _async_loop = None
+    if _groq_client is not None:
+        _groq_client.close()
+        _groq_client = None
+
 
-    messages = [
+def _messages(question: str, system_prompt: Optional[str]) -> List[Dict[str, str]]:
+    return [
         {
             "role": "system",
             "content": system_prompt or "You are a helpful assistant.",
@@ -86,10 +419,234 @@ def ask_llm(question: str, system_prompt: Optional[str] = None) -> str:
         },
     ]
 
+
+async def _deltas(stream) -> AsyncIterator[str]:
+    async for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+class GroqProvider:
+    """Groq chat completions on the pooled async client; model defaults to LLM_MODEL"""
+
+    def __init__(self, name: str = "groq", model: Optional[str] = None):
+        self.name = name
+        self.model = model
+
+    def available(self) -> bool:
+        _initialize_async_groq()
+        return _async_groq_client is not None
+
+    def _request(self, messages: List[Dict[str, str]], **extra):
+        return _async_groq_client.chat.completions.create(
+            model=self.model or _llm_model,
+            messages=messages,
+            temperature=_llm_temperature,
+            max_tokens=_llm_max_tokens,
+            **extra,
+        )
+
+    async def complete(self, messages: List[Dict[str, str]]) -> str:
+        completion = await self._request(messages)
+        return completion.choices[0].message.content
+
+    async def open_stream(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        return _deltas(await self._request(messages, stream=True))
+
+
+class StubProvider:
+    """
+    Offline provider for tests and local runs: the answer is derived from
+    the prompt only (same prompt, same answer) after `delay` seconds;
+    with `error` set every call raises it instead
+    """
+
+    def __init__(self, name: str = "stub", delay: float = 0.0, error: Optional[Exception] = None):
+        self.name = name
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    def available(self) -> bool:
+        return True
+
+    async def complete(self, messages: List[Dict[str, str]]) -> str:
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        prompt = messages[-1]["content"]
+        digest = hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:8]
+        return f"Stub answer {digest} ({len(prompt)} prompt characters)"
+
+    async def open_stream(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        answer = await self.complete(messages)
+
+        async def words():
+            for n, word in enumerate(answer.split(" ")):
+                yield word if n == 0 else " " + word
+
+        return words()
+
+
+def _make_provider(name: str):
+    kind, _, model = name.partition(":")
+    if kind == "groq":
+        return GroqProvider(name, model or None)
+    if kind == "stub":
+        return StubProvider(name, delay=float(os.getenv("LLM_STUB_DELAY_SECONDS", "0")))
+    print(f"⚠️ Unknown LLM provider '{name}' ignored")
+    return None
+
+
+def get_providers() -> List:
+    """Configured providers in fallback order (LLM_PROVIDERS, comma-separated)"""
+    global _providers, _providers_spec
+
+    spec = os.getenv("LLM_PROVIDERS", "groq")
+    if _providers is None or spec != _providers_spec:
+        _providers = [provider for provider in (_make_provider(name.strip()) for name in spec.split(",") if name.strip())
+                      if provider is not None]
+        _providers_spec = spec
+    return _providers
+
+
+async def _attempt(provider, messages: List[Dict[str, str]]) -> str:
+    """One provider call under its scheduler, timed for the hedge delay"""
+    scheduler = get_scheduler(provider.name)
+    async with scheduler.slot():
+        started = time.monotonic()
+        answer = await scheduler.call(lambda: provider.complete(messages))
+    _record_latency(provider.name, time.monotonic() - started)
+    return answer
+
+
+async def _complete(providers: List, messages: List[Dict[str, str]]) -> str:
+    """
+    First answer from the providers: start with the first; once it has run
+    for its hedge delay, send one hedge to the next provider (or the same
+    one when it is the only provider) and keep whichever finishes first;
+    when every running call has failed, fall back to the next untried
+    provider. Losing calls are cancelled; the last error is raised.
+    """
+    untried = list(providers[1:])
+    running: Dict[asyncio.Future, tuple] = {}  # task -> (provider, started_at, is_hedge)
+    hedge = _hedge_enabled()
+    last_error: Optional[Exception] = None
+
+    def launch(provider, is_hedge: bool = False):
+        running[asyncio.ensure_future(_attempt(provider, messages))] = (provider, time.monotonic(), is_hedge)
+
+    launch(providers[0])
+    try:
+        while running:
+            timeout = None
+            if hedge and len(running) == 1:
+                provider, started_at, _ = next(iter(running.values()))
+                timeout = max(0.0, hedge_delay(provider.name) - (time.monotonic() - started_at))
+            done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+            if not done:
+                hedge = False
+                backup = untried.pop(0) if untried else next(iter(running.values()))[0]
+                _hedge_stats["hedged"] += 1
+                print(f"⏱️ LLM call slower than {timeout:.2f}s; hedging to {backup.name}")
+                launch(backup, is_hedge=True)
+                continue
+
+            for task in done:
+                provider, _, is_hedge = running.pop(task)
+                if task.exception() is None:
+                    if is_hedge:
+                        _hedge_stats["hedge_wins"] += 1
+                    return task.result()
+                last_error = task.exception()
+                print(f"❌ LLM provider {provider.name} failed: {last_error}")
+
+            if not running and untried:
+                _hedge_stats["fallbacks"] += 1
+                launch(untried.pop(0))
+        raise last_error
+    finally:
+        for task in running:
+            task.cancel()
+
+
+def _available_providers() -> List:
+    return [provider for provider in get_providers() if provider.available()]
+
+
+async def ask_llm_async(question: str, system_prompt: Optional[str] = None) -> str:
+    """
+    Ask the LLM without blocking the event loop: hedged, with fallback
+    across LLM_PROVIDERS, each provider through its scheduler.
+    Raises LLMUnavailable when the call is refused (overloaded or circuit
+    open) by the last provider tried; provider errors answer LLM_ERROR_MESSAGE.
+    """
+
+    providers = _available_providers()
+    if not providers:
+        return LLM_DISABLED_MESSAGE
+
+    try:
+        return await _complete(providers, _messages(question, system_prompt))
+
+    except LLMUnavailable:
+        raise
+    except Exception as e:
+        print(f"❌ LLM runtime error: {e}")
+        return LLM_ERROR_MESSAGE
+
+
+async def stream_llm(question: str, system_prompt: Optional[str] = None) -> AsyncIterator[str]:
+    """
+    Yield answer tokens as the LLM produces them.
+    A disabled LLM yields the disabled message once; API errors (and
+    LLMUnavailable) are raised so the caller can end its stream with an
+    error. Providers are tried in order until one opens a stream; once a
+    token has been sent there is no fallback (and no hedging). The
+    scheduler slot is held until the stream ends.
+    """
+
+    providers = _available_providers()
+    if not providers:
+        yield LLM_DISABLED_MESSAGE
+        return
+
+    messages = _messages(question, system_prompt)
+    for index, provider in enumerate(providers):
+        scheduler = get_scheduler(provider.name)
+        sent = False
+        try:
+            async with scheduler.slot():
+                tokens = await scheduler.call(lambda: provider.open_stream(messages))
+                async for token in tokens:
+                    sent = True
+                    yield token
+            return
+        except Exception as e:
+            if sent or index == len(providers) - 1:
+                raise
+            _hedge_stats["fallbacks"] += 1
+            print(f"❌ LLM provider {provider.name} failed: {e}; falling back to {providers[index + 1].name}")
+
+
+def ask_llm(question: str, system_prompt: Optional[str] = None) -> str:
+    """
+    Ask the LLM safely (blocking; for scripts, not async routes).
+    Never crashes the app.
+    """
+
+    if _groq_client is None:
+        _initialize_groq()
+
+    if _groq_client is None:
+        return LLM_DISABLED_MESSAGE
+
     try:
         completion = _groq_client.chat.completions.create(
             model=_llm_model,
-            messages=messages,
+            messages=_messages(question, system_prompt),
             temperature=_llm_temperature,
             max_tokens=_llm_max_tokens,
         )
@@ -98,7 +655,7 @@ def ask_llm(question: str, system_prompt: Optional[str] = None) -> str:
 
     except Exception as e:
         print(f"❌ LLM runtime error: {e}")
-        return "LLM error occurred"
+        return LLM_ERROR_MESSAGE
 
 
 # Backwards compatibility
@@ -106,6 +663,9 @@ class LLMService:
     def ask(self, question: str, system_prompt: Optional[str] = None, **_) -> str:
         return ask_llm(question, system_prompt)
 
+    async def ask_async(self, question: str, system_prompt: Optional[str] = None, **_) -> str:
+        return await ask_llm_async(question, system_prompt)
+
 
 def get_llm_service():
     return LLMService()
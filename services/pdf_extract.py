@@ -0,0 +1,151 @@
+"""
+PDF text extraction and chunking
+CPU-bound ingest work that runs inside ingest worker processes.
+Deliberately free of app imports other than settings (no DB, logger or
+vector store) so worker processes start quickly and hold no shared state.
+Large PDFs are extracted as page ranges in several workers at once;
+each range reports per-page timings.
+Chunking can also run window by window (chunk_window) so a document is
+never held in memory as one string. Chunks carry the page they start and
+end on and their character offsets in the "\n"-joined page texts.
+"""
+import io
+import time
+from bisect import bisect_right
+from PyPDF2 import PdfReader
+
+from config.settings import settings
+from services.chunker import TextChunker
+from services.text_cache import PageCacheWriter
+
+def get_chunk_params(text):
+    """Metin uzunluğuna göre dinamik chunk parametreleri"""
+    return chunk_params_for_length(len(text))
+
+def chunk_params_for_length(length):
+    """get_chunk_params for a (possibly estimated) text length"""
+    if length < 10_000:
+        return settings.CHUNK_SIZE_SMALL, settings.CHUNK_OVERLAP_SMALL
+    elif length < 50_000:
+        return settings.CHUNK_SIZE_MEDIUM, settings.CHUNK_OVERLAP_MEDIUM
+    else:
+        return settings.CHUNK_SIZE_LARGE, settings.CHUNK_OVERLAP_LARGE
+
+def _open_reader(source):
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    return PdfReader(source)
+
+def count_pages(source):
+    """Number of pages in a PDF (bytes or file path)"""
+    return len(_open_reader(source).pages)
+
+def extract_page_range(source, start, stop):
+    """
+    Extract text of pages [start, stop).
+    Returns [(page_number, text, seconds)] with 1-based page numbers.
+    """
+    reader = _open_reader(source)
+    pages = []
+    for i in range(start, min(stop, len(reader.pages))):
+        page_start = time.perf_counter()
+        text = reader.pages[i].extract_text() or ""
+        pages.append((i + 1, text, time.perf_counter() - page_start))
+    return pages
+
+def split_page_ranges(total_pages, parts):
+    """Split [0, total_pages) into at most `parts` contiguous ranges"""
+    parts = max(1, min(parts, total_pages))
+    size, extra = divmod(total_pages, parts)
+    ranges, start = [], 0
+    for i in range(parts):
+        stop = start + size + (1 if i < extra else 0)
+        ranges.append((start, stop))
+        start = stop
+    return ranges
+
+def chunk_window(carry, pages, chunk_size, chunk_overlap, final=False):
+    """
+    Chunk `carry` followed by the next window of (page_number, text) pages.
+    Unless `final`, the last chunk is held back and returned as the new carry,
+    so it keeps growing into the next window instead of being cut at the
+    page break. `carry` is None for the first window.
+    Returns (chunks, carry); chunks are (text, metadata) pairs with page,
+    page_end, char_start and char_end.
+    """
+    if carry:
+        parts, starts, numbers = [carry["text"]], list(carry["starts"]), list(carry["pages"])
+        offset, position = carry["offset"], len(carry["text"]) + 1
+    else:
+        parts, starts, numbers = [], [], []
+        offset, position = 0, 0
+    for number, page in pages:
+        if not page:
+            continue
+        parts.append(page)
+        starts.append(position)
+        numbers.append(number)
+        position += len(page) + 1
+
+    text = "\n".join(parts)
+    if not text:
+        return [], carry
+    spans = TextChunker(chunk_size, chunk_overlap).split_spans(text)
+    emit = spans if final else spans[:-1]
+    chunks = [
+        (text[start:end], {
+            "page": numbers[bisect_right(starts, start) - 1],
+            "page_end": numbers[bisect_right(starts, end - 1) - 1],
+            "char_start": offset + start,
+            "char_end": offset + end
+        })
+        for start, end in emit
+    ]
+    if final:
+        return chunks, None
+
+    tail = spans[-1][0] if len(spans) > 1 else 0
+    first = bisect_right(starts, tail) - 1
+    return chunks, {
+        "text": text[tail:],
+        "offset": offset + tail,
+        "starts": [max(start - tail, 0) for start in starts[first:]],
+        "pages": numbers[first:]
+    }
+
+def chunk_pages(page_texts):
+    """Join non-empty page texts and split them into chunks"""
+    texts = [text for text in page_texts if text]
+    if not texts:
+        return {
+            "status": "error",
+            "message": "PDF'den metin çıkarılamadı"
+        }
+
+    text_length = sum(len(text) for text in texts) + len(texts) - 1
+    chunk_size, chunk_overlap = chunk_params_for_length(text_length)
+    chunks, _ = chunk_window(None, list(enumerate(page_texts, 1)), chunk_size, chunk_overlap, final=True)
+    return {
+        "status": "success",
+        "text_length": text_length,
+        "chunks": [text for text, _ in chunks],
+        "chunk_metadata": [metadata for _, metadata in chunks],
+        "chunk_size": chunk_size,
+        "chunk_overlap": chunk_overlap
+    }
+
+def extract_and_chunk(source, pdf_hash=None):
+    """
+    Parse a PDF (bytes or file path) in this process and chunk its text.
+    With pdf_hash, the page texts are also written to the text cache.
+    Returns a plain dict so it can cross the process boundary.
+    """
+    pages = extract_page_range(source, 0, count_pages(source))
+    result = chunk_pages([text for _, text, _ in pages])
+    if result["status"] == "success":
+        result["pages"] = len(pages)
+        if pdf_hash and settings.TEXT_CACHE_ENABLED:
+            writer = PageCacheWriter(pdf_hash, len(pages))
+            writer.write([(number, text) for number, text, _ in pages])
+            writer.commit()
+    return result
@@ -5,93 +5,310 @@ Created on Thu Jan 22 19:51:05 2026
 @author: eren
 """
 
-import uuid
+import asyncio
+import heapq
+import os
+import time
 import hashlib
-import io  # ✅ Eklenmeli
-from PyPDF2 import PdfReader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from services.vector_service import add_to_vectorstore, is_pdf_exists
+from collections import deque
+from config.settings import settings
+from services.ingest_pool import run_in_ingest_pool
+from services.pdf_extract import (
+    chunk_params_for_length, chunk_window, count_pages, extract_page_range, split_page_ranges
+)
+from services.text_cache import PageCacheWriter, open_cached_pages
+from services.vector_service import add_to_vectorstore
+
+class UploadTooLarge(Exception):
+    """Upload MAX_FILE_SIZE_MB sınırını aştı"""
 
 def get_pdf_hash(file_bytes):
     """PDF'in MD5 hash'ini hesapla"""
     return hashlib.md5(file_bytes).hexdigest()
 
-def get_chunk_params(text):
-    """Metin uzunluğuna göre dinamik chunk parametreleri"""
-    length = len(text)
-    if length < 10_000:
-        return 300, 50
-    elif length < 50_000:
-        return 500, 100
-    else:
-        return 800, 150
+def get_file_hash(path, block_size=None):
+    """Diskteki dosyanın MD5 hash'i, UPLOAD_BLOCK_SIZE bloklar halinde okunur"""
+    block_size = block_size or settings.UPLOAD_BLOCK_SIZE
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
 
-async def process_pdf(file):
-    """PDF dosyasını işle ve vector store'a ekle"""
+async def spool_upload(file, path, max_bytes, block_size=None):
+    """
+    Upload'ı sabit boyutlu bloklar halinde diske yaz.
+    Hash ve boyut akış sırasında hesaplanır; dosyanın tamamı bellekte tutulmaz.
+    Sınır aşılırsa yarım dosya silinir ve UploadTooLarge fırlatılır.
+    Returns (pdf_hash, size).
+    """
+    block_size = block_size or settings.UPLOAD_BLOCK_SIZE
+    digest = hashlib.md5()
+    size = 0
+    out = await asyncio.to_thread(open, path, "wb")
     try:
-        doc_id = str(uuid.uuid4())
-        
-        # PDF binary oku
-        file_bytes = await file.read()
-        pdf_hash = get_pdf_hash(file_bytes)
-        
-        # ✅ DÜZELTME: BytesIO kullan
-        pdf_file = io.BytesIO(file_bytes)
-        reader = PdfReader(pdf_file)
+        while True:
+            block = await file.read(block_size)
+            if not block:
+                break
+            size += len(block)
+            if size > max_bytes:
+                raise UploadTooLarge(f"Upload exceeds {max_bytes} bytes")
+            digest.update(block)
+            await asyncio.to_thread(out.write, block)
+    except BaseException:
+        out.close()
+        await asyncio.to_thread(os.remove, path)
+        raise
+    await asyncio.to_thread(out.close)
+    return digest.hexdigest(), size
+
+def spool_fileobj(fileobj, path, max_bytes, block_size=None):
+    """
+    spool_upload'ın senkron hali (zip üyeleri, yerel dosyalar).
+    Returns (pdf_hash, size); sınır aşılırsa UploadTooLarge.
+    """
+    block_size = block_size or settings.UPLOAD_BLOCK_SIZE
+    digest = hashlib.md5()
+    size = 0
+    try:
+        with open(path, "wb") as out:
+            while True:
+                block = fileobj.read(block_size)
+                if not block:
+                    break
+                size += len(block)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"Upload exceeds {max_bytes} bytes")
+                digest.update(block)
+                out.write(block)
+    except BaseException:
+        os.remove(path)
+        raise
+    return digest.hexdigest(), size
+
+async def iter_page_batches(source, progress=None, timings=None):
+    """
+    Sayfaları INGEST_PAGE_BATCH'lik pencereler halinde, sırayla üret.
+    Aynı anda en fazla INGEST_WORKERS pencere çıkarılır (büyük PDF'lerde
+    paralel, küçüklerde tek pencere), böylece bellekte sınırlı sayfa kalır.
+    Yields [(page_number, text, seconds)]; timings dict'i sonunda doldurulur.
+    """
+    started = time.perf_counter()
+    timings = {} if timings is None else timings
+    total_pages = await run_in_ingest_pool(count_pages, source)
+    timings["pages"] = total_pages
+    if progress:
+        progress(pages_total=total_pages, pages_done=0)
+    parallel = settings.INGEST_WORKERS > 1 and total_pages >= settings.PDF_PARALLEL_PAGE_THRESHOLD
+    windows = split_page_ranges(total_pages, max(
+        -(-total_pages // settings.INGEST_PAGE_BATCH),
+        settings.INGEST_WORKERS * 2 if parallel else 1
+    ))
+    in_flight = settings.INGEST_WORKERS if parallel else 1
+    
+    page_seconds, slowest = [], []
+    pages_done = 0
+    pending = deque()
+    
+    async def take():
+        nonlocal pages_done
+        batch = await pending.popleft()
+        for number, _, seconds in batch:
+            page_seconds.append(seconds)
+            heapq.heappush(slowest, (seconds, number))
+            if len(slowest) > 5:
+                heapq.heappop(slowest)
+        pages_done += len(batch)
+        if progress:
+            progress(pages_done=pages_done)
+        return batch
+    
+    try:
+        for start, stop in windows:
+            pending.append(asyncio.ensure_future(
+                run_in_ingest_pool(extract_page_range, source, start, stop)))
+            if len(pending) >= in_flight:
+                yield await take()
+        while pending:
+            yield await take()
+    finally:
+        for future in pending:
+            future.cancel()
+    
+    timings.update({
+        "extract_seconds": round(time.perf_counter() - started, 4),
+        "page_seconds_total": round(sum(page_seconds), 4),
+        "page_ranges": len(windows),
+        "slowest_pages": [
+            {"page": number, "seconds": round(seconds, 4)}
+            for seconds, number in sorted(slowest, reverse=True)
+        ],
+        "page_seconds": [round(seconds, 4) for seconds in page_seconds]
+    })
+
+async def extract_pages(source, progress=None):
+    """
+    Tüm sayfa metinlerini çıkar.
+    Returns (page_texts, timings) - page_texts sayfa sırasında.
+    """
+    timings = {}
+    page_texts = []
+    async for batch in iter_page_batches(source, progress, timings):
+        page_texts.extend(text for _, text, _ in batch)
+    return page_texts, timings
+
+async def iter_cached_batches(reader, progress=None, timings=None):
+    """
+    Önbellekteki sayfa metinlerini INGEST_PAGE_BATCH'lik pencereler halinde üret.
+    PDF hiç açılmaz; iter_page_batches ile aynı şekli döner.
+    """
+    started = time.perf_counter()
+    timings = {} if timings is None else timings
+    timings["pages"] = reader.total_pages
+    if progress:
+        progress(pages_total=reader.total_pages, pages_done=0)
+    pages_done = windows = 0
+    try:
+        while True:
+            pages = await asyncio.to_thread(reader.read_batch, settings.INGEST_PAGE_BATCH)
+            if not pages:
+                break
+            windows += 1
+            pages_done += len(pages)
+            if progress:
+                progress(pages_done=pages_done)
+            yield [(number, text, 0.0) for number, text in pages]
+    finally:
+        reader.close()
+    
+    timings.update({
+        "extract_seconds": round(time.perf_counter() - started, 4),
+        "page_seconds_total": 0.0,
+        "page_ranges": windows,
+        "slowest_pages": [],
+        "page_seconds": [],
+        "text_cache": "hit"
+    })
+
+async def iter_chunk_batches(batches, timings, stats):
+    """
+    Sayfa pencerelerini chunk listelerine çevir: [(text, metadata)].
+    Her pencerenin son chunk'ı sonraki pencereye taşınır (sayfa sınırında kesilmez).
+    stats: pages, text_length, chunk_size, chunk_overlap
+    """
+    stats.update(pages=0, text_length=0, chunk_size=None, chunk_overlap=None)
+    carry = None
+    async for batch in batches:
+        texts = [(number, text) for number, text, _ in batch if text]
+        stats["pages"] += len(batch)
+        stats["text_length"] += sum(len(text) for _, text in texts)
+        if stats["chunk_size"] is None:
+            if not texts:
+                continue
+            # Toplam uzunluk ilk metinli pencereden tahmin edilir
+            estimate = stats["text_length"] * timings["pages"] // stats["pages"]
+            stats["chunk_size"], stats["chunk_overlap"] = chunk_params_for_length(estimate)
         
-        # PDF text extraction
-        texts = []
-        total_pages = len(reader.pages)
-        print(f"PDF işleniyor: {total_pages} sayfa")
+        # ✅ Chunk'lama ayrı process'te
+        chunks, carry = await run_in_ingest_pool(
+            chunk_window, carry, texts, stats["chunk_size"], stats["chunk_overlap"])
+        yield chunks
+    
+    if stats["chunk_size"] is not None:
+        chunks, _ = await run_in_ingest_pool(
+            chunk_window, carry, [], stats["chunk_size"], stats["chunk_overlap"], final=True)
+        yield chunks
+
+async def ingest_pdf(source, doc_id, pdf_hash, filename, progress=None):
+    """
+    PDF'i (bytes veya dosya yolu) verilen doc_id ile parse et, chunk'la ve indexle.
+    Sayfa -> chunk -> index pencere pencere akar: her pencerenin chunk'ları
+    hemen aranabilir olur, belge hiçbir zaman tek string olarak tutulmaz.
+    Sayfa metinleri pdf_hash ile önbelleğe yazılır; önbellekte varsa PDF hiç parse edilmez.
+    progress(**fields): pages_total, pages_done, chunks_indexed güncellemeleri.
+    Hata durumunda eklenen chunk'lar çağıran tarafından silinir (purge_document).
+    """
+    timings, stats = {}, {}
+    emitted = 0
+    writer = None
+    
+    async def index(chunks):
+        nonlocal emitted
+        if not chunks:
+            return
+        emitted += len(chunks)
+        # ✅ Metadata (sayfa, karakter aralığı) ile vector db'ye ekle (indexleme thread'de)
+        result = await asyncio.to_thread(
+            add_to_vectorstore,
+            chunks=[text for text, _ in chunks],
+            doc_id=doc_id,
+            pdf_hash=pdf_hash,  # Metadata'ya eklenecek
+            filename=filename,
+            start_index=emitted - len(chunks),
+            chunk_metadata=[metadata for _, metadata in chunks]
+        )
+        if not result["success"]:
+            raise RuntimeError(result["error"])
+        if progress:
+            progress(chunks_indexed=emitted)
+    
+    async def caching(batches):
+        # Çıkarılan sayfaları indexlenirken önbelleğe de yaz
+        nonlocal writer
+        async for batch in batches:
+            if writer is None:
+                writer = await asyncio.to_thread(PageCacheWriter, pdf_hash, timings["pages"])
+            await asyncio.to_thread(writer.write, [(number, text) for number, text, _ in batch])
+            yield batch
+    
+    try:
+        reader = await asyncio.to_thread(open_cached_pages, pdf_hash)
+        if reader is not None:
+            batches = iter_cached_batches(reader, progress, timings)
+        else:
+            batches = iter_page_batches(source, progress, timings)
+            if settings.TEXT_CACHE_ENABLED and pdf_hash:
+                batches = caching(batches)
         
-        for i, page in enumerate(reader.pages, 1):
-            page_text = page.extract_text()
-            if page_text:
-                texts.append(page_text)
-            if i % 50 == 0:  # Her 50 sayfada progress
-                print(f"İşlenen sayfa: {i}/{total_pages}")
+        async for chunks in iter_chunk_batches(batches, timings, stats):
+            await index(chunks)
         
-        if not texts:
+        if stats["chunk_size"] is None:
             return {
                 "status": "error",
+                "doc_id": doc_id,
+                "pdf_hash": pdf_hash,
                 "message": "PDF'den metin çıkarılamadı"
             }
+        if writer is not None:
+            await asyncio.to_thread(writer.commit)
+            writer = None
         
-        full_text = "\n".join(texts)
-        print(f"Toplam metin uzunluğu: {len(full_text)} karakter")
-        
-        # Dinamik chunk ayarı
-        chunk_size, chunk_overlap = get_chunk_params(full_text)
-        print(f"Chunk parametreleri: size={chunk_size}, overlap={chunk_overlap}")
-        
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-            separators=["\n\n", "\n", ".", " ", ""]
-        )
-        chunks = splitter.split_text(full_text)
-        print(f"Oluşturulan chunk sayısı: {len(chunks)}")
-        
-        # ✅ Metadata ile vector db'ye ekle
-        add_to_vectorstore(
-            chunks=chunks,
-            doc_id=doc_id,
-            pdf_hash=pdf_hash,  # Metadata'ya eklenecek
-            filename=file.filename if hasattr(file, 'filename') else 'unknown.pdf'
-        )
+        print(f"PDF işlendi: {stats['pages']} sayfa, {stats['text_length']} karakter, "
+              f"{timings['extract_seconds']}s ({timings['page_ranges']} pencere)")
+        print(f"Chunk parametreleri: size={stats['chunk_size']}, overlap={stats['chunk_overlap']}")
+        print(f"Oluşturulan chunk sayısı: {emitted}")
         
         return {
             "status": "success",
             "doc_id": doc_id,
             "pdf_hash": pdf_hash,
-            "pages": total_pages,
-            "chunks": len(chunks),
-            "chunk_size": chunk_size
+            "pages": stats["pages"],
+            "chunks": emitted,
+            "chunk_size": stats["chunk_size"],
+            "timings": timings
         }
     
     except Exception as e:
         print(f"❌ PDF işleme hatası: {e}")
         return {
             "status": "error",
+            "doc_id": doc_id,
+            "pdf_hash": pdf_hash,
             "message": str(e)
-        }
\ No newline at end of file
+        }
+    
+    finally:
+        if writer is not None:
+            await asyncio.to_thread(writer.discard)
@@ -0,0 +1,292 @@
+"""
+Quantized embedding storage
+- ScalarQuantizer: 8-bit codes with per-dimension ranges (4x smaller)
+- ProductQuantizer: one byte per sub-vector (dimension / m bytes per vector)
+- QuantizedIndex: scores compressed codes, then re-scores the top
+  candidates in full precision through a caller-supplied function
+Run `python -m services.quantization` to compare recall against float32
+on the current chunk store.
+"""
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from services.ann_index import kmeans
+from services.dense_index import DenseIndex, top_k
+
+_BLOCK_ROWS = 16_384  # codes are stored and scored in fixed-size blocks
+
+
+class ScalarQuantizer:
+    """uint8 code per dimension over the [min, max] range seen in training"""
+
+    def __init__(self, dimension: int):
+        self.dimension = dimension
+        self.code_size = dimension
+        self._low: Optional[np.ndarray] = None
+        self._step: Optional[np.ndarray] = None
+
+    @property
+    def is_trained(self) -> bool:
+        return self._low is not None
+
+    def train(self, vectors: np.ndarray):
+        self._low = vectors.min(axis=0)
+        span = vectors.max(axis=0) - self._low
+        self._step = np.where(span > 0, span / 255.0, 1.0).astype(np.float32)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        codes = np.rint((vectors - self._low) / self._step)
+        return np.clip(codes, 0, 255).astype(np.uint8)
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return codes.astype(np.float32) * self._step + self._low
+
+    def prepare(self, query: np.ndarray):
+        # q.v ~= q.low + (q * step).code
+        return query * self._step, float(query @ self._low)
+
+    def score(self, codes: np.ndarray, state) -> np.ndarray:
+        weights, offset = state
+        return codes.astype(np.float32) @ weights + offset
+
+
+class ProductQuantizer:
+    """m sub-quantizers with 256 centroids each; inner products via lookup tables"""
+
+    def __init__(self, dimension: int, m: int = 96, iterations: int = 8, seed: int = 0):
+        if dimension % m:
+            raise ValueError(f"Embedding dimension {dimension} is not divisible by PQ m={m}")
+        self.dimension = dimension
+        self.m = m
+        self.code_size = m
+        self.sub_dim = dimension // m
+        self.iterations = iterations
+        self.seed = seed
+        self.codebooks: Optional[np.ndarray] = None  # (m, 256, sub_dim)
+
+    @property
+    def is_trained(self) -> bool:
+        return self.codebooks is not None
+
+    def _split(self, vectors: np.ndarray) -> np.ndarray:
+        return vectors.reshape(len(vectors), self.m, self.sub_dim)
+
+    def train(self, vectors: np.ndarray):
+        subs = self._split(vectors)
+        self.codebooks = np.zeros((self.m, 256, self.sub_dim), dtype=np.float32)
+        for j in range(self.m):
+            centroids = kmeans(np.ascontiguousarray(subs[:, j]), 256, iterations=self.iterations,
+                               seed=self.seed + j, spherical=False)
+            self.codebooks[j, :len(centroids)] = centroids
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        subs = self._split(vectors)
+        codes = np.empty((len(vectors), self.m), dtype=np.uint8)
+        for j in range(self.m):
+            book = self.codebooks[j]
+            distances = (subs[:, j] @ book.T) - 0.5 * np.einsum("ij,ij->i", book, book)
+            codes[:, j] = np.argmax(distances, axis=1)
+        return codes
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        parts = self.codebooks[np.arange(self.m), codes]  # (n, m, sub_dim)
+        return parts.reshape(len(codes), self.dimension)
+
+    def prepare(self, query: np.ndarray) -> np.ndarray:
+        # lookup table (m, 256): partial inner product of each sub-query with each centroid
+        return np.einsum("jkd,jd->jk", self.codebooks, query.reshape(self.m, self.sub_dim))
+
+    def score(self, codes: np.ndarray, table: np.ndarray) -> np.ndarray:
+        return table[np.arange(self.m), codes].sum(axis=1, dtype=np.float32)
+
+
+def get_quantizer(method: str, dimension: int, pq_m: int = 96):
+    if method == "int8":
+        return ScalarQuantizer(dimension)
+    if method == "pq":
+        return ProductQuantizer(dimension, m=pq_m)
+    raise ValueError(f"Unknown quantization method: {method}")
+
+
+class QuantizedIndex:
+    """
+    Brute-force search over quantized codes.
+    Vectors are kept in float32 only until `train_size` have arrived to fit
+    the quantizer; after that only codes are resident.
+    """
+
+    def __init__(
+        self,
+        quantizer,
+        rescore_fn: Optional[Callable[[List[int]], np.ndarray]] = None,
+        rescore_factor: int = 4,
+        train_size: int = 4096
+    ):
+        self.quantizer = quantizer
+        self.dimension = quantizer.dimension
+        self.rescore_fn = rescore_fn
+        self.rescore_factor = rescore_factor
+        self.train_size = train_size
+        self._pending: Optional[DenseIndex] = DenseIndex(self.dimension)
+        self._blocks: List[np.ndarray] = []
+        self._size = 0
+        self._coded = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def memory_bytes(self) -> int:
+        """Resident bytes for vectors or codes"""
+        if self._pending is not None:
+            return len(self._pending) * self.dimension * 4
+        return len(self._blocks) * _BLOCK_ROWS * self.quantizer.code_size
+
+    def _append_codes(self, codes: np.ndarray):
+        written = 0
+        while written < len(codes):
+            offset = self._coded % _BLOCK_ROWS
+            if offset == 0:
+                self._blocks.append(np.zeros((_BLOCK_ROWS, self.quantizer.code_size), dtype=np.uint8))
+            take = min(_BLOCK_ROWS - offset, len(codes) - written)
+            self._blocks[-1][offset:offset + take] = codes[written:written + take]
+            written += take
+            self._coded += take
+
+    def add(self, vectors: np.ndarray) -> range:
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dimension)
+        first = self._size
+        self._size += len(vectors)
+
+        if self._pending is None:
+            self._append_codes(self.quantizer.encode(vectors))
+        else:
+            self._pending.add(vectors)
+            if len(self._pending) >= self.train_size:
+                self._train()
+        return range(first, self._size)
+
+    def _train(self):
+        vectors = self._pending.vectors
+        self.quantizer.train(vectors)
+        for start in range(0, len(vectors), _BLOCK_ROWS):
+            self._append_codes(self.quantizer.encode(vectors[start:start + _BLOCK_ROWS]))
+        self._pending = None
+
+    def _approximate_scores(self, query: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        state = self.quantizer.prepare(query)
+        if rows is not None:
+            return self.quantizer.score(self._gather_codes(rows), state)
+
+        scores = np.empty(self._size, dtype=np.float32)
+        for i, block in enumerate(self._blocks):
+            start = i * _BLOCK_ROWS
+            count = min(_BLOCK_ROWS, self._size - start)
+            scores[start:start + count] = self.quantizer.score(block[:count], state)
+        return scores
+
+    def _gather_codes(self, rows: np.ndarray) -> np.ndarray:
+        codes = np.empty((len(rows), self.quantizer.code_size), dtype=np.uint8)
+        block_ids = rows // _BLOCK_ROWS
+        for block_id in np.unique(block_ids):
+            selected = block_ids == block_id
+            codes[selected] = self._blocks[block_id][rows[selected] % _BLOCK_ROWS]
+        return codes
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int = 5,
+        rescore: bool = True,
+        rows: Optional[np.ndarray] = None
+    ) -> List[Tuple[int, float]]:
+        """Top-k (row_id, score); candidates re-scored in float32 when possible"""
+        if self._size == 0 or k <= 0:
+            return []
+        query = np.asarray(query, dtype=np.float32)
+        if self._pending is not None:
+            return self._pending.search(query, k, rows=rows)
+
+        scores = self._approximate_scores(query, rows)
+        row_ids = (lambda i: i) if rows is None else (lambda i: int(rows[i]))
+        if not rescore or self.rescore_fn is None:
+            return [(row_ids(i), score) for i, score in top_k(scores, k)]
+
+        candidates = [row_ids(i) for i, _ in top_k(scores, k * self.rescore_factor)]
+        if not candidates:
+            return []
+        exact = np.asarray(self.rescore_fn(candidates), dtype=np.float32) @ query
+        return [(candidates[i], score) for i, score in top_k(exact, k)]
+
+
+def quantization_report(
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    k: int = 10,
+    methods: Sequence[str] = ("int8", "pq"),
+    pq_m: int = 96,
+    rescore_factor: int = 4
+) -> List[Dict]:
+    """
+    Recall@k of each quantization method against float32 exact search,
+    with and without full-precision re-scoring, plus memory per vector.
+    """
+    exact = DenseIndex(vectors.shape[1])
+    exact.add(vectors)
+    truth = [{row for row, _ in exact.search(q, k)} for q in queries]
+    total = sum(len(t) for t in truth) or 1
+
+    report = [{
+        "method": "float32",
+        "bytes_per_vector": vectors.shape[1] * 4,
+        "compression": 1.0,
+        "recall": 1.0,
+        "recall_rescored": 1.0,
+        "latency_ms": None
+    }]
+    for method in methods:
+        quantizer = get_quantizer(method, vectors.shape[1], pq_m)
+        index = QuantizedIndex(quantizer, rescore_fn=lambda rows: vectors[rows],
+                               rescore_factor=rescore_factor, train_size=len(vectors))
+        index.add(vectors)
+
+        started = time.perf_counter()
+        raw = [{row for row, _ in index.search(q, k, rescore=False)} for q in queries]
+        latency_ms = (time.perf_counter() - started) * 1000 / max(len(queries), 1)
+        rescored = [{row for row, _ in index.search(q, k)} for q in queries]
+        report.append({
+            "method": method,
+            "bytes_per_vector": quantizer.code_size,
+            "compression": vectors.shape[1] * 4 / quantizer.code_size,
+            "recall": sum(len(f & t) for f, t in zip(raw, truth)) / total,
+            "recall_rescored": sum(len(f & t) for f, t in zip(rescored, truth)) / total,
+            "latency_ms": latency_ms
+        })
+    return report
+
+
+if __name__ == "__main__":
+    from config.settings import settings
+    from services.embeddings import get_embedder
+    from services.chunk_store import ChunkStore
+
+    store = ChunkStore(settings.VECTOR_STORE_DIR)
+    embedder = get_embedder()
+    vectors = np.concatenate([
+        embedder.embed([store.get_text(i) for i in range(start, min(start + 1024, len(store)))])
+        for start in range(0, len(store), 1024)
+    ]) if len(store) else np.empty((0, embedder.dimension), dtype=np.float32)
+    if len(vectors) < 256:
+        raise SystemExit(f"Need at least 256 chunks to train PQ, found {len(vectors)}")
+
+    rng = np.random.default_rng(0)
+    sample = rng.choice(len(store), min(200, len(store)), replace=False)
+    queries = embedder.embed([store.get_text(int(i))[:200] for i in sample])
+    print(f"{len(vectors)} chunks, dimension={embedder.dimension}")
+    print(f"{'method':>8} {'bytes':>6} {'ratio':>6} {'recall@10':>10} {'rescored':>9}")
+    for row in quantization_report(vectors, queries, pq_m=settings.PQ_SUBQUANTIZERS,
+                                   rescore_factor=settings.QUANTIZATION_RESCORE_FACTOR):
+        print(f"{row['method']:>8} {row['bytes_per_vector']:>6} {row['compression']:>6.1f} "
+              f"{row['recall']:>10.3f} {row['recall_rescored']:>9.3f}")
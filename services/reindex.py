@@ -0,0 +1,120 @@
+"""
+Re-index documents from the extracted page text cache
+- Re-chunks every cached document with the current CHUNK_SIZE_* /
+  CHUNK_OVERLAP_* settings into a staging store, then swaps it in
+- PDFs are never parsed again; documents without cached text keep their
+  existing chunks
+- Chunks appended while the rebuild runs (new uploads) are carried over
+Run `python -m services.reindex` to rebuild offline.
+"""
+import asyncio
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select, update
+
+from db.database import AsyncSessionLocal
+from db.models import Document
+from services.answer_cache import invalidate_documents
+from services.pdf_processor import iter_cached_batches, iter_chunk_batches
+from services.text_cache import open_cached_pages
+from services.vector_service import (
+    append_staging, build_records, copy_chunks, open_staging_store, swap_vectorstore, tombstone_count
+)
+from utils.logger import logger
+
+_reindex_lock = asyncio.Lock()
+
+
+class ReindexInProgress(Exception):
+    """Raised when a rebuild is already running in this process"""
+
+
+async def reindex_documents(documents: List[Tuple[str, str, str]]) -> Dict:
+    """
+    Rebuild chunks for (doc_id, pdf_hash, filename) documents from cached text.
+    Returns totals plus per-document chunk counts and chunk sizes.
+    """
+    started = time.perf_counter()
+    staging = await asyncio.to_thread(open_staging_store)
+    rebuilt: Dict[str, Dict] = {}
+    missing: List[str] = []
+    pages = 0
+
+    for doc_id, pdf_hash, filename in documents:
+        reader = await asyncio.to_thread(open_cached_pages, pdf_hash)
+        if reader is None:
+            missing.append(doc_id)
+            continue
+        timings, stats = {}, {}
+        count = 0
+        async for chunks in iter_chunk_batches(iter_cached_batches(reader, timings=timings), timings, stats):
+            records = build_records([text for text, _ in chunks], doc_id, pdf_hash, filename,
+                                    start_index=count, chunk_metadata=[metadata for _, metadata in chunks])
+            await asyncio.to_thread(append_staging, staging, records)
+            count += len(chunks)
+        rebuilt[doc_id] = {"chunks": count, "chunk_size": stats["chunk_size"] or 0, "pages": stats["pages"]}
+        pages += stats["pages"]
+
+    def keep(metadata: Dict) -> bool:
+        return metadata.get("doc_id") not in rebuilt
+
+    tombstones_seen = await asyncio.to_thread(tombstone_count)
+    copied_until = await asyncio.to_thread(copy_chunks, staging, keep)
+    await asyncio.to_thread(swap_vectorstore, staging, keep, copied_until, tombstones_seen)
+
+    seconds = time.perf_counter() - started
+    logger.info(f"🔁 Re-indexed {len(rebuilt)} documents ({pages} pages) from cached text in {seconds:.2f}s; "
+                f"{len(missing)} without cache kept as-is")
+    return {
+        "documents": len(documents),
+        "rebuilt": len(rebuilt),
+        "missing": missing,
+        "pages": pages,
+        "chunks": sum(doc["chunks"] for doc in rebuilt.values()),
+        "seconds": round(seconds, 3),
+        "per_document": rebuilt
+    }
+
+
+async def reindex_all(doc_ids: Optional[List[str]] = None) -> Dict:
+    """Re-index completed documents (all, or only doc_ids) and update their rows"""
+    if _reindex_lock.locked():
+        raise ReindexInProgress("A re-index is already running")
+    async with _reindex_lock:
+        async with AsyncSessionLocal() as session:
+            query = select(Document.doc_id, Document.pdf_hash, Document.filename).where(
+                Document.status == "completed")
+            if doc_ids:
+                query = query.where(Document.doc_id.in_(doc_ids))
+            documents = [tuple(row) for row in (await session.execute(query)).all()]
+
+        report = await reindex_documents(documents)
+
+        async with AsyncSessionLocal() as session:
+            for doc_id, doc in report["per_document"].items():
+                await session.execute(
+                    update(Document).where(Document.doc_id == doc_id)
+                    .values(chunks=doc["chunks"], chunk_size=doc["chunk_size"])
+                )
+            await session.commit()
+        # answers were built from the old chunks
+        await invalidate_documents(report["per_document"])
+        return report
+
+
+if __name__ == "__main__":
+    from db.database import close_db, init_db
+    from services.ingest_pool import shutdown_ingest_pool
+
+    async def main():
+        await init_db()
+        report = await reindex_all()
+        await close_db()
+        shutdown_ingest_pool()
+        print(f"{report['rebuilt']}/{report['documents']} documents, {report['pages']} pages, "
+              f"{report['chunks']} chunks in {report['seconds']}s")
+        if report["missing"]:
+            print(f"No cached text (kept as-is): {', '.join(report['missing'])}")
+
+    asyncio.run(main())
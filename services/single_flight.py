@@ -0,0 +1,40 @@
+"""
+Single-flight request coalescing
+- Concurrent calls with the same key share one execution: the first
+  caller starts it, later callers await the same result (or exception)
+- The shared work runs in its own task, so a caller that disconnects
+  does not cancel it for the others
+- The key is released as soon as the work finishes; later calls start
+  fresh (repeated questions are then served by the answer cache)
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class SingleFlight:
+    """Coalesces concurrent awaitable calls by key"""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self.coalesced = 0  # calls that joined an execution already in flight
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Result of fn() for key, and whether it was shared with an earlier caller"""
+        task = self._calls.get(key)
+        shared = task is not None
+        if shared:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._release(key, done))
+        return await asyncio.shield(task), shared
+
+    def _release(self, key: Hashable, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # retrieved even if every caller went away
@@ -0,0 +1,77 @@
+"""
+Extracted page text cache
+- Content-addressed by pdf_hash: <TEXT_CACHE_DIR>/<hash[:2]>/<hash>.jsonl.gz
+- gzip-compressed JSON lines: a {"pages": N} header, then one
+  {"page": n, "text": ...} record per page
+- Written page window by page window during ingestion and renamed into
+  place only once complete, so a cached entry is never partial
+- Lets chunk settings change and the index be rebuilt without running
+  PDF extraction again
+"""
+import gzip
+import json
+import os
+from typing import List, Optional, Tuple
+
+from config.settings import settings
+
+
+def cache_path(pdf_hash: str) -> str:
+    return os.path.join(settings.TEXT_CACHE_DIR, pdf_hash[:2], f"{pdf_hash}.jsonl.gz")
+
+
+def has_pages(pdf_hash: str) -> bool:
+    return bool(pdf_hash) and os.path.exists(cache_path(pdf_hash))
+
+
+class PageCacheWriter:
+    """Streams page texts into a temporary file; commit() publishes it"""
+
+    def __init__(self, pdf_hash: str, total_pages: int):
+        self.path = cache_path(pdf_hash)
+        self._tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._file = gzip.open(self._tmp_path, "wt", encoding="utf-8", compresslevel=settings.TEXT_CACHE_COMPRESSION)
+        self._file.write(json.dumps({"pages": total_pages}) + "\n")
+
+    def write(self, pages: List[Tuple[int, str]]):
+        for number, text in pages:
+            self._file.write(json.dumps({"page": number, "text": text}, ensure_ascii=False) + "\n")
+
+    def commit(self):
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+
+    def discard(self):
+        self._file.close()
+        try:
+            os.remove(self._tmp_path)
+        except FileNotFoundError:
+            pass
+
+
+class PageCacheReader:
+    """Reads cached pages back in batches"""
+
+    def __init__(self, pdf_hash: str):
+        self._file = gzip.open(cache_path(pdf_hash), "rt", encoding="utf-8")
+        self.total_pages = json.loads(self._file.readline())["pages"]
+
+    def read_batch(self, size: int) -> List[Tuple[int, str]]:
+        pages = []
+        for line in self._file:
+            record = json.loads(line)
+            pages.append((record["page"], record["text"]))
+            if len(pages) >= size:
+                break
+        return pages
+
+    def close(self):
+        self._file.close()
+
+
+def open_cached_pages(pdf_hash: str) -> Optional[PageCacheReader]:
+    """Reader for a cached PDF, or None when its text was never cached"""
+    if not settings.TEXT_CACHE_ENABLED or not has_pages(pdf_hash):
+        return None
+    return PageCacheReader(pdf_hash)
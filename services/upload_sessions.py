@@ -0,0 +1,222 @@
+"""
+Resumable chunked uploads
+- A session reserves <UPLOAD_DIR>/.sessions/<upload_id>.part plus a JSON
+  sidecar (filename, declared size, expiry), so it survives restarts
+- Clients PUT byte ranges in order; the committed offset is the size of
+  the part file, and a retried range may overlap bytes already written
+- Sizes are checked against MAX_FILE_SIZE_MB when the session is created
+  and again while each range streams in
+- Once every byte is in, the part file is hashed and handed to the ingest
+  queue exactly like a /upload spool file
+- Sessions idle for UPLOAD_SESSION_TTL_SECONDS are removed
+"""
+import asyncio
+import json
+import os
+import re
+import time
+import uuid
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+from config.settings import settings
+from services.pdf_processor import UploadTooLarge, get_file_hash
+from utils.logger import logger
+
+_locks: Dict[str, asyncio.Lock] = {}  # upload_id -> serializes writes / completion
+_RANGE = re.compile(r"^bytes (\d+)-(\d+)/(\d+|\*)$")
+
+
+class UploadSessionNotFound(Exception):
+    """Unknown, expired or already completed upload session"""
+
+
+class UploadBodyMismatch(Exception):
+    """Request body length differs from its Content-Range"""
+
+
+class UploadRangeError(Exception):
+    """Range does not continue the committed bytes (or the upload is incomplete)"""
+
+    def __init__(self, message: str, offset: int):
+        super().__init__(message)
+        self.offset = offset
+
+
+def sessions_dir() -> str:
+    return os.path.join(settings.UPLOAD_DIR, ".sessions")
+
+
+def _canonical_id(upload_id: str) -> str:
+    try:
+        return str(uuid.UUID(upload_id))
+    except ValueError:
+        raise UploadSessionNotFound(f"Upload session {upload_id} not found")
+
+
+def _paths(upload_id: str) -> Tuple[str, str]:
+    base = os.path.join(sessions_dir(), _canonical_id(upload_id))
+    return f"{base}.part", f"{base}.json"
+
+
+def _session_lock(upload_id: str) -> asyncio.Lock:
+    """Lock of an existing session; unknown ids never get one"""
+    _, meta_path = _paths(upload_id)
+    if not os.path.exists(meta_path):
+        raise UploadSessionNotFound(f"Upload session {upload_id} not found")
+    return _locks.setdefault(_canonical_id(upload_id), asyncio.Lock())
+
+
+def _save(session: Dict):
+    _, meta_path = _paths(session["upload_id"])
+    fields = {key: session[key] for key in ("upload_id", "filename", "size", "created_at", "expires_at")}
+    with open(f"{meta_path}.tmp", "w") as f:
+        json.dump(fields, f)
+    os.replace(f"{meta_path}.tmp", meta_path)
+
+
+def _max_bytes() -> int:
+    return settings.MAX_FILE_SIZE_MB * 1024 * 1024
+
+
+def create_session(filename: str, size: int) -> Dict:
+    """Reserve a part file for an upload of size bytes"""
+    if size > _max_bytes():
+        raise UploadTooLarge(f"Upload exceeds {_max_bytes()} bytes")
+    cleanup_expired_sessions()
+    os.makedirs(sessions_dir(), exist_ok=True)
+    now = time.time()
+    session = {
+        "upload_id": str(uuid.uuid4()),
+        "filename": filename,
+        "size": size,
+        "created_at": now,
+        "expires_at": now + settings.UPLOAD_SESSION_TTL_SECONDS
+    }
+    part_path, _ = _paths(session["upload_id"])
+    open(part_path, "wb").close()
+    _save(session)
+    return dict(session, offset=0)
+
+
+def get_session(upload_id: str) -> Dict:
+    """Session metadata plus the committed offset"""
+    part_path, meta_path = _paths(upload_id)
+    try:
+        with open(meta_path) as f:
+            session = json.load(f)
+        session["offset"] = os.path.getsize(part_path)
+    except (FileNotFoundError, ValueError):
+        raise UploadSessionNotFound(f"Upload session {upload_id} not found")
+    if session["expires_at"] < time.time():
+        discard_session(upload_id)
+        raise UploadSessionNotFound(f"Upload session {upload_id} expired")
+    return session
+
+
+def discard_session(upload_id: str):
+    for path in _paths(upload_id):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    _locks.pop(_canonical_id(upload_id), None)
+
+
+def cleanup_expired_sessions() -> int:
+    """Remove sessions past their expiry; returns how many were dropped"""
+    if not os.path.isdir(sessions_dir()):
+        return 0
+    now = time.time()
+    removed = 0
+    for name in os.listdir(sessions_dir()):
+        if not name.endswith(".json"):
+            continue
+        upload_id = name[:-len(".json")]
+        try:
+            with open(os.path.join(sessions_dir(), name)) as f:
+                expired = json.load(f)["expires_at"] < now
+        except (OSError, ValueError, KeyError):
+            expired = True
+        if expired:
+            discard_session(upload_id)
+            removed += 1
+    if removed:
+        logger.info(f"🧹 Removed {removed} expired upload sessions")
+    return removed
+
+
+def parse_content_range(header: Optional[str], session: Dict) -> Tuple[int, Optional[int]]:
+    """
+    (start, end) from "bytes start-end/total"; end is inclusive.
+    Without a header the body is appended at the committed offset.
+    """
+    if not header:
+        return session["offset"], None
+    match = _RANGE.match(header.strip())
+    if not match:
+        raise UploadRangeError(f"Malformed Content-Range: {header}", session["offset"])
+    start, end, total = int(match.group(1)), int(match.group(2)), match.group(3)
+    if end < start or (total != "*" and int(total) != session["size"]):
+        raise UploadRangeError(f"Content-Range {header} does not match a {session['size']} byte upload",
+                               session["offset"])
+    return start, end
+
+
+async def write_range(upload_id: str, content_range: Optional[str], body: AsyncIterator[bytes]) -> Dict:
+    """
+    Stream one byte range into the part file.
+    The range must start at or before the committed offset; bytes received
+    before a dropped connection stay committed, so the client resumes from there.
+    A body that ends short of (or past) its Content-Range is rolled back.
+    """
+    async with _session_lock(upload_id):
+        session = await asyncio.to_thread(get_session, upload_id)
+        start, end = parse_content_range(content_range, session)
+        if start > session["offset"]:
+            raise UploadRangeError(f"Range starts at {start}, expected {session['offset']}", session["offset"])
+        if end is not None and end >= session["size"]:
+            raise UploadRangeError(f"Range ends past the declared size ({session['size']} bytes)",
+                                   session["offset"])
+
+        part_path, _ = _paths(upload_id)
+        out = await asyncio.to_thread(open, part_path, "r+b")
+        position = start
+        try:
+            out.seek(start)
+            async for block in body:
+                if position + len(block) > session["size"]:
+                    raise UploadTooLarge(f"Upload exceeds its declared size ({session['size']} bytes)")
+                await asyncio.to_thread(out.write, block)
+                position += len(block)
+            if end is not None and position != end + 1:
+                await asyncio.to_thread(out.truncate, session["offset"])
+                raise UploadBodyMismatch(f"Body has {position - start} bytes, Content-Range {content_range} "
+                                         f"announces {end + 1 - start}")
+        finally:
+            await asyncio.to_thread(out.close)
+            # progress keeps an active session alive
+            session["expires_at"] = time.time() + settings.UPLOAD_SESSION_TTL_SECONDS
+            await asyncio.to_thread(_save, session)
+
+        session["offset"] = await asyncio.to_thread(os.path.getsize, part_path)
+        return session
+
+
+async def complete_session(upload_id: str) -> Tuple[Dict, str, str]:
+    """
+    Check every byte has arrived and hash the assembled file.
+    Returns (session, part_path, pdf_hash); the caller moves or discards the part.
+    """
+    async with _session_lock(upload_id):
+        session = await asyncio.to_thread(get_session, upload_id)
+        if session["offset"] != session["size"]:
+            raise UploadRangeError(f"Upload incomplete: {session['offset']} of {session['size']} bytes",
+                                   session["offset"])
+        part_path, _ = _paths(upload_id)
+        pdf_hash = await asyncio.to_thread(get_file_hash, part_path)
+        return session, part_path, pdf_hash
+
+
+def finish_session(upload_id: str):
+    """Forget a completed session (its part file has been moved or discarded)"""
+    discard_session(upload_id)
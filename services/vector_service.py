@@ -1,92 +1,692 @@
 """
-Simplified Vector Service - Without Heavy ML Dependencies
-Uses in-memory storage as fallback
+Vector Service - Persistent chunk store with BM25 and dense retrieval
+Chunks are appended to a memory-mapped on-disk store and indexed
+incrementally on insert, either into a BM25 inverted index or into a
+NumPy embedding matrix (RETRIEVAL_MODE), searched exactly or through an
+IVF approximate index (VECTOR_INDEX_TYPE), optionally stored as int8 / PQ
+codes with full-precision re-scoring (EMBEDDING_QUANTIZATION).
+Dense embeddings are persisted next to the store, so reopening it (restart,
+sibling worker, swapped-in rebuild) only embeds chunks it has not seen.
+Chunks are partitioned by doc_id (runs of chunk ids per document), so
+searches scoped to one or more documents touch only their partitions.
+Chunks of a failed ingest are tombstoned in the store: they drop out of
+the partitions and the hash index, and global searches filter them out.
+With VECTOR_STORE_SHARED, every worker process on the host maps the same
+store and periodically indexes chunks appended by its siblings.
+A rebuilt store (re-chunking from cached page text) is filled off to the
+side and swapped in whole; sibling processes notice and reopen it. A
+reopened store is indexed before searches switch over to it.
+Indexing may run in a background thread: writers are serialized by
+_write_lock and mutate the indexes in short batches under _lock, which
+searches also take.
 """
-from typing import List, Dict, Optional
+import os
+import shutil
+import threading
+import time
+from contextlib import nullcontext
+from typing import Callable, List, Dict, Optional, Set, Tuple, Union
+
+import numpy as np
+
+from config.settings import settings
+from services.ann_index import IVFIndex
+from services.chunk_store import ChunkStore, StoreReplaced
+from services.dense_index import DenseIndex, ranges_to_rows
+from services.embeddings import get_embedder
+from services.inverted_index import InvertedIndex
+from services.quantization import QuantizedIndex, get_quantizer
 from utils.logger import logger
 
-# In-memory storage as fallback
-_documents_store = []
+_EMBED_BATCH_SIZE = 256
+_QUERY_BLOCK_SIZE = 64  # queries scored per matrix product in batch search
+
+# Chunk storage; chunk id in the store == row id in every index
+_documents_store: Optional[ChunkStore] = None
+_index: Optional[InvertedIndex] = None
+_dense = None  # DenseIndex, IVFIndex or QuantizedIndex
+_embedder = None
+_retrieval_mode = "bm25"
+_doc_ranges: Dict[str, List[List[int]]] = {}  # doc_id -> [start, stop) chunk id runs
+_hash_index: Dict[str, str] = {}  # pdf_hash -> doc_id
+_dead: Set[int] = set()  # tombstoned chunk ids (still in the indexes until a rebuild)
+_tombstones_applied = 0  # store.tombstones() entries already reflected above
+_config: Dict = {"embedder": None, "index_type": "flat", "quantization": "none"}
+_last_refresh = 0.0
+_lock = threading.RLock()        # guards index structures (readers + mutation)
+_write_lock = threading.RLock()  # serializes appends / index building
+
+def init_vectorstore(
+    directory: Optional[str] = None,
+    persist: Optional[bool] = None,
+    retrieval_mode: Optional[str] = None,
+    embedder=None,
+    index_type: Optional[str] = None,
+    quantization: Optional[str] = None
+) -> ChunkStore:
+    """
+    (Re)open the chunk store and rebuild the in-memory indexes from it.
+    Defaults to VECTOR_STORE_DIR when persistence is enabled.
+    """
+    global _retrieval_mode, _embedder
+
+    if persist is None:
+        persist = settings.VECTOR_STORE_PERSIST
+    if directory is None and persist:
+        directory = settings.VECTOR_STORE_DIR
+    _retrieval_mode = retrieval_mode or settings.RETRIEVAL_MODE
+    if _retrieval_mode not in ("bm25", "dense"):
+        raise ValueError(f"Unknown retrieval mode: {_retrieval_mode}")
+    index_type = index_type or settings.VECTOR_INDEX_TYPE
+    if index_type not in ("flat", "ivf"):
+        raise ValueError(f"Unknown vector index type: {index_type}")
+    quantization = quantization or settings.EMBEDDING_QUANTIZATION
+    if quantization != "none" and index_type != "flat":
+        raise ValueError("EMBEDDING_QUANTIZATION requires VECTOR_INDEX_TYPE=flat")
+
+    if _retrieval_mode == "dense":
+        embedder = embedder or get_embedder()
+    _config.update(embedder=embedder, index_type=index_type, quantization=quantization)
+    with _write_lock:
+        _embedder = embedder
+        _open_indexes(ChunkStore(directory if persist else None))
+
+    mode = f"{_retrieval_mode}/{index_type}" if _dense is not None else _retrieval_mode
+    if isinstance(_dense, QuantizedIndex):
+        mode += f"/{quantization}"
+    logger.info(f"📦 Vector store opened ({len(_documents_store)} chunks, {mode}, "
+                f"{'dir: ' + directory if persist else 'in-memory'})")
+    return _documents_store
+
+def _new_indexes(store: ChunkStore) -> Dict:
+    """Empty index structures for `store`, not yet live"""
+    dense = None
+    if _retrieval_mode == "dense":
+        dimension = _embedder.dimension
+        store.bind_vectors(getattr(_embedder, "name", type(_embedder).__name__), dimension)
+        if _config["index_type"] == "ivf":
+            dense = IVFIndex(dimension, nlist=settings.IVF_NLIST, nprobe=settings.IVF_NPROBE)
+        elif _config["quantization"] != "none":
+            dense = QuantizedIndex(
+                get_quantizer(_config["quantization"], dimension, settings.PQ_SUBQUANTIZERS),
+                rescore_fn=_rescore_vectors,
+                rescore_factor=settings.QUANTIZATION_RESCORE_FACTOR,
+                train_size=settings.QUANTIZATION_TRAIN_SIZE
+            )
+        else:
+            dense = DenseIndex(dimension)
+    return {
+        "store": store,
+        "index": InvertedIndex(k1=settings.BM25_K1, b=settings.BM25_B),
+        "dense": dense,
+        "doc_ranges": {},
+        "hash_index": {},
+        "dead": set(),
+        "tombstones": 0
+    }
+
+def _live_indexes() -> Dict:
+    """The live structures in _new_indexes() form (containers shared, not copied)"""
+    return {
+        "store": _documents_store,
+        "index": _index,
+        "dense": _dense,
+        "doc_ranges": _doc_ranges,
+        "hash_index": _hash_index,
+        "dead": _dead,
+        "tombstones": _tombstones_applied
+    }
+
+def _open_indexes(store: ChunkStore) -> ChunkStore:
+    """
+    Index `store` from scratch off to the side, then make it live; searches
+    keep using the previous indexes meanwhile. The previous store is closed.
+    Caller holds _write_lock.
+    """
+    global _documents_store, _index, _dense, _doc_ranges, _hash_index, _dead, _tombstones_applied
+
+    built = _new_indexes(store)
+    _index_pending(built, nullcontext())
+    with _lock:
+        previous = _documents_store
+        _documents_store, _index, _dense = built["store"], built["index"], built["dense"]
+        _doc_ranges, _hash_index, _dead = built["doc_ranges"], built["hash_index"], built["dead"]
+        _tombstones_applied = built["tombstones"]
+        if previous is not None and previous is not store:
+            previous.close()
+    return store
+
+def _get_store() -> ChunkStore:
+    if _documents_store is None:
+        init_vectorstore()
+    return _documents_store
+
+def _rescore_vectors(chunk_ids: List[int]):
+    """Full-precision embeddings for quantized-search candidates (persisted, else recomputed from text)"""
+    if chunk_ids and max(chunk_ids) < _documents_store.vector_count():
+        return _documents_store.get_vectors(chunk_ids)
+    return _embedder.embed([_documents_store.get_text(chunk_id) for chunk_id in chunk_ids])
+
+def _track_partition(indexes: Dict, chunk_id: int):
+    """Extend the owning document's partition with a newly indexed chunk"""
+    if chunk_id in indexes["dead"]:
+        return
+    metadata = indexes["store"].get_metadata(chunk_id)
+    if metadata.get("pdf_hash"):
+        indexes["hash_index"].setdefault(metadata["pdf_hash"], metadata.get("doc_id"))
+    runs = indexes["doc_ranges"].setdefault(metadata.get("doc_id"), [])
+    if runs and runs[-1][1] == chunk_id:
+        runs[-1][1] += 1
+    else:
+        runs.append([chunk_id, chunk_id + 1])
+
+def _apply_tombstones(indexes: Dict):
+    """Drop newly tombstoned chunks from the partitions and the hash index"""
+    store, dead = indexes["store"], indexes["dead"]
+    doc_ranges, hash_index = indexes["doc_ranges"], indexes["hash_index"]
+    spans = store.tombstones()[indexes["tombstones"]:]
+    if not spans:
+        return
+    indexes["tombstones"] += len(spans)
+    indexed = _indexed_count(indexes)
+    affected = set()
+    for start, stop in spans:
+        dead.update(range(start, stop))
+        affected.update(store.get_metadata(chunk_id).get("doc_id")
+                        for chunk_id in range(start, min(stop, indexed)))
+
+    for doc_id in affected & doc_ranges.keys():
+        live = []
+        for start, stop in doc_ranges[doc_id]:
+            for chunk_id in range(start, stop):
+                if chunk_id in dead:
+                    continue
+                if live and live[-1][1] == chunk_id:
+                    live[-1][1] += 1
+                else:
+                    live.append([chunk_id, chunk_id + 1])
+        if live:
+            doc_ranges[doc_id] = live
+        else:
+            del doc_ranges[doc_id]
+
+    # another live document with the same content takes over the hash
+    orphaned = {pdf_hash for pdf_hash, doc_id in hash_index.items() if doc_id not in doc_ranges}
+    for pdf_hash in orphaned:
+        del hash_index[pdf_hash]
+    for doc_id, runs in doc_ranges.items():
+        pdf_hash = store.get_metadata(runs[0][0]).get("pdf_hash")
+        if pdf_hash in orphaned:
+            hash_index.setdefault(pdf_hash, doc_id)
+
+def _apply_live_tombstones():
+    """Apply tombstones the live store has loaded to the live indexes (caller holds _write_lock)"""
+    global _tombstones_applied
+    with _lock:
+        live = _live_indexes()
+        _apply_tombstones(live)
+        _tombstones_applied = live["tombstones"]
+
+def _live_hits(hits: List[Tuple[int, float]], k: int) -> List[Tuple[int, float]]:
+    """Top-k hits without tombstoned chunks (global searches over-fetch by len(_dead))"""
+    return [hit for hit in hits if hit[0] not in _dead][:k] if _dead else hits
 
-def add_to_vectorstore(chunks: List[str], doc_id: str, pdf_hash: str = None, filename: str = None):
+def _scope_ranges(doc_id: Union[str, List[str], None]) -> Optional[List[Tuple[int, int]]]:
+    """Sorted chunk id spans for the requested documents; None means the global view"""
+    if not doc_id:
+        return None
+    doc_ids = [doc_id] if isinstance(doc_id, str) else doc_id
+    return sorted(tuple(run) for d in set(doc_ids) for run in _doc_ranges.get(d, ()))
+
+def _indexed_count(indexes: Optional[Dict] = None) -> int:
+    dense, index = (indexes["dense"], indexes["index"]) if indexes else (_dense, _index)
+    return len(dense) if dense is not None else len(index)
+
+def _chunk_vectors(store: ChunkStore, chunk_ids: range):
+    """
+    Embeddings for a batch of chunk ids: persisted rows are read back,
+    the rest are embedded and persisted for the next open
+    """
+    persisted = min(max(store.vector_count(), chunk_ids.start), chunk_ids.stop)
+    parts = []
+    if persisted > chunk_ids.start:
+        parts.append(store.get_vectors(range(chunk_ids.start, persisted)))
+    if persisted < chunk_ids.stop:
+        fresh = _embedder.embed([store.get_text(chunk_id) for chunk_id in range(persisted, chunk_ids.stop)])
+        store.append_vectors(persisted, fresh)
+        parts.append(fresh)
+    return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+def _train_ivf(dense: IVFIndex, lock):
+    """Fit IVF centroids on a snapshot outside `lock`, then swap them in under it"""
+    with lock:
+        snapshot = dense.vectors
+    fitted = dense.fit(snapshot)
+    with lock:
+        dense.install(*fitted, len(snapshot))
+
+def _index_pending(indexes: Dict, lock):
     """
-    Add chunks to in-memory store (simplified version)
-    For full vector search, install: pip install sentence-transformers chromadb langchain-chroma
+    Index every chunk of indexes["store"] that the indexes have not seen yet.
+    Embedding and IVF training happen outside `lock`; readers only wait for
+    one batch insert (untrained IVF searches are exact meanwhile).
+    """
+    store, index, dense = indexes["store"], indexes["index"], indexes["dense"]
+    with lock:
+        _apply_tombstones(indexes)
+    start = _indexed_count(indexes)
+    while start < len(store):
+        chunk_ids = range(start, min(start + _EMBED_BATCH_SIZE, len(store)))
+        if dense is not None:
+            texts, vectors = [None] * len(chunk_ids), _chunk_vectors(store, chunk_ids)
+        else:
+            texts, vectors = [store.get_text(chunk_id) for chunk_id in chunk_ids], None
+        with lock:
+            for chunk_id, text in zip(chunk_ids, texts):
+                _track_partition(indexes, chunk_id)
+                if dense is None:
+                    index.add(chunk_id, text)
+            if isinstance(dense, IVFIndex):
+                dense.add(vectors, train=False)
+            elif dense is not None:
+                dense.add(vectors)
+        if isinstance(dense, IVFIndex) and dense.needs_training:
+            _train_ivf(dense, lock)
+        start = chunk_ids.stop
+
+def _sync_index():
+    """Index every stored chunk the live indexes have not seen yet"""
+    global _tombstones_applied
+    with _write_lock:
+        live = _live_indexes()
+        _index_pending(live, _lock)
+        _tombstones_applied = live["tombstones"]
+
+def refresh_vectorstore() -> int:
+    """
+    Pick up chunks appended by other worker processes.
+    Returns the number of newly indexed chunks.
+    """
+    global _last_refresh
+    with _write_lock:
+        store = _get_store()
+        if store.is_replaced():
+            # another process swapped in a rebuilt store: start over from it
+            _open_indexes(ChunkStore(store.directory))
+            _last_refresh = time.monotonic()
+            return _indexed_count()
+        before = _indexed_count()
+        store.refresh()
+        _sync_index()
+    _last_refresh = time.monotonic()
+    return _indexed_count() - before
+
+def _maybe_refresh():
+    if settings.VECTOR_STORE_SHARED and \
+            time.monotonic() - _last_refresh >= settings.VECTOR_STORE_REFRESH_INTERVAL:
+        refresh_vectorstore()
+
+def build_records(
+    chunks: List[str],
+    doc_id: str,
+    pdf_hash: str = None,
+    filename: str = None,
+    start_index: int = 0,
+    chunk_metadata: Optional[List[Dict]] = None
+) -> List[Tuple[str, str, Dict]]:
+    """(id, text, metadata) store records for one document's chunks"""
+    return [
+        (
+            f"{doc_id}_{i}",
+            chunk,
+            {
+                "doc_id": doc_id,
+                "pdf_hash": pdf_hash,
+                "filename": filename,
+                "chunk_index": i,
+                **(chunk_metadata[i - start_index] if chunk_metadata else {})
+            }
+        )
+        for i, chunk in enumerate(chunks, start_index)
+    ]
+
+def _append(records: List[Tuple[str, str, Dict]]) -> range:
+    """Append to the live store, reopening it first if a sibling swapped in a rebuild (caller holds _write_lock)"""
+    try:
+        return _get_store().append(records)
+    except StoreReplaced:
+        refresh_vectorstore()
+        return _documents_store.append(records)
+
+def add_to_vectorstore(
+    chunks: List[str],
+    doc_id: str,
+    pdf_hash: str = None,
+    filename: str = None,
+    start_index: int = 0,
+    chunk_metadata: Optional[List[Dict]] = None
+):
+    """
+    Append chunks to the store and index them.
+    start_index numbers chunks when a document is added in several batches;
+    chunk_metadata (e.g. page, char_start) is merged into each chunk's metadata.
     """
     try:
-        logger.warning("⚠️ Using simplified in-memory storage. Install full dependencies for vector search.")
-        
-        for i, chunk in enumerate(chunks):
-            _documents_store.append({
-                "id": f"{doc_id}_{i}",
-                "content": chunk,
-                "metadata": {
-                    "doc_id": doc_id,
-                    "pdf_hash": pdf_hash,
-                    "filename": filename,
-                    "chunk_index": i
-                }
-            })
-        
+        records = build_records(chunks, doc_id, pdf_hash, filename, start_index, chunk_metadata)
+        with _write_lock:
+            _append(records)
+            _sync_index()
+
         logger.info(f"✅ Added {len(chunks)} chunks to storage (doc_id: {doc_id})")
         return {"success": True, "chunks_added": len(chunks)}
-        
+
+    except Exception as e:
+        logger.error(f"❌ Error adding to store: {e}")
+        return {"success": False, "error": str(e)}
+
+def add_documents_to_vectorstore(documents: List[Dict]):
+    """
+    Append several documents' chunks with one store append and one index pass.
+    Each document: doc_id, chunks, and optionally pdf_hash, filename, chunk_metadata.
+    """
+    try:
+        records = []
+        for doc in documents:
+            records += build_records(doc["chunks"], doc["doc_id"], doc.get("pdf_hash"),
+                                     doc.get("filename"), chunk_metadata=doc.get("chunk_metadata"))
+        with _write_lock:
+            _append(records)
+            _sync_index()
+
+        logger.info(f"✅ Added {len(records)} chunks from {len(documents)} documents to storage")
+        return {"success": True, "chunks_added": len(records)}
+
     except Exception as e:
         logger.error(f"❌ Error adding to store: {e}")
         return {"success": False, "error": str(e)}
 
-def search_vector_db(query: str, k: int = 5, doc_id: Optional[str] = None) -> List[Dict]:
+def _search_bm25(query: str, k: int, ranges: Optional[List[Tuple[int, int]]]) -> List[Tuple[int, float]]:
+    if ranges is not None:
+        return _index.search(query, k=k, ranges=ranges)
+    return _live_hits(_index.search(query, k=k + len(_dead)), k)
+
+def _search_dense(query: str, k: int, ranges: Optional[List[Tuple[int, int]]]) -> List[Tuple[int, float]]:
+    query_vector = _embedder.embed([query])[0]
+    if ranges is not None:
+        hits = _dense.search(query_vector, k=k, rows=ranges_to_rows(ranges))
+    else:
+        hits = _live_hits(_dense.search(query_vector, k=k + len(_dead)), k)
+    return [(chunk_id, score) for chunk_id, score in hits if score > settings.DENSE_MIN_SCORE]
+
+def search_vector_db(query: str, k: int = 5, doc_id: Union[str, List[str], None] = None) -> List[Dict]:
     """
-    Simple keyword-based search (fallback)
-    For semantic search, install: pip install sentence-transformers chromadb
+    Search the active index (BM25 or dense) for the top-k chunks.
+    doc_id may be a single document id or a list of them.
     """
     try:
-        logger.warning("⚠️ Using simple keyword search. Install full dependencies for semantic search.")
-        
-        # Filter by doc_id if provided
-        docs = _documents_store
-        if doc_id:
-            docs = [d for d in docs if d["metadata"].get("doc_id") == doc_id]
-        
-        if not docs:
+        store = _get_store()
+        _maybe_refresh()
+        if not len(store):
             logger.info("No documents found in storage")
             return []
-        
-        # Simple keyword matching
-        query_lower = query.lower()
-        results = []
-        
-        for doc in docs:
-            content_lower = doc["content"].lower()
-            # Simple relevance score based on keyword presence
-            score = sum(1 for word in query_lower.split() if word in content_lower)
-            
-            if score > 0:
+
+        with _lock:
+            store = _documents_store  # the indexes' own store: a rebuild may have swapped both
+            ranges = _scope_ranges(doc_id)
+            if ranges == []:
+                return []
+
+            if _dense is not None:
+                hits = _search_dense(query, k, ranges)
+            else:
+                hits = _search_bm25(query, k, ranges)
+
+            results = []
+            for chunk_id, score in hits:
+                record = store.get_record(chunk_id)
                 results.append({
-                    "content": doc["content"],
-                    "metadata": doc["metadata"],
+                    "content": record["content"],
+                    "metadata": record["metadata"],
                     "score": float(score)
                 })
-        
-        # Sort by score and return top k
-        results.sort(key=lambda x: x["score"], reverse=True)
-        results = results[:k]
-        
-        logger.info(f"🔍 Found {len(results)} results using keyword search")
+
+        logger.info(f"🔍 Found {len(results)} results using {_retrieval_mode} search")
         return results
-        
+
     except Exception as e:
         logger.error(f"❌ Search error: {e}")
         return []
 
+def _search_dense_batch(
+    queries: List[str], ks: List[int], ranges: List[Optional[List[Tuple[int, int]]]]
+) -> List[List[Tuple[int, float]]]:
+    """
+    Dense hits for many queries: one embedding call, and queries with the
+    same scope scored together, a block at a time, by DenseIndex.search_many
+    """
+    vectors = _embedder.embed(queries)
+    hits: List[List[Tuple[int, float]]] = [[] for _ in queries]
+    groups: Dict[Optional[Tuple], List[int]] = {}
+    for i, scope in enumerate(ranges):
+        groups.setdefault(None if scope is None else tuple(map(tuple, scope)), []).append(i)
+
+    for scope, members in groups.items():
+        rows = ranges_to_rows(scope) if scope is not None else None
+        extra = len(_dead) if scope is None else 0  # partitions never hold tombstoned chunks
+        if not isinstance(_dense, DenseIndex):
+            # IVF / quantized indexes search one query at a time
+            for i in members:
+                hits[i] = _live_hits(_dense.search(vectors[i], k=ks[i] + extra, rows=rows), ks[i])
+            continue
+        for block in range(0, len(members), _QUERY_BLOCK_SIZE):
+            block_members = members[block:block + _QUERY_BLOCK_SIZE]
+            results = _dense.search_many(vectors[block_members], k=max(ks[i] for i in block_members) + extra,
+                                         rows=rows)
+            for i, result in zip(block_members, results):
+                hits[i] = _live_hits(result, ks[i])
+
+    return [[(chunk_id, score) for chunk_id, score in result if score > settings.DENSE_MIN_SCORE]
+            for result in hits]
+
+def search_vector_db_batch(
+    queries: List[str],
+    ks: List[int],
+    doc_ids: Optional[List[Union[str, List[str], None]]] = None
+) -> List[List[Dict]]:
+    """
+    search_vector_db for many queries at once, results in query order.
+    Takes the index lock once; dense retrieval embeds every query in one
+    call and scores them with matrix products. A failed search returns
+    empty results for the whole batch, as search_vector_db does per query.
+    """
+    doc_ids = doc_ids if doc_ids is not None else [None] * len(queries)
+    try:
+        store = _get_store()
+        _maybe_refresh()
+        if not len(store):
+            logger.info("No documents found in storage")
+            return [[] for _ in queries]
+
+        with _lock:
+            store = _documents_store
+            ranges = [_scope_ranges(doc_id) for doc_id in doc_ids]
+            active = [i for i, scope in enumerate(ranges) if scope != []]
+            hits: List[List[Tuple[int, float]]] = [[] for _ in queries]
+            if active and _dense is not None:
+                for i, result in zip(active, _search_dense_batch([queries[i] for i in active],
+                                                                 [ks[i] for i in active],
+                                                                 [ranges[i] for i in active])):
+                    hits[i] = result
+            else:
+                for i in active:
+                    hits[i] = _search_bm25(queries[i], ks[i], ranges[i])
+
+            results = []
+            for query_hits in hits:
+                chunks = []
+                for chunk_id, score in query_hits:
+                    record = store.get_record(chunk_id)
+                    chunks.append({
+                        "content": record["content"],
+                        "metadata": record["metadata"],
+                        "score": float(score)
+                    })
+                results.append(chunks)
+
+        logger.info(f"🔍 Searched {len(queries)} queries using {_retrieval_mode} search")
+        return results
+
+    except Exception as e:
+        logger.error(f"❌ Batch search error: {e}")
+        return [[] for _ in queries]
+
+def open_staging_store() -> ChunkStore:
+    """Empty store for a rebuild; swap_vectorstore() makes it live"""
+    live = _get_store()
+    if live.directory is None:
+        return ChunkStore()
+    staging = live.directory.rstrip(os.sep) + ".rebuild"
+    shutil.rmtree(staging, ignore_errors=True)
+    store = ChunkStore(staging)
+    if _dense is not None:
+        store.bind_vectors(getattr(_embedder, "name", type(_embedder).__name__), _embedder.dimension)
+    return store
+
+def append_staging(target: ChunkStore, records: List[Tuple[str, str, Dict]],
+                   source_ids: Optional[List[int]] = None) -> range:
+    """
+    Append records to a staging store; in dense mode their embeddings are
+    persisted with them (copied from the live store for source_ids when it
+    has them), so swapping the store in does not re-embed it
+    """
+    assigned = target.append(records)
+    if _dense is not None and target.directory:
+        live = _documents_store
+        if source_ids and max(source_ids) < live.vector_count():
+            vectors = live.get_vectors(source_ids)
+        else:
+            vectors = _embedder.embed([text for _, text, _ in records])
+        target.append_vectors(assigned.start, vectors)
+    return assigned
+
+def copy_chunks(target: ChunkStore, keep: Callable[[Dict], bool], start: int = 0) -> int:
+    """
+    Append live chunks from chunk id `start` on whose metadata passes keep().
+    Returns the live store length copied up to.
+    """
+    store = _get_store()
+    end = len(store)
+    batch, source_ids = [], []
+    for chunk_id in range(start, end):
+        if chunk_id in _dead:
+            continue
+        record = store.get_record(chunk_id)
+        if keep(record["metadata"]):
+            batch.append((record["id"], record["content"], record["metadata"]))
+            source_ids.append(chunk_id)
+        if len(batch) >= _EMBED_BATCH_SIZE:
+            append_staging(target, batch, source_ids)
+            batch, source_ids = [], []
+    if batch:
+        append_staging(target, batch, source_ids)
+    return end
+
+def tombstone_count() -> int:
+    """Tombstones of the live store so far; pass to swap_vectorstore() from before copy_chunks()"""
+    refresh_vectorstore()
+    return _tombstones_applied
+
+def _carry_tombstones(live: ChunkStore, staging: ChunkStore, tombstones_seen: int, copied_end: int):
+    """Tombstone the staging copies (below copied_end) of live chunks purged after copy_chunks() passed them"""
+    purged = {live.get_id(chunk_id)
+              for start, stop in live.tombstones()[tombstones_seen:] for chunk_id in range(start, stop)}
+    spans = []
+    for chunk_id in range(copied_end) if purged else ():
+        if staging.get_id(chunk_id) not in purged:
+            continue
+        if spans and spans[-1][1] == chunk_id:
+            spans[-1][1] += 1
+        else:
+            spans.append([chunk_id, chunk_id + 1])
+    if spans:
+        staging.tombstone([tuple(span) for span in spans])
+
+def swap_vectorstore(staging: ChunkStore, keep: Callable[[Dict], bool], copied_until: int,
+                     tombstones_seen: Optional[int] = None) -> ChunkStore:
+    """
+    Replace the live store with a rebuilt one.
+    The live store's writer lock is held while live chunks appended since
+    copy_chunks() ran (and passing keep) are carried over and the
+    directories are swapped, so no sibling append lands in the retired
+    store. Chunks purged since tombstone_count() returned tombstones_seen
+    are tombstoned in the rebuilt store too. Searches use the old indexes
+    until the new ones are built.
+    """
+    with _write_lock:
+        live = _get_store()
+        retired = None
+        with live.locked():
+            if live.is_replaced():
+                raise StoreReplaced("the live store was swapped by another rebuild")
+            live.refresh()
+            _apply_live_tombstones()
+            copied_end = len(staging)
+            copy_chunks(staging, keep, copied_until)
+            if tombstones_seen is not None:
+                _carry_tombstones(live, staging, tombstones_seen, copied_end)
+            staging.close()
+            if live.directory:
+                retired = live.directory.rstrip(os.sep) + ".old"
+                shutil.rmtree(retired, ignore_errors=True)
+                os.replace(live.directory, retired)
+                os.replace(staging.directory, live.directory)
+        if retired:
+            staging = ChunkStore(live.directory)
+        _open_indexes(staging)
+        if retired:
+            shutil.rmtree(retired, ignore_errors=True)
+    logger.info(f"🔁 Vector store rebuilt ({len(staging)} chunks)")
+    return staging
+
+def purge_document(doc_id: str) -> int:
+    """
+    Tombstone every stored chunk of doc_id (a failed or interrupted ingest).
+    Chunks appended for doc_id afterwards (a retry) stay visible.
+    Returns the number of chunks purged.
+    """
+    with _write_lock:
+        while True:
+            refresh_vectorstore()  # every stored chunk of doc_id must be in its partition
+            spans = [tuple(run) for run in _doc_ranges.get(doc_id, ())]
+            if not spans:
+                return 0
+            try:
+                _documents_store.tombstone(spans)
+                break
+            except StoreReplaced:
+                continue  # spans refer to the old store: look them up again
+        _sync_index()
+    purged = sum(stop - start for start, stop in spans)
+    logger.info(f"🗑️ Purged {purged} chunks of {doc_id}")
+    return purged
+
+def get_doc_id_by_hash(pdf_hash: str) -> Optional[str]:
+    """doc_id of an already indexed PDF with this content hash, if any"""
+    _get_store()
+    _maybe_refresh()
+    return _hash_index.get(pdf_hash)
+
+def get_document_chunk_count(doc_id: str) -> int:
+    """Number of indexed chunks belonging to doc_id"""
+    _get_store()
+    _maybe_refresh()
+    with _lock:
+        return sum(stop - start for start, stop in _doc_ranges.get(doc_id, ()))
+
 def is_pdf_exists(pdf_hash: str) -> bool:
     """Check if PDF exists in storage"""
-    return any(d["metadata"].get("pdf_hash") == pdf_hash for d in _documents_store)
+    return get_doc_id_by_hash(pdf_hash) is not None
 
-def search_similar(query: str, k: int = 5, doc_id: Optional[str] = None) -> List[Dict]:
+def search_similar(query: str, k: int = 5, doc_id: Union[str, List[str], None] = None) -> List[Dict]:
     """Alias for search_vector_db"""
     return search_vector_db(query, k, doc_id)
-
-# Fallback message
-logger.info("📦 Vector service loaded in SIMPLIFIED mode")
-logger.info("💡 For full semantic search, install: pip install sentence-transformers chromadb langchain-chroma langchain-huggingface")
\ No newline at end of file
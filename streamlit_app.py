@@ -1,3 +1,6 @@
+import json
+import time
+
 import streamlit as st
 import requests
 
@@ -24,9 +27,24 @@ if uploaded_file:
                     files={"file": (uploaded_file.name, uploaded_file, "application/pdf")}
                 )
 
-                if response.status_code == 200:
-                    st.success("PDF başarıyla yüklendi ve işlendi.")
-                    st.json(response.json())
+                if response.status_code in (200, 202):
+                    data = response.json()
+                    # 202: arka planda işleniyor, durum endpoint'ini takip et
+                    progress = st.progress(0.0)
+                    while data["status"] in ("processing", "queued"):
+                        time.sleep(1)
+                        data = requests.get(f"{API_URL}/documents/{data['doc_id']}/status").json()
+                        if data.get("pages_total"):
+                            progress.progress(min(data["pages_done"] / data["pages_total"], 1.0))
+                    progress.progress(1.0)
+
+                    if data["status"] == "failed":
+                        st.error("PDF işlenemedi")
+                    else:
+                        st.success("PDF başarıyla yüklendi ve işlendi.")
+                    st.json(data)
+                elif response.status_code == 503:
+                    st.warning("Sunucu meşgul, biraz sonra tekrar dene.")
                 else:
                     st.error("PDF yükleme başarısız")
                     st.text(response.text)
@@ -48,24 +66,48 @@ if st.button("Sor"):
     if question.strip() == "":
         st.warning("Lütfen bir soru gir.")
     else:
-        with st.spinner("Yanıt aranıyor..."):
-            try:
-                response = requests.post(
-                    f"{API_URL}/ask",
-                    params={"question": question, "k": k}
-                )
+        try:
+            # /ask/stream: önce kaynaklar, sonra token token cevap (SSE)
+            with requests.post(
+                f"{API_URL}/ask/stream",
+                params={"question": question, "k": k},
+                stream=True
+            ) as response:
 
                 if response.status_code == 200:
-                    data = response.json()
-
-                    if data["status"] == "no_results":
-                        st.warning(data["message"])
-                    else:
-                        st.success("Cevap:")
-                        st.write(data["answer"])
-
+                    answer_box = None
+                    answer = ""
+                    sources = []
+                    event = None
+
+                    for line in response.iter_lines(decode_unicode=True):
+                        if line.startswith("event: "):
+                            event = line[len("event: "):]
+                            continue
+                        if not line.startswith("data: "):
+                            continue
+                        data = json.loads(line[len("data: "):])
+
+                        if event == "sources":
+                            sources = data["sources"]
+                        elif event == "token":
+                            if answer_box is None:
+                                st.success("Cevap:")
+                                answer_box = st.empty()
+                            answer += data["text"]
+                            answer_box.markdown(answer + "▌")
+                        elif event == "done":
+                            if data["status"] == "no_results":
+                                st.warning(data["message"])
+                            elif answer_box is not None:
+                                answer_box.markdown(answer)
+                        elif event == "error":
+                            st.error("API hata verdi")
+                            st.text(data["detail"])
+
+                    if sources:
                         with st.expander("🔍 Kaynaklar"):
-                            for i, src in enumerate(data["sources"], 1):
+                            for i, src in enumerate(sources, 1):
                                 st.markdown(f"**Parça {i}:**")
                                 st.write(src["content"])
 
@@ -73,6 +115,6 @@ if st.button("Sor"):
                     st.error("API hata verdi")
                     st.text(response.text)
 
-            except Exception as e:
-                st.error("FastAPI çalışıyor mu?")
-                st.text(str(e))
+        except Exception as e:
+            st.error("FastAPI çalışıyor mu?")
+            st.text(str(e))
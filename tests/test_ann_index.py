@@ -0,0 +1,67 @@
+"""
+Tests for the IVF approximate nearest neighbour index
+"""
+import sys
+import os
+import numpy as np
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.ann_index import IVFIndex, kmeans, recall_report
+
+def _unit_vectors(n, dimension, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(n, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def test_kmeans_returns_unit_centroids():
+    """Test spherical k-means output shape and normalization"""
+    centroids = kmeans(_unit_vectors(200, 8), n_clusters=4)
+    assert centroids.shape == (4, 8)
+    assert np.allclose(np.linalg.norm(centroids, axis=1), 1.0, atol=1e-5)
+
+def test_ivf_trains_automatically_and_buckets_new_rows():
+    """Test training threshold and incremental insertion after training"""
+    index = IVFIndex(dimension=16, nlist=4, nprobe=1)
+    index.add(_unit_vectors(10, 16))
+    assert not index.is_trained
+
+    index.add(_unit_vectors(100, 16, seed=1))
+    assert index.is_trained
+    index.add(_unit_vectors(5, 16, seed=2))
+    assert sum(len(bucket) for bucket in index._lists) == len(index) == 115
+
+def test_ivf_fit_on_snapshot_then_install_buckets_later_rows():
+    """Test centroids fitted on a snapshot also bucket rows added before they are installed"""
+    index = IVFIndex(dimension=16, nlist=4, nprobe=4)
+    index.add(_unit_vectors(100, 16), train=False)
+    assert index.needs_training and not index.is_trained
+
+    snapshot = index.vectors
+    fitted = index.fit(snapshot)
+    index.add(_unit_vectors(7, 16, seed=1), train=False)
+    assert not index.is_trained
+    index.install(*fitted, len(snapshot))
+    assert index.is_trained and not index.needs_training
+    assert sorted(row for bucket in index._lists for row in bucket) == list(range(107))
+
+def test_ivf_recall_reaches_exact_when_probing_all_lists():
+    """Test recall report: full probe equals exact search, recall grows with nprobe"""
+    index = IVFIndex(dimension=16, nlist=8, nprobe=2)
+    index.add(_unit_vectors(500, 16))
+    queries = _unit_vectors(20, 16, seed=3)
+
+    report = recall_report(index, queries, k=5, nprobe_values=(1, 8))
+    assert [row["nprobe"] for row in report] == [1, 8]
+    assert report[-1]["recall"] == 1.0
+    assert report[0]["recall"] <= report[-1]["recall"]
+
+def test_ivf_scopes_search_to_rows():
+    """Test a row-scoped search only returns rows from that partition"""
+    index = IVFIndex(dimension=16, nlist=4, nprobe=4)
+    index.add(_unit_vectors(100, 16))
+    index.add(_unit_vectors(100, 16, seed=5))
+    hits = index.search(_unit_vectors(1, 16, seed=6)[0], k=10, rows=np.arange(100, 200))
+    assert len(hits) == 10
+    assert all(row >= 100 for row, _ in hits)
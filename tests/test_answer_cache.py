@@ -0,0 +1,135 @@
+"""
+Tests for the answer cache
+"""
+import sys
+import os
+import time
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.settings import settings
+from services import answer_cache
+
+class FakeRedis:
+    """In-memory stand-in for redis.asyncio.Redis (the calls the cache makes)"""
+    def __init__(self):
+        self.data = {}
+        self.sets = {}
+        self.ttls = {}
+        self.fail = False
+
+    def _check(self):
+        if self.fail:
+            raise ConnectionError("redis down")
+
+    async def get(self, key):
+        self._check()
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self._check()
+        self.data[key] = value.encode()
+        self.ttls[key] = ex
+
+    async def pttl(self, key):
+        self._check()
+        if key not in self.data:
+            return -2
+        return -1 if self.ttls.get(key) is None else int(self.ttls[key] * 1000)
+
+    async def sadd(self, key, member):
+        self.sets.setdefault(key, set()).add(member.encode())
+
+    async def smembers(self, key):
+        return set(self.sets.get(key, ()))
+
+    async def expire(self, key, seconds):
+        self.ttls[key] = seconds
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+            self.sets.pop(key, None)
+
+def chunks(*doc_ids):
+    return [{"content": f"text from {doc_id}", "metadata": {"doc_id": doc_id}, "score": 1.0} for doc_id in doc_ids]
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    answer_cache.init_answer_cache()
+    yield
+    answer_cache.init_answer_cache()
+
+def test_key_ignores_case_spacing_and_punctuation():
+    """Test equivalent questions share a key while k, scope and context split it"""
+    context = chunks("d1")
+    key = answer_cache.make_key("What is  RAG?", 5, None, context)
+    assert answer_cache.make_key("what is rag", 5, None, context) == key
+    assert answer_cache.make_key("what is rag", 3, None, context) != key
+    assert answer_cache.make_key("what is rag", 5, ["d1"], context) != key
+    assert answer_cache.make_key("what is rag", 5, None, chunks("d2")) != key
+
+@pytest.mark.asyncio
+async def test_lru_eviction_ttl_and_hit_rate(monkeypatch):
+    """Test the in-process tier evicts least recently used entries and expires old ones"""
+    monkeypatch.setattr(settings, "ANSWER_CACHE_SIZE", 2)
+    assert answer_cache.hit_rate() is None
+    await answer_cache.set_answer("a", {"answer": "A"}, ["d1"])
+    await answer_cache.set_answer("b", {"answer": "B"}, ["d1"])
+    assert await answer_cache.get_answer("a") == {"answer": "A"}  # "b" is now least recent
+    await answer_cache.set_answer("c", {"answer": "C"}, ["d2"])
+    assert await answer_cache.get_answer("b") is None
+    assert await answer_cache.get_answer("c") == {"answer": "C"}
+    assert answer_cache.hit_rate() == pytest.approx(2 / 3)
+
+    monkeypatch.setattr(settings, "ANSWER_CACHE_TTL_SECONDS", -1)
+    await answer_cache.set_answer("old", {"answer": "stale"}, [])
+    assert await answer_cache.get_answer("old") is None
+
+@pytest.mark.asyncio
+async def test_redis_tier_is_shared_and_invalidated():
+    """Test answers survive an in-process reset through Redis and are dropped per document"""
+    redis = FakeRedis()
+    answer_cache.init_answer_cache(redis)
+    await answer_cache.set_answer("k1", {"answer": "one"}, ["d1", "d2"])
+    await answer_cache.set_answer("k2", {"answer": "two"}, ["d3"])
+    assert redis.ttls["answer-cache:k1"] == settings.ANSWER_CACHE_TTL_SECONDS
+
+    answer_cache.init_answer_cache(redis)  # another worker: empty memory, same Redis
+    assert await answer_cache.get_answer("k1") == {"answer": "one"}
+
+    await answer_cache.invalidate_documents(["d2"])
+    assert await answer_cache.get_answer("k1") is None
+    assert "answer-cache:k1" not in redis.data
+    assert await answer_cache.get_answer("k2") == {"answer": "two"}
+
+@pytest.mark.asyncio
+async def test_redis_hit_keeps_the_remaining_ttl():
+    """Test an answer pulled from Redis expires locally when it expires in Redis"""
+    redis = FakeRedis()
+    answer_cache.init_answer_cache(redis)
+    await answer_cache.set_answer("k", {"answer": "one"}, ["d1"])
+    redis.ttls["answer-cache:k"] = 5  # written by another worker a while ago
+
+    answer_cache.init_answer_cache(redis)
+    assert await answer_cache.get_answer("k") == {"answer": "one"}
+    expires_at = answer_cache._entries["k"][0]
+    assert expires_at - time.time() == pytest.approx(5, abs=1)
+
+    redis.ttls["answer-cache:k"] = None  # no expiry in Redis: fall back to the configured TTL
+    answer_cache.init_answer_cache(redis)
+    assert await answer_cache.get_answer("k") == {"answer": "one"}
+    expires_at = answer_cache._entries["k"][0]
+    assert expires_at - time.time() == pytest.approx(settings.ANSWER_CACHE_TTL_SECONDS, abs=1)
+
+@pytest.mark.asyncio
+async def test_redis_errors_fall_back_to_memory():
+    """Test an unreachable Redis never fails a lookup"""
+    redis = FakeRedis()
+    answer_cache.init_answer_cache(redis)
+    redis.fail = True
+    await answer_cache.set_answer("k", {"answer": "kept"}, ["d1"])
+    assert await answer_cache.get_answer("k") == {"answer": "kept"}
+    assert await answer_cache.get_answer("missing") is None
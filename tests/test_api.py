@@ -77,3 +77,550 @@ async def test_queries_history():
         response = await client.get("/queries")
         assert response.status_code == status.HTTP_200_OK
         assert isinstance(response.json(), list)
+
+@pytest.fixture
+def stream_stubs(monkeypatch):
+    """Stub retrieval, the LLM stream and the Query insert for /ask/stream"""
+    from api import routes
+    from services.answer_cache import init_answer_cache
+
+    init_answer_cache()
+
+    recorded = []
+
+    async def fake_record(**fields):
+        recorded.append(fields)
+        return len(recorded)
+
+    async def fake_stream(prompt, system_prompt=None):
+        for token in ["Otters ", "hold ", "hands."]:
+            yield token
+
+    chunks = [{"content": "Otters hold hands while sleeping", "metadata": {"doc_id": "d1"}, "score": 1.5}]
+    monkeypatch.setattr(routes, "_record_query", fake_record)
+    monkeypatch.setattr(routes, "stream_llm", fake_stream)
+    monkeypatch.setattr(routes, "search_vector_db", lambda question, k, doc_id: chunks)
+    return recorded
+
+@pytest.mark.asyncio
+async def test_ask_stream_sends_sources_then_tokens(stream_stubs):
+    """Test /ask/stream emits sources, token events and done, then records the answer"""
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.post("/ask/stream", params={"question": "what do otters do?"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = [block.split("\n") for block in response.text.strip().split("\n\n")]
+    names = [lines[0][len("event: "):] for lines in events]
+    assert names == ["sources", "token", "token", "token", "done"]
+    assert '"count": 1' in events[0][1]
+    assert '"status": "success"' in events[-1][1]
+    assert stream_stubs == [{
+        "question": "what do otters do?", "k_value": 5, "doc_id": None, "chunks_used": 1,
+        "status": "success", "error_message": None, "answer": "Otters hold hands.",
+        "response_time": stream_stubs[0]["response_time"]
+    }]
+
+@pytest.mark.asyncio
+async def test_retrieval_runs_off_the_event_loop(stream_stubs, monkeypatch):
+    """Test slow synchronous retrieval for concurrent questions does not serialize on the event loop"""
+    import asyncio
+    import time as time_module
+    from api import routes
+
+    chunks = [{"content": "Otters hold hands while sleeping", "metadata": {"doc_id": "d1"}, "score": 1.5}]
+
+    def slow_search(question, k, doc_id):
+        time_module.sleep(0.2)
+        return chunks
+
+    monkeypatch.setattr(routes, "search_vector_db", slow_search)
+    started = time_module.perf_counter()
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        responses = await asyncio.gather(*(
+            client.post("/ask/stream", params={"question": f"what do otters do {n}?"}) for n in range(3)
+        ))
+    assert all("event: done" in response.text for response in responses)
+    assert time_module.perf_counter() - started < 0.5  # three 0.2s searches, not 0.6s back to back
+
+@pytest.mark.asyncio
+async def test_ask_stream_records_llm_failure(stream_stubs, monkeypatch):
+    """Test an LLM error mid-stream ends with an error event and an error row"""
+    from api import routes
+
+    async def broken_stream(prompt, system_prompt=None):
+        yield "Partial "
+        raise RuntimeError("upstream reset")
+
+    monkeypatch.setattr(routes, "stream_llm", broken_stream)
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.post("/ask/stream", params={"question": "what do otters do?"})
+    assert "event: error" in response.text
+    assert stream_stubs[0]["status"] == "error"
+    assert stream_stubs[0]["answer"] == "Partial "
+    assert stream_stubs[0]["error_message"] == "upstream reset"
+
+@pytest.mark.asyncio
+async def test_ask_stream_reports_disabled_llm_as_error(stream_stubs, monkeypatch):
+    """Test the disabled-LLM placeholder ends the stream with an error event, not a token"""
+    from api import routes
+    from services.llm_service import LLM_DISABLED_MESSAGE
+
+    async def disabled_stream(prompt, system_prompt=None):
+        yield LLM_DISABLED_MESSAGE
+
+    monkeypatch.setattr(routes, "stream_llm", disabled_stream)
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.post("/ask/stream", params={"question": "what do otters do?"})
+    names = [block.split("\n")[0][len("event: "):] for block in response.text.strip().split("\n\n")]
+    assert names == ["sources", "error"]
+    assert LLM_DISABLED_MESSAGE in response.text
+    assert len(stream_stubs) == 1
+    assert (stream_stubs[0]["status"], stream_stubs[0]["error_message"]) == ("error", LLM_DISABLED_MESSAGE)
+
+@pytest.mark.asyncio
+async def test_ask_stream_reuses_cached_answer(stream_stubs, monkeypatch):
+    """Test a repeated question over the same context skips the LLM"""
+    from api import routes
+    from services import answer_cache
+
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        await client.post("/ask/stream", params={"question": "What do otters do?"})
+
+        async def unreachable(prompt, system_prompt=None):
+            raise AssertionError("LLM called for a cached answer")
+            yield
+
+        monkeypatch.setattr(routes, "stream_llm", unreachable)
+        response = await client.post("/ask/stream", params={"question": "what do  otters do"})
+    assert '"cached": true' in response.text
+    assert stream_stubs[-1]["answer"] == "Otters hold hands."
+    assert answer_cache.hit_rate() == 0.5
+
+@pytest.fixture
+def fake_db():
+    """Serve get_db from an in-memory session that records added rows and commits"""
+    from api import routes
+
+    class FakeDB:
+        def __init__(self):
+            self.rows = []
+            self.commits = []
+
+        def add(self, row):
+            self.rows.append(row)
+
+        def add_all(self, rows):
+            self.rows.extend(rows)
+
+        async def commit(self):
+            self.commits.append(len(self.rows))
+
+    db = FakeDB()
+
+    async def override():
+        yield db
+
+    app.dependency_overrides[routes.get_db] = override
+    yield db
+    app.dependency_overrides.pop(routes.get_db, None)
+
+@pytest.fixture
+def sqlite_db(monkeypatch, tmp_path):
+    """Serve get_db from a fresh SQLite file, keep uploads under tmp_path and queue jobs without workers"""
+    import asyncio
+    from sqlalchemy import create_engine
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import NullPool
+    from api import routes
+    from config.settings import settings
+    from db.models import Base
+    from services import ingest_queue
+
+    db_path = tmp_path / "app.db"
+    sync_engine = create_engine(f"sqlite:///{db_path}")
+    Base.metadata.create_all(sync_engine)
+    sync_engine.dispose()
+    sessions = sessionmaker(create_async_engine(f"sqlite+aiosqlite:///{db_path}", poolclass=NullPool),
+                            class_=AsyncSession, expire_on_commit=False)
+
+    async def override():
+        async with sessions() as session:
+            yield session
+
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path / "uploads"))
+    monkeypatch.setattr(routes, "get_doc_id_by_hash", lambda pdf_hash: None)
+    # a queue nobody consumes: jobs stay queued, with progress the test can set
+    monkeypatch.setattr(ingest_queue, "_queue", asyncio.Queue(maxsize=settings.INGEST_QUEUE_SIZE))
+    monkeypatch.setattr(ingest_queue, "_jobs", {})
+    app.dependency_overrides[routes.get_db] = override
+    yield sessions
+    app.dependency_overrides.pop(routes.get_db, None)
+    ingest_queue._release_owner()
+
+@pytest.mark.asyncio
+async def test_identical_concurrent_asks_share_one_llm_call(monkeypatch, fake_db):
+    """Test coalesced /ask requests make one retrieval and LLM call but record a row each"""
+    import asyncio
+    from api import routes
+    from services.answer_cache import init_answer_cache
+
+    init_answer_cache()
+    searches, prompts = [], []
+    chunks = [{"content": "Herons wade in shallow water", "metadata": {"doc_id": "d1"}, "score": 2.0}]
+
+    def fake_search(question, k, doc_id):
+        searches.append(question)
+        return chunks
+
+    async def fake_llm(prompt):
+        prompts.append(prompt)
+        await asyncio.sleep(0.05)
+        return "They wade."
+
+    monkeypatch.setattr(routes, "search_vector_db", fake_search)
+    monkeypatch.setattr(routes, "ask_llm_async", fake_llm)
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        responses = await asyncio.gather(*(
+            client.post("/ask", params={"question": question})
+            for question in ["Where do herons wade?", "where do herons wade", "Where do herons wade?"]
+        ))
+
+    assert [response.json()["answer"] for response in responses] == ["They wade."] * 3
+    assert len(searches) == 1 and len(prompts) == 1
+    assert len(fake_db.rows) == 3 and {row.status for row in fake_db.rows} == {"success"}
+
+@pytest.mark.asyncio
+async def test_ask_returns_503_when_llm_is_saturated(monkeypatch, fake_db):
+    """Test a refused LLM call answers 503 with Retry-After and records an error row"""
+    from api import routes
+    from services.answer_cache import init_answer_cache
+    from services.llm_service import LLMUnavailable
+
+    init_answer_cache()
+    chunks = [{"content": "Cranes migrate in flocks", "metadata": {"doc_id": "d1"}, "score": 2.0}]
+
+    async def refused(prompt):
+        raise LLMUnavailable("LLM provider circuit is open", retry_after=12.3)
+
+    monkeypatch.setattr(routes, "search_vector_db", lambda question, k, doc_id: chunks)
+    monkeypatch.setattr(routes, "ask_llm_async", refused)
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.post("/ask", params={"question": "How do cranes migrate?"})
+
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert response.headers["retry-after"] == "13"
+    assert [row.status for row in fake_db.rows] == ["error"]
+
+@pytest.mark.asyncio
+async def test_ask_batch_answers_in_order_with_per_item_status(monkeypatch, fake_db):
+    """Test /ask/batch retrieves once, bounds concurrent LLM calls, shares repeats and commits once"""
+    import asyncio
+    from api import routes
+    from config.settings import settings
+    from services.answer_cache import init_answer_cache
+
+    init_answer_cache()
+    monkeypatch.setattr(settings, "ASK_BATCH_MAX_QUESTIONS", 5)
+    monkeypatch.setattr(settings, "ASK_BATCH_CONCURRENCY", 2)
+    searches, prompts = [], []
+    running = {"now": 0, "max": 0}
+
+    def fake_batch_search(questions, ks, doc_ids):
+        searches.append(list(questions))
+        return [[] if "nothing" in question else
+                [{"content": f"Notes on {question}", "metadata": {"doc_id": "d1"}, "score": 1.0}]
+                for question in questions]
+
+    async def fake_llm(prompt):
+        prompts.append(prompt)
+        running["now"] += 1
+        running["max"] = max(running["max"], running["now"])
+        await asyncio.sleep(0.02)
+        running["now"] -= 1
+        if "broken" in prompt:
+            raise RuntimeError("provider exploded")
+        return f"answer {len(prompts)}"
+
+    monkeypatch.setattr(routes, "search_vector_db_batch", fake_batch_search)
+    monkeypatch.setattr(routes, "ask_llm_async", fake_llm)
+    questions = ["Where do otters sleep?", "where do otters sleep", "Ask about nothing",
+                 "Why do herons wade?", "Is this broken?", "One too many?"]
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.post("/ask/batch", json=[{"question": question} for question in questions])
+
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert [item["question"] for item in data["results"]] == questions
+    assert [item["status"] for item in data["results"]] == ["success", "success", "no_results",
+                                                            "success", "error", "rejected"]
+    assert data["results"][0]["answer"] == data["results"][1]["answer"]
+    assert (data["answered"], data["no_results"], data["failed"], data["rejected"]) == (3, 1, 1, 1)
+    assert len(searches) == 1 and len(searches[0]) == 5
+    assert len(prompts) == 3 and running["max"] == 2
+    assert fake_db.commits == [5]
+    assert [row.status for row in fake_db.rows] == ["success", "success", "no_results", "success", "error"]
+    assert fake_db.rows[4].error_message == "Error answering question: provider exploded"
+
+@pytest.mark.asyncio
+async def test_llm_error_placeholder_is_reported_as_an_error(monkeypatch, fake_db):
+    """Test the LLM error placeholder answer is an error for /ask and /ask/batch, not a success"""
+    from api import routes
+    from services.answer_cache import init_answer_cache
+    from services.llm_service import LLM_ERROR_MESSAGE
+
+    init_answer_cache()
+    chunks = [{"content": "Swifts sleep on the wing", "metadata": {"doc_id": "d1"}, "score": 2.0}]
+
+    async def failing_llm(prompt):
+        return LLM_ERROR_MESSAGE
+
+    monkeypatch.setattr(routes, "search_vector_db", lambda question, k, doc_id: chunks)
+    monkeypatch.setattr(routes, "search_vector_db_batch", lambda questions, ks, doc_ids: [chunks] * len(questions))
+    monkeypatch.setattr(routes, "ask_llm_async", failing_llm)
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        single = await client.post("/ask", params={"question": "Where do swifts sleep?"})
+        batch = await client.post("/ask/batch", json=[{"question": "Where do swifts sleep?"}])
+
+    assert single.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert single.json()["detail"] == f"{LLM_ERROR_MESSAGE}, no answer generated"
+    result = batch.json()["results"][0]
+    assert (result["status"], result["answer"]) == ("error", None)
+    assert batch.json()["failed"] == 1
+    assert [row.status for row in fake_db.rows] == ["error", "error"]
+    assert [row.error_message for row in fake_db.rows] == [LLM_ERROR_MESSAGE,
+                                                          f"Error answering question: {LLM_ERROR_MESSAGE}"]
+
+@pytest.mark.asyncio
+async def test_ask_with_llm_disabled_answers_503(monkeypatch, fake_db):
+    """Test a disabled LLM is reported as unavailable rather than a server fault"""
+    from api import routes
+    from services.answer_cache import init_answer_cache
+    from services.llm_service import LLM_DISABLED_MESSAGE
+
+    init_answer_cache()
+    chunks = [{"content": "Storks nest on chimneys", "metadata": {"doc_id": "d1"}, "score": 2.0}]
+
+    async def disabled_llm(prompt):
+        return LLM_DISABLED_MESSAGE
+
+    monkeypatch.setattr(routes, "search_vector_db", lambda question, k, doc_id: chunks)
+    monkeypatch.setattr(routes, "ask_llm_async", disabled_llm)
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.post("/ask", params={"question": "Where do storks nest?"})
+
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert response.json()["detail"] == f"{LLM_DISABLED_MESSAGE}, no answer generated"
+    assert [(row.status, row.error_message) for row in fake_db.rows] == [("error", LLM_DISABLED_MESSAGE)]
+
+@pytest.mark.asyncio
+async def test_duplicate_lookup_only_returns_completed_documents(monkeypatch):
+    """Test an indexed but failed document never shadows the completed one with the same hash"""
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from api import routes
+    from db.models import Base, Document
+
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    monkeypatch.setattr(routes, "get_doc_id_by_hash", lambda pdf_hash: "doc-failed")
+    row = dict(filename="a.pdf", pdf_hash="cafe", file_size=1, pages=1, chunks=1, chunk_size=100)
+    try:
+        async with AsyncSession(engine) as db:
+            db.add(Document(doc_id="doc-failed", status="failed", **row))
+            await db.commit()
+            assert await routes._find_existing_document(db, "cafe") is None
+
+            db.add(Document(doc_id="doc-done", status="completed", **row))
+            await db.commit()
+            assert (await routes._find_existing_document(db, "cafe")).doc_id == "doc-done"
+    finally:
+        await engine.dispose()
+
+@pytest.mark.asyncio
+async def test_init_db_adds_columns_missing_from_older_tables():
+    """Test a documents table created before the timings column gains it on startup"""
+    from sqlalchemy import inspect
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from db.database import _add_missing_columns
+
+    engine = create_async_engine("sqlite+aiosqlite://")
+    try:
+        async with engine.begin() as conn:
+            await conn.exec_driver_sql("CREATE TABLE documents (id INTEGER PRIMARY KEY, doc_id VARCHAR(36))")
+            await conn.run_sync(_add_missing_columns)
+            columns = await conn.run_sync(lambda sync: {c["name"] for c in inspect(sync).get_columns("documents")})
+    finally:
+        await engine.dispose()
+    assert {"timings", "error_message", "processing_time"} <= columns
+
+@pytest.mark.asyncio
+async def test_upload_session_survives_failed_completions(sqlite_db, monkeypatch):
+    """Test a completion that errors or hits a full queue keeps the session, so it can be retried"""
+    from sqlalchemy import func, select
+    from api import routes
+    from db.models import Document
+    from services import upload_sessions
+    from services.ingest_queue import IngestQueueFull
+
+    outcomes = [RuntimeError("enqueue refused"), IngestQueueFull("full"), None]
+    queued = []
+
+    def enqueue(doc_id, path, pdf_hash, filename):
+        outcome = outcomes.pop(0)
+        if outcome is not None:
+            raise outcome
+        queued.append(doc_id)
+
+    monkeypatch.setattr(routes, "enqueue_ingest", enqueue)
+    data = b"%PDF-1.4 resumable bytes"
+    upload_id = upload_sessions.create_session("s.pdf", len(data))["upload_id"]
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        short = await client.put(f"/upload/sessions/{upload_id}", content=data[:5],
+                                 headers={"Content-Range": f"bytes 0-9/{len(data)}"})
+        assert short.status_code == status.HTTP_400_BAD_REQUEST
+        assert upload_sessions.get_session(upload_id)["offset"] == 0
+        await client.put(f"/upload/sessions/{upload_id}", content=data)
+        broken = await client.post(f"/upload/sessions/{upload_id}/complete")
+        assert broken.status_code == status.HTTP_500_INTERNAL_SERVER_ERROR
+        assert upload_sessions.get_session(upload_id)["offset"] == len(data)
+
+        full = await client.post(f"/upload/sessions/{upload_id}/complete")
+        assert full.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert upload_sessions.get_session(upload_id)["offset"] == len(data)
+        async with sqlite_db() as session:
+            assert await session.scalar(select(func.count()).select_from(Document)) == 0
+
+        done = await client.post(f"/upload/sessions/{upload_id}/complete")
+        assert done.status_code == status.HTTP_202_ACCEPTED
+        assert done.json()["doc_id"] == queued[-1]
+        gone = await client.get(f"/upload/sessions/{upload_id}")
+        assert gone.status_code == status.HTTP_404_NOT_FOUND
+
+@pytest.mark.asyncio
+async def test_upload_queues_pdf_and_reports_status(sqlite_db):
+    """Test /upload answers 202 with a doc_id, status shows progress, and re-uploads are deduplicated"""
+    from sqlalchemy import update
+    from db.models import Document
+    from services import ingest_queue
+
+    data = b"%PDF-1.4 notes about otters"
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        queued = await client.post("/upload", files={"file": ("otters.pdf", data, "application/pdf")})
+        assert queued.status_code == status.HTTP_202_ACCEPTED
+        doc_id = queued.json()["doc_id"]
+        assert queued.json()["status"] == "processing"
+        assert open(ingest_queue.upload_path(doc_id), "rb").read() == data
+
+        waiting = await client.get(f"/documents/{doc_id}/status")
+        assert waiting.status_code == status.HTTP_200_OK
+        assert (waiting.json()["status"], waiting.json()["pages_done"]) == ("queued", 0)
+
+        ingest_queue._jobs[doc_id].update(status="processing", pages_total=3, pages_done=2, chunks_indexed=5)
+        running = (await client.get(f"/documents/{doc_id}/status")).json()
+        assert (running["status"], running["pages_total"], running["pages_done"], running["chunks_indexed"]) \
+            == ("processing", 3, 2, 5)
+
+        # same bytes while the first upload is still ingesting: attached to that job
+        again = await client.post("/upload", files={"file": ("copy.pdf", data, "application/pdf")})
+        assert (again.json()["status"], again.json()["doc_id"]) == ("processing", doc_id)
+
+        # the worker finishes: the row now answers status
+        ingest_queue._jobs.pop(doc_id)
+        async with sqlite_db() as session:
+            await session.execute(update(Document).where(Document.doc_id == doc_id)
+                                  .values(status="completed", pages=3, chunks=7, chunk_size=500))
+            await session.commit()
+        done = (await client.get(f"/documents/{doc_id}/status")).json()
+        assert (done["status"], done["pages_done"], done["chunks_indexed"]) == ("completed", 3, 7)
+
+        duplicate = await client.post("/upload", files={"file": ("copy.pdf", data, "application/pdf")})
+        assert duplicate.status_code == status.HTTP_200_OK
+        assert (duplicate.json()["status"], duplicate.json()["doc_id"]) == ("duplicate", doc_id)
+        assert len(ingest_queue._jobs) == 0
+
+        unknown = await client.get("/documents/no-such-doc/status")
+        assert unknown.status_code == status.HTTP_404_NOT_FOUND
+
+@pytest.mark.asyncio
+async def test_upload_batch_reports_each_file(sqlite_db, monkeypatch):
+    """Test /upload/batch queues new PDFs and reports duplicates, non-PDFs and a full queue per file"""
+    import asyncio
+    import hashlib
+    import io
+    import zipfile
+    from db.models import Document
+    from services import ingest_queue
+
+    monkeypatch.setattr(ingest_queue, "_queue", asyncio.Queue(maxsize=2))
+    known = b"%PDF-1.4 already ingested"
+    async with sqlite_db() as session:
+        session.add(Document(doc_id="doc-known", filename="known.pdf", pdf_hash=hashlib.md5(known).hexdigest(),
+                             file_size=len(known), pages=1, chunks=1, chunk_size=100, status="completed"))
+        await session.commit()
+
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("papers/a.pdf", b"%PDF-1.4 paper a")
+        zf.writestr("papers/known-copy.pdf", known)
+        zf.writestr("papers/notes.txt", "not a pdf")
+        zf.writestr("papers/a-again.pdf", b"%PDF-1.4 paper a")
+    files = [("files", ("papers.zip", archive.getvalue(), "application/zip")),
+             ("files", ("b.pdf", b"%PDF-1.4 paper b", "application/pdf")),
+             ("files", ("c.pdf", b"%PDF-1.4 paper c", "application/pdf")),
+             ("files", ("slides.pptx", b"PK not a pdf", "application/octet-stream"))]
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.post("/upload/batch", files=files)
+
+    assert response.status_code == status.HTTP_202_ACCEPTED
+    data = response.json()
+    items = {item["filename"]: item for item in data["items"]}
+    assert [item["filename"] for item in data["items"]] == ["a.pdf", "known-copy.pdf", "notes.txt",
+                                                            "a-again.pdf", "b.pdf", "c.pdf", "slides.pptx"]
+    assert {name: item["status"] for name, item in items.items()} == {
+        "a.pdf": "processing", "known-copy.pdf": "duplicate", "notes.txt": "rejected",
+        "a-again.pdf": "duplicate", "b.pdf": "processing", "c.pdf": "rejected", "slides.pptx": "rejected"}
+    assert items["known-copy.pdf"]["doc_id"] == "doc-known"
+    assert items["a-again.pdf"]["doc_id"] == items["a.pdf"]["doc_id"]
+    assert items["notes.txt"]["message"] == items["slides.pptx"]["message"] == "Only PDF files are allowed"
+    assert items["c.pdf"]["message"] == "Ingest queue is full, retry later" and items["c.pdf"]["doc_id"] is None
+    assert response.headers["retry-after"]
+    assert (data["files"], data["queued"], data["duplicates"], data["rejected"]) == (7, 2, 2, 3)
+    assert sorted(ingest_queue._jobs) == sorted([items["a.pdf"]["doc_id"], items["b.pdf"]["doc_id"]])
+
+@pytest.mark.asyncio
+async def test_reindex_endpoint_rebuilds_and_refuses_concurrent_runs(sqlite_db, monkeypatch, tmp_path):
+    """Test /documents/reindex re-chunks cached documents, updates their rows and answers 409 while one runs"""
+    from sqlalchemy import select
+    from config.settings import settings
+    from db.models import Document
+    from services import reindex, vector_service
+    from services.pdf_processor import ingest_pdf
+    from tests.test_pdf_processing import make_pdf, page_text
+
+    monkeypatch.setattr(settings, "INGEST_WORKERS", 0)
+    monkeypatch.setattr(settings, "TEXT_CACHE_DIR", str(tmp_path / "text_cache"))
+    monkeypatch.setattr(reindex, "AsyncSessionLocal", sqlite_db)
+    vector_service.init_vectorstore(str(tmp_path / "index"), persist=True, retrieval_mode="bm25")
+    result = await ingest_pdf(make_pdf([page_text(i) for i in range(4)]), "doc-r", "cc33", "r.pdf")
+    async with sqlite_db() as session:
+        session.add(Document(doc_id="doc-r", filename="r.pdf", pdf_hash="cc33", file_size=1, pages=4,
+                             chunks=result["chunks"], chunk_size=result["chunk_size"], status="completed"))
+        await session.commit()
+
+    monkeypatch.setattr(settings, "CHUNK_SIZE_SMALL", 120)
+    monkeypatch.setattr(settings, "CHUNK_OVERLAP_SMALL", 20)
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.post("/documents/reindex")
+        assert response.status_code == status.HTTP_200_OK
+        report = response.json()
+        assert (report["documents"], report["rebuilt"], report["missing"]) == (1, 1, [])
+        assert vector_service.get_document_chunk_count("doc-r") == report["chunks"] > result["chunks"]
+        async with sqlite_db() as session:
+            row = (await session.execute(select(Document).where(Document.doc_id == "doc-r"))).scalars().one()
+        assert (row.chunks, row.chunk_size) == (report["chunks"], 120)
+
+        async with reindex._reindex_lock:
+            busy = await client.post("/documents/reindex")
+        assert busy.status_code == status.HTTP_409_CONFLICT
@@ -0,0 +1,51 @@
+"""
+Tests for the native text chunker
+"""
+import sys
+import os
+import random
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from services.chunker import DEFAULT_SEPARATORS, TextChunker
+
+def random_text(seed, length=20_000):
+    """Text mixing every separator, long unbroken words and stray whitespace"""
+    rng = random.Random(seed)
+    tokens = ["alpha", "beta", "gamma", "x" * 120, ".", ". ", "\n", "\n\n", "  ", "\n\n\n", " \n "]
+    parts = []
+    while sum(len(p) for p in parts) < length:
+        parts.append(rng.choice(tokens) if rng.random() < 0.3 else rng.choice(tokens[:3]) + " ")
+    return "".join(parts)
+
+@pytest.mark.parametrize("chunk_size,chunk_overlap", [(300, 50), (500, 100), (800, 150), (40, 10)])
+@pytest.mark.parametrize("seed", range(3))
+def test_matches_langchain_splitter(chunk_size, chunk_overlap, seed):
+    """Test chunks are identical to RecursiveCharacterTextSplitter output"""
+    text = random_text(seed)
+    expected = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap, separators=list(DEFAULT_SEPARATORS)
+    ).split_text(text)
+    assert TextChunker(chunk_size, chunk_overlap).split_text(text) == expected
+
+def test_spans_are_offsets_into_source():
+    """Test each span slices its chunk out of the original text"""
+    text = random_text(7, 5_000)
+    chunker = TextChunker(200, 40)
+    spans = chunker.split_spans(text)
+    assert [text[start:end] for start, end in spans] == chunker.split_text(text)
+    assert all(a[0] < b[0] for a, b in zip(spans, spans[1:]))
+
+def test_empty_and_whitespace_text():
+    """Test blank input yields no chunks"""
+    assert TextChunker(100, 10).split_text("") == []
+    assert TextChunker(100, 10).split_text(" \n\n  ") == []
+
+def test_overlap_larger_than_size_rejected():
+    """Test invalid chunk parameters fail fast"""
+    with pytest.raises(ValueError):
+        TextChunker(50, 60)
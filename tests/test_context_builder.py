@@ -0,0 +1,72 @@
+"""
+Tests for token-budgeted context assembly
+"""
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.settings import settings
+from services.context_builder import build_context, estimate_tokens
+
+TEXT = ("Retrieval augmented generation grounds answers in documents. "
+        "Chunks overlap so sentences are not cut in half. "
+        "The context budget keeps prompts small and cheap. ") * 3
+
+def chunk(start, end, doc_id="d1", index=None, text=TEXT):
+    metadata = {"doc_id": doc_id, "char_start": start, "char_end": end}
+    if index is not None:
+        metadata["chunk_index"] = index
+    return {"content": text[start:end], "metadata": metadata, "score": 1.0}
+
+def test_overlapping_chunks_are_merged():
+    """Test overlapping chunks of one document are sent once, as one passage"""
+    context, stats = build_context([chunk(60, 200), chunk(0, 120)], budget=10_000)
+    assert context == TEXT[0:200]
+    assert stats["merged"] == 1
+    assert stats["tokens_saved"] == stats["tokens_before"] - estimate_tokens(TEXT[0:200])
+    assert stats["tokens_saved"] > 0
+
+def test_consecutive_chunks_are_joined_and_documents_kept_apart():
+    """Test adjacent chunk indexes merge while the same offsets in another document do not"""
+    other = "Sparse retrieval scores exact keyword matches with BM25 over an inverted index. " * 2
+    chunks = [chunk(0, 100, index=0), chunk(101, 200, index=1), chunk(0, 100, doc_id="d2", index=0, text=other)]
+    context, stats = build_context(chunks, budget=10_000)
+    assert stats["merged"] == 1
+    assert context.split("\n\n")[0] == TEXT[0:100] + "\n" + TEXT[101:200]
+    assert context.split("\n\n")[1] == other[0:100]
+
+def test_near_duplicates_are_dropped():
+    """Test a passage repeated in another PDF is dropped, keeping the higher-ranked one"""
+    best = {"content": "Vector search ranks chunks by cosine similarity to the question embedding.",
+            "metadata": {"doc_id": "d1"}}
+    copy = {"content": "vector search ranks chunks by cosine similarity to the question embedding!",
+            "metadata": {"doc_id": "d2"}}
+    other = {"content": "Groq serves the language model used to write the answer.", "metadata": {}}
+    context, stats = build_context([best, copy, other], budget=10_000)
+    assert context == best["content"] + "\n\n" + other["content"]
+    assert stats["duplicates"] == 1
+
+def test_budget_truncates_at_word_boundary(monkeypatch):
+    """Test the budget comes from LLM_MAX_TOKENS and the overflowing passage is cut on a word"""
+    monkeypatch.setattr(settings, "LLM_MAX_TOKENS", 40)
+    monkeypatch.setattr(settings, "CONTEXT_BUDGET_FACTOR", 1.0)
+    first = {"content": "short first passage", "metadata": {}}
+    long = {"content": " ".join(f"word{i}" for i in range(200)), "metadata": {}}
+    dropped = {"content": "never reached", "metadata": {}}
+    context, stats = build_context([first, long, dropped])
+    assert stats["tokens"] <= 40
+    assert stats["truncated"] == 2
+    assert context.startswith("short first passage\n\nword0 word1")
+    assert context.split()[-1].startswith("word")
+    assert "never reached" not in context
+
+def test_empty_and_unbudgeted_input():
+    """Test no chunks give an empty context and chunks within budget pass through unchanged"""
+    assert build_context([]) == ("", {"tokens_before": 0, "tokens": 0, "tokens_saved": 0,
+                                      "merged": 0, "duplicates": 0, "truncated": 0})
+    plain = [{"content": "alpha beta gamma", "metadata": {}}, {"content": "delta epsilon", "metadata": {}}]
+    context, stats = build_context(plain)
+    assert context == "alpha beta gamma\n\ndelta epsilon"
+    assert stats["tokens_saved"] == 0
@@ -0,0 +1,285 @@
+"""
+Tests for the LLM service
+"""
+import sys
+import os
+import asyncio
+import time
+import types
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import llm_service
+
+class FakeCompletions:
+    """Async chat.completions stand-in that takes `delay` seconds per call"""
+    def __init__(self, delay):
+        self.delay = delay
+        self.calls = []
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        await asyncio.sleep(self.delay)
+        message = types.SimpleNamespace(content=f"answer to {kwargs['messages'][-1]['content']}")
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)])
+
+@pytest.fixture
+def fake_async_client(monkeypatch):
+    """Install a fake AsyncGroq client for the running loop"""
+    completions = FakeCompletions(delay=0.2)
+    client = types.SimpleNamespace(chat=types.SimpleNamespace(completions=completions))
+    monkeypatch.setattr(llm_service, "_async_groq_client", client)
+    monkeypatch.setattr(llm_service, "_async_loop", None)
+    return completions
+
+@pytest.mark.asyncio
+async def test_async_llm_calls_run_concurrently(fake_async_client):
+    """Test concurrent questions overlap instead of queuing behind each other"""
+    llm_service._async_loop = asyncio.get_running_loop()  # client already "created" on this loop
+    started = time.perf_counter()
+    answers = await asyncio.gather(*(llm_service.ask_llm_async(f"q{i}") for i in range(5)))
+    elapsed = time.perf_counter() - started
+
+    assert answers == [f"answer to q{i}" for i in range(5)]
+    assert elapsed < 0.6  # five 0.2s calls, not 1.0s back to back
+    assert len(fake_async_client.calls) == 5
+
+@pytest.mark.asyncio
+async def test_async_llm_disabled_without_api_key(monkeypatch):
+    """Test a missing key answers with the disabled message instead of raising"""
+    monkeypatch.delenv("GROQ_API_KEY", raising=False)
+    monkeypatch.setattr(llm_service, "_async_groq_client", None)
+    assert await llm_service.ask_llm_async("anything") == llm_service.LLM_DISABLED_MESSAGE
+
+@pytest.mark.asyncio
+async def test_async_client_uses_configured_pool(monkeypatch):
+    """Test the shared HTTP client is pooled with the configured limits and timeouts"""
+    monkeypatch.setenv("GROQ_API_KEY", "test-key")
+    monkeypatch.setenv("LLM_POOL_SIZE", "7")
+    monkeypatch.setenv("LLM_CONNECT_TIMEOUT_SECONDS", "1.5")
+    monkeypatch.setattr(llm_service, "_async_groq_client", None)
+
+    llm_service._initialize_async_groq()
+    first = llm_service._async_groq_client
+    llm_service._initialize_async_groq()
+    assert llm_service._async_groq_client is first  # reused within the loop
+
+    pool = llm_service._async_http_client._transport._pool
+    assert pool._max_connections == 7
+    assert llm_service._async_http_client.timeout.connect == 1.5
+    await llm_service.close_llm_clients()
+    assert llm_service._async_groq_client is None
+
+@pytest.mark.asyncio
+async def test_client_of_a_previous_loop_is_closed_when_replaced(monkeypatch):
+    """Test a new event loop closes the pooled client it replaces"""
+    closed = []
+
+    class OldHttpClient:
+        async def aclose(self):
+            closed.append(asyncio.get_running_loop())
+
+    old_loop = asyncio.new_event_loop()
+    old_loop.close()
+    monkeypatch.delenv("GROQ_API_KEY", raising=False)
+    monkeypatch.setattr(llm_service, "_async_groq_client", object())
+    monkeypatch.setattr(llm_service, "_async_http_client", OldHttpClient())
+    monkeypatch.setattr(llm_service, "_async_loop", old_loop)
+
+    llm_service._initialize_async_groq()
+    await asyncio.sleep(0)
+    assert closed == [asyncio.get_running_loop()]
+    assert llm_service._async_http_client is None and llm_service._async_groq_client is None
+
+@pytest.mark.asyncio
+async def test_stream_llm_yields_non_empty_deltas(monkeypatch):
+    """Test streamed chunks are yielded as text tokens, skipping empty deltas"""
+    async def chunks():
+        for text in ["Hel", None, "lo", ""]:
+            delta = types.SimpleNamespace(content=text)
+            yield types.SimpleNamespace(choices=[types.SimpleNamespace(delta=delta)])
+
+    class StreamingCompletions:
+        async def create(self, **kwargs):
+            assert kwargs["stream"] is True
+            return chunks()
+
+    client = types.SimpleNamespace(chat=types.SimpleNamespace(completions=StreamingCompletions()))
+    monkeypatch.setattr(llm_service, "_async_groq_client", client)
+    monkeypatch.setattr(llm_service, "_async_loop", asyncio.get_running_loop())
+    assert [token async for token in llm_service.stream_llm("hi")] == ["Hel", "lo"]
+
+class ProviderError(Exception):
+    """Stand-in for an API error carrying an HTTP status"""
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+@pytest.mark.asyncio
+async def test_scheduler_bounds_in_flight_calls_and_queue():
+    """Test calls beyond max_in_flight wait, and are refused once the queue is full"""
+    scheduler = llm_service.LLMScheduler(max_in_flight=1, queue_size=1, queue_timeout=1.0)
+    running = []
+
+    async def call(n):
+        async with scheduler.slot():
+            running.append(scheduler.stats()["in_flight"])
+            await asyncio.sleep(0.05)
+            return n
+
+    first, second = asyncio.ensure_future(call(1)), asyncio.ensure_future(call(2))
+    await asyncio.sleep(0.01)
+    assert scheduler.stats()["waiting"] == 1
+    with pytest.raises(llm_service.LLMUnavailable) as refused:
+        await call(3)
+    assert refused.value.retry_after == 1.0
+    assert await asyncio.gather(first, second) == [1, 2]
+    assert running == [1, 1]
+    assert scheduler.stats() == {"state": "closed", "in_flight": 0, "waiting": 0, "rejected": 1}
+
+@pytest.mark.asyncio
+async def test_scheduler_admission_timeout():
+    """Test a call that cannot get a slot in queue_timeout is refused instead of hanging"""
+    scheduler = llm_service.LLMScheduler(max_in_flight=1, queue_timeout=0.05)
+    async with scheduler.slot():
+        with pytest.raises(llm_service.LLMUnavailable):
+            async with scheduler.slot():
+                pass
+    assert scheduler.stats()["waiting"] == 0
+
+@pytest.mark.asyncio
+async def test_scheduler_retries_only_transient_errors(monkeypatch):
+    """Test 5xx / connection errors are retried with jittered backoff and 4xx are not"""
+    delays = []
+
+    async def no_sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(llm_service.asyncio, "sleep", no_sleep)
+    scheduler = llm_service.LLMScheduler(max_retries=2, backoff=0.5)
+    errors = [ProviderError(503), ConnectionError("reset")]
+
+    async def flaky():
+        if errors:
+            raise errors.pop(0)
+        return "ok"
+
+    assert await scheduler.call(flaky) == "ok"
+    assert len(delays) == 2 and 0 <= delays[0] <= 0.5 and 0 <= delays[1] <= 1.0
+
+    calls = []
+
+    async def bad_request():
+        calls.append(1)
+        raise ProviderError(400)
+
+    with pytest.raises(ProviderError):
+        await scheduler.call(bad_request)
+    assert len(calls) == 1
+
+@pytest.mark.asyncio
+async def test_circuit_breaker_fails_fast_then_recovers():
+    """Test consecutive failures open the circuit, and a successful trial call closes it"""
+    scheduler = llm_service.LLMScheduler(max_retries=0, failure_threshold=2, reset_seconds=0.1)
+    calls = []
+
+    async def down():
+        calls.append(1)
+        raise ProviderError(502)
+
+    async def up():
+        return "ok"
+
+    for _ in range(2):
+        with pytest.raises(ProviderError):
+            async with scheduler.slot():
+                await scheduler.call(down)
+    assert scheduler.state == "open"
+
+    with pytest.raises(llm_service.LLMUnavailable) as refused:
+        async with scheduler.slot():
+            await scheduler.call(down)
+    assert len(calls) == 2  # refused without calling the provider
+    assert 0 < refused.value.retry_after <= 0.1
+
+    await asyncio.sleep(0.1)
+    assert scheduler.state == "half-open"
+    async with scheduler.slot():
+        assert await scheduler.call(up) == "ok"
+    assert scheduler.state == "closed"
+
+@pytest.mark.asyncio
+async def test_ask_llm_async_raises_when_refused(fake_async_client, monkeypatch):
+    """Test ask_llm_async surfaces a refusal while provider errors still answer the error message"""
+    llm_service._async_loop = asyncio.get_running_loop()
+    scheduler = llm_service.LLMScheduler(max_retries=0, failure_threshold=1, reset_seconds=60)
+    monkeypatch.setattr(llm_service, "get_scheduler", lambda name: scheduler)
+
+    async def failing(**kwargs):
+        raise ProviderError(500)
+
+    monkeypatch.setattr(fake_async_client, "create", failing)
+    assert await llm_service.ask_llm_async("q") == llm_service.LLM_ERROR_MESSAGE
+    with pytest.raises(llm_service.LLMUnavailable):
+        await llm_service.ask_llm_async("q")
+
+@pytest.fixture
+def providers(monkeypatch):
+    """Run ask_llm_async / stream_llm over the given providers with fresh latency and hedge stats"""
+    monkeypatch.setattr(llm_service, "_latencies", {})
+    monkeypatch.setattr(llm_service, "_hedge_stats", {"hedged": 0, "hedge_wins": 0, "fallbacks": 0})
+    monkeypatch.setenv("LLM_HEDGE_DELAY_SECONDS", "0.05")
+    configured = []
+    monkeypatch.setattr(llm_service, "get_providers", lambda: configured)
+    return configured
+
+@pytest.mark.asyncio
+async def test_slow_call_is_hedged_to_backup(providers):
+    """Test a call slower than the hedge delay is raced against the backup and the loser cancelled"""
+    slow, fast = llm_service.StubProvider("slow", delay=1.0), llm_service.StubProvider("fast", delay=0.01)
+    providers.extend([slow, fast])
+    started = time.perf_counter()
+    answer = await llm_service.ask_llm_async("q")
+    assert time.perf_counter() - started < 0.5
+    assert answer == await llm_service.StubProvider().complete(llm_service._messages("q", None))  # deterministic
+    assert (slow.calls, fast.calls) == (1, 1)
+    assert llm_service._hedge_stats == {"hedged": 1, "hedge_wins": 1, "fallbacks": 0}
+    await asyncio.sleep(0)
+    assert llm_service.get_scheduler("slow").stats()["in_flight"] == 0
+
+@pytest.mark.asyncio
+async def test_failed_provider_falls_back_in_order(providers, monkeypatch):
+    """Test an erroring provider falls back to the next one without hedging"""
+    monkeypatch.setenv("LLM_HEDGE_ENABLED", "false")
+    down = llm_service.StubProvider("down", error=ProviderError(400))
+    spare, unused = llm_service.StubProvider("spare"), llm_service.StubProvider("unused")
+    providers.extend([down, spare, unused])
+    assert (await llm_service.ask_llm_async("q")).startswith("Stub answer")
+    assert (down.calls, spare.calls, unused.calls) == (1, 1, 0)
+    assert llm_service._hedge_stats["fallbacks"] == 1
+
+    spare.error = ProviderError(401)
+    unused.error = ProviderError(403)
+    assert await llm_service.ask_llm_async("q") == llm_service.LLM_ERROR_MESSAGE
+
+def test_hedge_delay_follows_recent_p95(providers, monkeypatch):
+    """Test the hedge delay is the fixed default until enough latencies are known, then their p95"""
+    assert llm_service.hedge_delay("groq") == 0.05
+    for n in range(1, 101):
+        llm_service._record_latency("groq", n / 100)
+    assert llm_service.hedge_delay("groq") == pytest.approx(0.96)
+    monkeypatch.setenv("LLM_HEDGE_PERCENTILE", "50")
+    assert llm_service.hedge_delay("groq") == pytest.approx(0.51)
+
+@pytest.mark.asyncio
+async def test_stream_falls_back_before_first_token(providers):
+    """Test a stream that cannot be opened moves on to the next provider"""
+    providers.extend([llm_service.StubProvider("down", error=ConnectionError("refused")),
+                      llm_service.StubProvider("up")])
+    for provider in providers:
+        llm_service.get_scheduler(provider.name).max_retries = 0
+    tokens = [token async for token in llm_service.stream_llm("q")]
+    assert "".join(tokens) == await providers[1].complete(llm_service._messages("q", None))
+    assert len(tokens) > 1
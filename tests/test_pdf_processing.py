@@ -0,0 +1,574 @@
+"""
+Tests for PDF ingestion
+"""
+import sys
+import os
+import asyncio
+import hashlib
+import io
+import uuid
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.settings import settings
+from services import ingest_pool, ingest_queue
+from services import vector_service
+from services.pdf_extract import chunk_pages, chunk_window, extract_and_chunk, split_page_ranges
+from services import bulk_ingest, text_cache, upload_sessions
+from services.reindex import reindex_documents
+from services.pdf_processor import (
+    UploadTooLarge, extract_pages, ingest_pdf, spool_fileobj, spool_upload
+)
+from services.vector_service import init_vectorstore, search_vector_db
+
+def make_pdf(pages):
+    """Build a minimal text PDF, one string per page"""
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        "<< /Type /Pages /Kids [%s] /Count %d >>" % (
+            " ".join(f"{4 + 2 * i} 0 R" for i in range(len(pages))), len(pages)),
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i, text in enumerate(pages):
+        objects.append(
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>"
+        )
+        stream = f"BT /F1 10 Tf 50 750 Td ({text}) Tj ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode()
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return out
+
+class FakeUpload:
+    """Minimal stand-in for fastapi.UploadFile"""
+    def __init__(self, data, filename="test.pdf"):
+        self.filename = filename
+        self.reads = []
+        self._buffer = io.BytesIO(data)
+
+    async def read(self, size=-1):
+        block = self._buffer.read(size)
+        self.reads.append(len(block))
+        return block
+
+@pytest.fixture(autouse=True)
+def memory_store(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "TEXT_CACHE_DIR", str(tmp_path / "text_cache"))
+    init_vectorstore(persist=False, retrieval_mode="bm25")
+    yield
+    ingest_pool.shutdown_ingest_pool()
+
+def test_extract_and_chunk_reads_every_page():
+    """Test extraction and chunking of a small PDF"""
+    result = extract_and_chunk(make_pdf([f"Page {i} mentions armadillos" for i in range(3)]))
+    assert result["status"] == "success"
+    assert result["pages"] == 3
+    assert "armadillos" in result["chunks"][0]
+
+def test_extract_and_chunk_reports_empty_pdf():
+    """Test a PDF without text is reported as an error"""
+    assert extract_and_chunk(make_pdf([""]))["status"] == "error"
+
+async def ingest_upload(upload, directory):
+    """Spool an upload to disk and ingest the file, as /upload and the queue worker do"""
+    path = str(directory / "upload.pdf")
+    pdf_hash, _ = await spool_upload(upload, path, settings.MAX_FILE_SIZE_MB * 1024 * 1024)
+    return await ingest_pdf(path, str(uuid.uuid4()), pdf_hash, upload.filename)
+
+@pytest.mark.asyncio
+async def test_spooled_upload_parses_in_worker_process(monkeypatch, tmp_path):
+    """Test a spooled upload is extracted in the process pool and indexed"""
+    monkeypatch.setattr(settings, "INGEST_WORKERS", 1)
+    result = await ingest_upload(FakeUpload(make_pdf(["Narwhal tusks are teeth"])), tmp_path)
+    assert result["status"] == "success"
+    assert ingest_pool._pool is not None
+    assert search_vector_db("narwhal", k=1)[0]["metadata"]["doc_id"] == result["doc_id"]
+
+@pytest.mark.asyncio
+async def test_event_loop_stays_responsive_during_parse(monkeypatch, tmp_path):
+    """Test the loop keeps ticking while a PDF is parsed off-loop"""
+    monkeypatch.setattr(settings, "INGEST_WORKERS", 0)
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0)
+
+    task = asyncio.create_task(ticker())
+    await ingest_upload(FakeUpload(make_pdf([f"page {i} text" for i in range(40)])), tmp_path)
+    task.cancel()
+    assert ticks > 1
+
+def test_split_page_ranges_covers_all_pages_in_order():
+    """Test page range splitting is contiguous and balanced"""
+    assert split_page_ranges(10, 3) == [(0, 4), (4, 7), (7, 10)]
+    assert split_page_ranges(2, 8) == [(0, 1), (1, 2)]
+    assert split_page_ranges(0, 4) == [(0, 0)]
+
+@pytest.mark.asyncio
+async def test_parallel_extraction_preserves_page_order(monkeypatch):
+    """Test large PDFs are split across workers and reassembled in order"""
+    monkeypatch.setattr(settings, "INGEST_WORKERS", 2)
+    monkeypatch.setattr(settings, "PDF_PARALLEL_PAGE_THRESHOLD", 5)
+    page_texts, timings = await extract_pages(make_pdf([f"page number {i}" for i in range(12)]))
+
+    assert timings["page_ranges"] == 4
+    assert [text.strip() for text in page_texts] == [f"page number {i}" for i in range(12)]
+    assert len(timings["page_seconds"]) == 12
+    assert len(timings["slowest_pages"]) == 5
+
+@pytest.mark.asyncio
+async def test_small_pdf_stays_single_range(monkeypatch):
+    """Test PDFs below the threshold are extracted by one worker"""
+    monkeypatch.setattr(settings, "INGEST_WORKERS", 0)
+    page_texts, timings = await extract_pages(make_pdf(["only page"]))
+    assert timings["page_ranges"] == 1
+    assert page_texts[0].strip() == "only page"
+
+@pytest.fixture
+def queue(monkeypatch, tmp_path):
+    """Ingest queue with DB writes captured in memory"""
+    monkeypatch.setattr(settings, "INGEST_WORKERS", 0)
+    updates = {}
+
+    async def fake_update(doc_id, **fields):
+        updates.setdefault(doc_id, {}).update(fields)
+
+    monkeypatch.setattr(ingest_queue, "_update_document", fake_update)
+    yield tmp_path, updates
+    # each test runs on its own loop; never carry workers over
+    ingest_queue._workers.clear()
+    ingest_queue._jobs.clear()
+    ingest_queue._queue = None
+
+def write_pdf(directory, name, pages):
+    path = directory / name
+    path.write_bytes(make_pdf(pages))
+    return str(path)
+
+@pytest.mark.asyncio
+async def test_background_ingest_reports_progress_and_completes(queue):
+    """Test a queued upload is indexed in the background and its row completed"""
+    tmp_path, updates = queue
+    ingest_queue.start_ingest_workers(concurrency=1)
+    path = write_pdf(tmp_path, "a.pdf", ["Okapis live in forests", "Okapis have stripes"])
+    job = ingest_queue.enqueue_ingest("doc-a", path, "hash-a", "a.pdf")
+    assert job["status"] == "queued"
+    assert ingest_queue.find_pending_job("hash-a")["doc_id"] == "doc-a"
+
+    await ingest_queue.wait_for_ingest()
+    await ingest_queue.stop_ingest_workers()
+
+    assert updates["doc-a"]["status"] == "completed"
+    assert updates["doc-a"]["pages"] == 2
+    assert updates["doc-a"]["timings"]["pages"] == 2
+    assert ingest_queue.get_job_progress("doc-a") is None
+    assert search_vector_db("okapis", k=1)[0]["metadata"]["doc_id"] == "doc-a"
+
+@pytest.mark.asyncio
+async def test_background_ingest_marks_unreadable_pdf_failed(queue):
+    """Test a PDF without text ends as a failed row with the error message"""
+    tmp_path, updates = queue
+    ingest_queue.start_ingest_workers(concurrency=1)
+    ingest_queue.enqueue_ingest("doc-empty", write_pdf(tmp_path, "e.pdf", [""]), "hash-e", "e.pdf")
+    await ingest_queue.wait_for_ingest()
+    await ingest_queue.stop_ingest_workers()
+
+    assert updates["doc-empty"]["status"] == "failed"
+    assert updates["doc-empty"]["error_message"]
+
+@pytest.mark.asyncio
+async def test_full_ingest_queue_rejects_new_jobs(queue, monkeypatch):
+    """Test enqueueing beyond INGEST_QUEUE_SIZE raises instead of growing the backlog"""
+    tmp_path, _ = queue
+    monkeypatch.setattr(settings, "INGEST_QUEUE_SIZE", 1)
+    ingest_queue.start_ingest_workers(concurrency=1)
+    path = write_pdf(tmp_path, "q.pdf", ["queued text"])
+    ingest_queue.enqueue_ingest("doc-1", path, "hash-1", "q.pdf")  # picked up by the worker
+    await asyncio.sleep(0)
+    ingest_queue.enqueue_ingest("doc-2", path, "hash-2", "q.pdf")  # fills the single slot
+    with pytest.raises(ingest_queue.IngestQueueFull):
+        ingest_queue.enqueue_ingest("doc-3", path, "hash-3", "q.pdf")
+    await ingest_queue.wait_for_ingest()
+    await ingest_queue.stop_ingest_workers()
+
+@pytest.mark.asyncio
+async def test_extract_pages_reports_progress(monkeypatch):
+    """Test the progress callback sees the page total and completed pages"""
+    monkeypatch.setattr(settings, "INGEST_WORKERS", 0)
+    seen = {}
+    await extract_pages(make_pdf(["one", "two", "three"]), progress=seen.update)
+    assert seen == {"pages_total": 3, "pages_done": 3}
+
+@pytest.mark.asyncio
+async def test_spool_upload_hashes_in_blocks(tmp_path):
+    """Test uploads are written to disk block by block with an incremental hash"""
+    data = make_pdf([f"spooled page {i}" for i in range(20)])
+    upload = FakeUpload(data)
+    path = tmp_path / "upload.part"
+    pdf_hash, size = await spool_upload(upload, str(path), max_bytes=len(data), block_size=256)
+
+    assert (pdf_hash, size) == (hashlib.md5(data).hexdigest(), len(data))
+    assert path.read_bytes() == data
+    assert max(upload.reads) == 256
+
+@pytest.mark.asyncio
+async def test_spool_upload_stops_at_size_limit(tmp_path):
+    """Test an oversize upload is rejected mid-stream and its spool file removed"""
+    upload = FakeUpload(b"x" * 10_000)
+    path = tmp_path / "big.part"
+    with pytest.raises(UploadTooLarge):
+        await spool_upload(upload, str(path), max_bytes=4096, block_size=1024)
+
+    assert not path.exists()
+    assert sum(upload.reads) <= 5 * 1024
+
+def page_text(i):
+    return " ".join(f"Sentence {i}.{j} about pangolin scales." for j in range(12))
+
+def test_chunk_window_matches_whole_text_split():
+    """Test windowed chunking carries the tail across page breaks like a single split"""
+    pages = list(enumerate((page_text(i) for i in range(6)), 1))
+    whole = chunk_pages([text for _, text in pages])
+    chunks, carry = [], None
+    for window in (pages[:2], pages[2:4], pages[4:]):
+        emitted, carry = chunk_window(carry, window, whole["chunk_size"], whole["chunk_overlap"])
+        chunks += emitted
+        assert carry  # the last chunk is always held back for the next window
+    chunks += chunk_window(carry, [], whole["chunk_size"], whole["chunk_overlap"], final=True)[0]
+    assert [text for text, _ in chunks] == whole["chunks"]
+    assert [metadata for _, metadata in chunks] == whole["chunk_metadata"]
+
+def test_chunk_metadata_maps_back_to_pages():
+    """Test chunk offsets index the joined page text and pages cover each chunk"""
+    texts = [page_text(i) for i in range(4)]
+    result = chunk_pages(texts)
+    full_text = "\n".join(texts)
+    page_of = lambda offset: full_text.count("\n", 0, offset) + 1  # one line per page
+    for chunk, metadata in zip(result["chunks"], result["chunk_metadata"]):
+        assert full_text[metadata["char_start"]:metadata["char_end"]] == chunk
+        assert metadata["page"] == page_of(metadata["char_start"])
+        assert metadata["page_end"] == page_of(metadata["char_end"] - 1)
+    assert result["chunk_metadata"][-1]["page_end"] == 4
+
+@pytest.mark.asyncio
+async def test_ingest_indexes_each_page_window(monkeypatch):
+    """Test chunks become searchable window by window with contiguous chunk_index"""
+    monkeypatch.setattr(settings, "INGEST_WORKERS", 0)
+    monkeypatch.setattr(settings, "INGEST_PAGE_BATCH", 2)
+    indexed = []
+
+    def progress(chunks_indexed=None, **fields):
+        if chunks_indexed is not None:
+            indexed.append(chunks_indexed)
+
+    result = await ingest_pdf(make_pdf([page_text(i) for i in range(6)]), "doc-stream", "h", "s.pdf", progress)
+
+    assert result["status"] == "success"
+    assert result["timings"]["page_ranges"] == 3
+    assert len(indexed) > 1 and indexed == sorted(indexed) and indexed[-1] == result["chunks"]
+    store = vector_service._get_store()
+    assert [store.get_metadata(i)["chunk_index"] for i in range(len(store))] == list(range(result["chunks"]))
+
+@pytest.mark.asyncio
+async def test_failed_ingest_purges_its_indexed_chunks(queue, monkeypatch):
+    """Test chunks indexed before an ingest failed are no longer searchable"""
+    tmp_path, updates = queue
+
+    async def failing_ingest(source, doc_id, pdf_hash, filename, progress=None):
+        vector_service.add_to_vectorstore(["Half indexed gecko notes"], doc_id=doc_id, pdf_hash=pdf_hash)
+        return {"status": "error", "doc_id": doc_id, "pdf_hash": pdf_hash, "message": "parser crashed"}
+
+    monkeypatch.setattr(ingest_queue, "ingest_pdf", failing_ingest)
+    ingest_queue.start_ingest_workers(concurrency=1)
+    ingest_queue.enqueue_ingest("doc-half", write_pdf(tmp_path, "h.pdf", ["gecko"]), "hash-h", "h.pdf")
+    await ingest_queue.wait_for_ingest()
+    await ingest_queue.stop_ingest_workers()
+
+    assert updates["doc-half"]["status"] == "failed"
+    assert search_vector_db("gecko", k=5) == []
+    assert vector_service.get_doc_id_by_hash("hash-h") is None
+
+@pytest.mark.asyncio
+async def test_interrupted_ingest_is_resumed_by_one_worker(queue, monkeypatch):
+    """Test every worker runs the resume, but an orphaned document is purged and queued once"""
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from sqlalchemy.orm import sessionmaker
+    from db.models import Base, Document
+
+    tmp_path, updates = queue
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'app.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    monkeypatch.setattr(ingest_queue, "AsyncSessionLocal",
+                        sessionmaker(engine, class_=AsyncSession, expire_on_commit=False))
+    queued, purged = [], []
+    monkeypatch.setattr(ingest_queue, "enqueue_ingest",
+                        lambda doc_id, path, pdf_hash, filename: queued.append(doc_id))
+    monkeypatch.setattr(ingest_queue, "purge_document", purged.append)
+
+    sibling = ingest_queue._hold_owner_lock("sibling")  # another worker, still ingesting its upload
+    open(ingest_queue._owner_path("crashed"), "ab").close()  # left behind by a dead worker
+    row = dict(filename="r.pdf", pdf_hash="h", file_size=1, pages=0, chunks=0, chunk_size=0, status="processing")
+    async with ingest_queue.AsyncSessionLocal() as session:
+        session.add_all([Document(doc_id="doc-crashed", claimed_by="crashed", **row),
+                         Document(doc_id="doc-live", claimed_by="sibling", **row),
+                         Document(doc_id="doc-legacy", **row)])
+        await session.commit()
+    for doc_id in ("doc-crashed", "doc-live", "doc-legacy"):
+        (tmp_path / f"{doc_id}.pdf").write_bytes(b"%PDF")
+
+    try:
+        assert await ingest_queue.resume_pending_ingests() == 2
+        first_worker = ingest_queue._owner_lock
+        ingest_queue._owner, ingest_queue._owner_lock = None, None  # a second worker starts up
+        assert await ingest_queue.resume_pending_ingests() == 0
+        assert sorted(queued) == sorted(purged) == ["doc-crashed", "doc-legacy"]
+        assert not await ingest_queue._claim_document("doc-crashed", "crashed", ingest_queue._owner)
+
+        sibling.close()  # the sibling dies mid-ingest
+        assert await ingest_queue.resume_pending_ingests() == 1
+        assert queued[-1] == purged[-1] == "doc-live"
+    finally:
+        sibling.close()
+        first_worker.close()
+        ingest_queue._release_owner()
+        await engine.dispose()
+
+@pytest.mark.asyncio
+async def test_ingest_reuses_cached_page_text(monkeypatch):
+    """Test a second ingest of the same content reads the text cache, not the PDF"""
+    monkeypatch.setattr(settings, "INGEST_WORKERS", 0)
+    pdf = make_pdf([page_text(i) for i in range(3)])
+    first = await ingest_pdf(pdf, "doc-1", "cafe01", "c.pdf")
+    assert text_cache.has_pages("cafe01")
+    assert "text_cache" not in first["timings"]
+
+    second = await ingest_pdf(b"not a pdf any more", "doc-2", "cafe01", "c.pdf")
+    assert second["timings"]["text_cache"] == "hit"
+    assert second["chunks"] == first["chunks"] and second["pages"] == 3
+
+@pytest.mark.asyncio
+async def test_failed_ingest_leaves_no_cache_entry(monkeypatch):
+    """Test pages of a PDF that produced no chunks are not cached"""
+    monkeypatch.setattr(settings, "INGEST_WORKERS", 0)
+    await ingest_pdf(make_pdf([""]), "doc-empty", "beef02", "e.pdf")
+    assert not text_cache.has_pages("beef02")
+
+@pytest.mark.asyncio
+async def test_reindex_rechunks_from_cache_with_new_settings(monkeypatch, tmp_path):
+    """Test re-indexing applies new chunk sizes and keeps uncached documents"""
+    monkeypatch.setattr(settings, "INGEST_WORKERS", 0)
+    init_vectorstore(str(tmp_path / "index"), persist=True, retrieval_mode="bm25")
+    await ingest_pdf(make_pdf([page_text(i) for i in range(4)]), "doc-cached", "aa11", "a.pdf")
+    monkeypatch.setattr(settings, "TEXT_CACHE_ENABLED", False)
+    await ingest_pdf(make_pdf(["Uncached document about tapirs"]), "doc-plain", "bb22", "b.pdf")
+    monkeypatch.setattr(settings, "TEXT_CACHE_ENABLED", True)
+    before = vector_service.get_document_chunk_count("doc-cached")
+
+    monkeypatch.setattr(settings, "CHUNK_SIZE_SMALL", 120)
+    monkeypatch.setattr(settings, "CHUNK_OVERLAP_SMALL", 20)
+    report = await reindex_documents([("doc-cached", "aa11", "a.pdf"), ("doc-plain", "bb22", "b.pdf")])
+
+    assert report["missing"] == ["doc-plain"]
+    assert report["per_document"]["doc-cached"]["chunk_size"] == 120
+    assert vector_service.get_document_chunk_count("doc-cached") == report["chunks"] > before
+    assert search_vector_db("tapirs", k=1)[0]["metadata"]["doc_id"] == "doc-plain"
+    assert not (tmp_path / "index.rebuild").exists()
+    # the swapped-in store is what a restart opens
+    init_vectorstore(str(tmp_path / "index"), persist=True, retrieval_mode="bm25")
+    assert vector_service.get_document_chunk_count("doc-cached") == report["chunks"]
+
+class FakeSession:
+    """Captures rows added through AsyncSessionLocal()"""
+    rows = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def add_all(self, rows):
+        FakeSession.rows += rows
+
+    async def commit(self):
+        pass
+
+@pytest.mark.asyncio
+async def test_bulk_ingest_indexes_directory_and_skips_duplicates(monkeypatch, tmp_path):
+    """Test bulk ingestion batches chunks, inserts rows and reports throughput"""
+    # spawned parsers read settings from the environment
+    monkeypatch.setenv("TEXT_CACHE_DIR", settings.TEXT_CACHE_DIR)
+    FakeSession.rows = []
+    monkeypatch.setattr(bulk_ingest, "AsyncSessionLocal", FakeSession)
+
+    async def known(hashes):
+        return {hashlib.md5(make_pdf(["Already indexed"])).hexdigest()}
+
+    monkeypatch.setattr(bulk_ingest, "_known_hashes", known)
+    (tmp_path / "docs" / "nested").mkdir(parents=True)
+    write_pdf(tmp_path / "docs", "a.pdf", ["Pangolins eat ants", "Pangolins roll up"])
+    write_pdf(tmp_path / "docs" / "nested", "b.pdf", ["Capybaras swim well"])
+    write_pdf(tmp_path / "docs" / "nested", "copy.pdf", ["Capybaras swim well"])
+    write_pdf(tmp_path / "docs", "old.pdf", ["Already indexed"])
+    write_pdf(tmp_path / "docs", "empty.pdf", [""])
+    (tmp_path / "docs" / "notes.txt").write_text("not a pdf")
+
+    paths = bulk_ingest.find_pdfs(str(tmp_path / "docs"))
+    assert len(paths) == 5
+    report = await bulk_ingest.bulk_ingest(paths, workers=2, batch_chunks=1)
+
+    assert report["ingested"] == 2 and report["duplicates"] == 2 and report["failed"] == 1
+    assert report["pages"] == 3 and report["chunks"] > 0 and report["pages_per_second"] > 0
+    statuses = sorted(row.status for row in FakeSession.rows)
+    assert statuses == ["completed", "completed", "failed"]
+    hit = search_vector_db("pangolins", k=1)[0]["metadata"]
+    assert hit["filename"] == "a.pdf"
+    assert any(row.doc_id == hit["doc_id"] and row.pages == 2 for row in FakeSession.rows)
+    assert text_cache.has_pages(hit["pdf_hash"])
+
+def test_add_documents_to_vectorstore_appends_all_documents():
+    """Test several documents are indexed with their own doc_id and metadata"""
+    result = vector_service.add_documents_to_vectorstore([
+        {"doc_id": "doc-x", "chunks": ["Quokkas smile"], "pdf_hash": "x1", "filename": "x.pdf"},
+        {"doc_id": "doc-y", "chunks": ["Wombats dig", "Wombats sleep"], "pdf_hash": "y1", "filename": "y.pdf",
+         "chunk_metadata": [{"page": 1}, {"page": 2}]}
+    ])
+    assert result == {"success": True, "chunks_added": 3}
+    assert search_vector_db("quokkas", k=1)[0]["metadata"]["doc_id"] == "doc-x"
+    assert search_vector_db("sleep", k=1, doc_id="doc-y")[0]["metadata"]["page"] == 2
+
+def test_spool_zip_streams_pdf_members(tmp_path, monkeypatch):
+    """Test zip members are spooled one by one with limits applied"""
+    import zipfile
+    from api.routes import _spool_zip
+
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path / "uploads"))
+    (tmp_path / "uploads").mkdir()
+    archive = tmp_path / "batch.zip"
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("folder/one.pdf", make_pdf(["first"]))
+        zf.writestr("readme.txt", "not a pdf")
+        zf.writestr("big.PDF", b"x" * 5000)
+        zf.writestr("two.pdf", make_pdf(["second"]))
+
+    items = _spool_zip(str(archive), max_size=4000, limit=1)
+    assert [item["filename"] for item in items] == ["one.pdf", "readme.txt", "big.PDF", "two.pdf"]
+    assert items[0]["pdf_hash"] == hashlib.md5(make_pdf(["first"])).hexdigest()
+    assert open(items[0]["spool_path"], "rb").read() == make_pdf(["first"])
+    assert items[1]["message"] == "Only PDF files are allowed"
+    assert items[1]["status"] == items[2]["status"] == items[3]["status"] == "rejected"
+    assert len(os.listdir(tmp_path / "uploads")) == 1
+
+def test_spool_fileobj_removes_partial_file(tmp_path):
+    """Test the sync spooler stops at the limit and leaves nothing behind"""
+    path = tmp_path / "f.part"
+    with pytest.raises(UploadTooLarge):
+        spool_fileobj(io.BytesIO(b"y" * 100), str(path), max_bytes=50, block_size=16)
+    assert not path.exists()
+
+async def body(*blocks):
+    for block in blocks:
+        yield block
+
+@pytest.fixture
+def sessions(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path / "uploads"))
+    return tmp_path / "uploads" / ".sessions"
+
+@pytest.mark.asyncio
+async def test_upload_session_resumes_from_committed_offset(sessions):
+    """Test ranges are assembled in order, retries may overlap and gaps are refused"""
+    data = make_pdf(["resumable upload"])
+    session = upload_sessions.create_session("r.pdf", len(data))
+    upload_id = session["upload_id"]
+
+    first = await upload_sessions.write_range(upload_id, f"bytes 0-99/{len(data)}", body(data[:60], data[60:100]))
+    assert first["offset"] == 100
+    with pytest.raises(upload_sessions.UploadRangeError) as gap:
+        await upload_sessions.write_range(upload_id, f"bytes 150-{len(data) - 1}/{len(data)}", body(data[150:]))
+    assert gap.value.offset == 100
+    with pytest.raises(upload_sessions.UploadRangeError):
+        await upload_sessions.complete_session(upload_id)
+
+    # retry overlapping the committed bytes, then append the rest without a range
+    await upload_sessions.write_range(upload_id, f"bytes 80-149/{len(data)}", body(data[80:150]))
+    await upload_sessions.write_range(upload_id, None, body(data[150:]))
+    assert upload_sessions.get_session(upload_id)["offset"] == len(data)
+
+    _, part_path, pdf_hash = await upload_sessions.complete_session(upload_id)
+    assert pdf_hash == hashlib.md5(data).hexdigest()
+    assert open(part_path, "rb").read() == data
+    upload_sessions.finish_session(upload_id)
+    assert os.listdir(sessions) == []
+
+@pytest.mark.asyncio
+async def test_upload_session_enforces_sizes(sessions, monkeypatch):
+    """Test the declared size and MAX_FILE_SIZE_MB bound every range"""
+    monkeypatch.setattr(settings, "MAX_FILE_SIZE_MB", 1)
+    with pytest.raises(UploadTooLarge):
+        upload_sessions.create_session("big.pdf", 2 * 1024 * 1024)
+
+    upload_id = upload_sessions.create_session("s.pdf", 10)["upload_id"]
+    with pytest.raises(UploadTooLarge):
+        await upload_sessions.write_range(upload_id, None, body(b"x" * 6, b"y" * 6))
+    assert upload_sessions.get_session(upload_id)["offset"] == 6
+    with pytest.raises(upload_sessions.UploadRangeError):
+        await upload_sessions.write_range(upload_id, "bytes 6-11/12", body(b"z" * 6))
+
+@pytest.mark.asyncio
+async def test_upload_session_rejects_body_that_misses_its_range(sessions):
+    """Test a body shorter or longer than its Content-Range is refused and the offset stays put"""
+    upload_id = upload_sessions.create_session("c.pdf", 20)["upload_id"]
+    await upload_sessions.write_range(upload_id, "bytes 0-4/20", body(b"a" * 5))
+    with pytest.raises(upload_sessions.UploadBodyMismatch):
+        await upload_sessions.write_range(upload_id, "bytes 5-14/20", body(b"b" * 6))
+    assert upload_sessions.get_session(upload_id)["offset"] == 5
+    with pytest.raises(upload_sessions.UploadBodyMismatch):
+        await upload_sessions.write_range(upload_id, "bytes 5-9/20", body(b"b" * 8))
+    assert upload_sessions.get_session(upload_id)["offset"] == 5
+
+    session = await upload_sessions.write_range(upload_id, "bytes 5-19/20", body(b"d" * 15))
+    assert session["offset"] == 20
+
+@pytest.mark.asyncio
+async def test_upload_session_locks_only_exist_for_live_sessions(sessions, monkeypatch):
+    """Test unknown ids never get a lock and expired sessions drop theirs"""
+    unknown = str(uuid.uuid4())
+    with pytest.raises(upload_sessions.UploadSessionNotFound):
+        await upload_sessions.write_range(unknown, None, body(b"x"))
+    assert unknown not in upload_sessions._locks
+
+    upload_id = upload_sessions.create_session("l.pdf", 10)["upload_id"]
+    await upload_sessions.write_range(upload_id, None, body(b"x" * 4))
+    assert upload_id in upload_sessions._locks
+    monkeypatch.setattr(settings, "UPLOAD_SESSION_TTL_SECONDS", -1)
+    await upload_sessions.write_range(upload_id, None, body(b"x" * 4))
+    assert upload_sessions.cleanup_expired_sessions() == 1
+    assert upload_id not in upload_sessions._locks
+
+def test_expired_upload_sessions_are_removed(sessions, monkeypatch):
+    """Test idle sessions past their TTL disappear with their part files"""
+    monkeypatch.setattr(settings, "UPLOAD_SESSION_TTL_SECONDS", -1)
+    upload_id = upload_sessions.create_session("old.pdf", 10)["upload_id"]
+    assert upload_sessions.cleanup_expired_sessions() == 1
+    assert os.listdir(sessions) == []
+    with pytest.raises(upload_sessions.UploadSessionNotFound):
+        upload_sessions.get_session(upload_id)
+    with pytest.raises(upload_sessions.UploadSessionNotFound):
+        upload_sessions.get_session("../../etc/passwd")
@@ -0,0 +1,66 @@
+"""
+Tests for quantized embedding storage
+"""
+import sys
+import os
+import numpy as np
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.quantization import (
+    ScalarQuantizer, ProductQuantizer, QuantizedIndex, quantization_report
+)
+
+def _unit_vectors(n, dimension, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(n, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def test_scalar_quantizer_round_trip_error_is_small():
+    """Test int8 codes decode close to the original vectors"""
+    vectors = _unit_vectors(500, 32)
+    quantizer = ScalarQuantizer(32)
+    quantizer.train(vectors)
+    codes = quantizer.encode(vectors)
+    assert codes.dtype == np.uint8 and codes.shape == (500, 32)
+    assert np.abs(quantizer.decode(codes) - vectors).max() < 0.01
+
+def test_product_quantizer_scores_match_decoded_vectors():
+    """Test lookup-table scores equal inner products with decoded vectors"""
+    vectors = _unit_vectors(600, 32)
+    quantizer = ProductQuantizer(32, m=8, iterations=4)
+    quantizer.train(vectors)
+    codes = quantizer.encode(vectors)
+    assert codes.shape == (600, 8)
+
+    query = vectors[0]
+    expected = quantizer.decode(codes) @ query
+    assert np.allclose(quantizer.score(codes, quantizer.prepare(query)), expected, atol=1e-4)
+
+def test_quantized_index_trains_then_drops_float_vectors():
+    """Test float buffer until train_size, then codes only and rescoring"""
+    vectors = _unit_vectors(300, 16)
+    index = QuantizedIndex(ScalarQuantizer(16), rescore_fn=lambda rows: vectors[rows], train_size=200)
+    index.add(vectors[:100])
+    assert index.memory_bytes == 100 * 16 * 4
+    index.add(vectors[100:])
+    assert index._pending is None
+
+    hits = index.search(vectors[250], k=3)
+    assert hits[0][0] == 250
+    scoped = index.search(vectors[250], k=3, rows=np.arange(100))
+    assert all(row < 100 for row, _ in scoped)
+
+def test_quantization_report_measures_recall_against_float():
+    """Test the report covers each method and rescoring helps recall"""
+    vectors = _unit_vectors(1000, 32)
+    queries = _unit_vectors(10, 32, seed=1)
+    report = quantization_report(vectors, queries, k=5, pq_m=8)
+
+    by_method = {row["method"]: row for row in report}
+    assert by_method["int8"]["compression"] == 4.0
+    assert by_method["pq"]["compression"] == 16.0
+    assert by_method["int8"]["recall"] > 0.8
+    for method in ("int8", "pq"):
+        assert by_method[method]["recall_rescored"] >= by_method[method]["recall"]
@@ -0,0 +1,56 @@
+"""
+Tests for single-flight request coalescing
+"""
+import sys
+import os
+import asyncio
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.single_flight import SingleFlight
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_execution():
+    """Test identical keys run once while different keys run separately"""
+    flight = SingleFlight()
+    calls = []
+
+    async def work(tag):
+        calls.append(tag)
+        await asyncio.sleep(0.05)
+        return f"result {tag}"
+
+    results = await asyncio.gather(*(flight.do("q", lambda: work("q")) for _ in range(5)),
+                                   flight.do("other", lambda: work("other")))
+    assert calls == ["q", "other"]
+    assert [result for result, _ in results] == ["result q"] * 5 + ["result other"]
+    assert [shared for _, shared in results] == [False, True, True, True, True, False]
+    assert flight.coalesced == 4 and flight.in_flight() == 0
+
+    # finished keys start fresh
+    assert await flight.do("q", lambda: work("again")) == ("result again", False)
+
+@pytest.mark.asyncio
+async def test_errors_reach_every_caller_and_cancellation_does_not():
+    """Test a failure is shared, and one caller going away does not cancel the others"""
+    flight = SingleFlight()
+
+    async def broken():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    results = await asyncio.gather(flight.do("k", broken), flight.do("k", broken), return_exceptions=True)
+    assert [str(result) for result in results] == ["boom", "boom"]
+
+    async def slow():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    leader = asyncio.ensure_future(flight.do("s", slow))
+    await asyncio.sleep(0)
+    follower = asyncio.ensure_future(flight.do("s", slow))
+    await asyncio.sleep(0.01)
+    leader.cancel()
+    assert await follower == ("done", True)
@@ -0,0 +1,444 @@
+"""
+Tests for the vector service and its indexes
+"""
+import sys
+import os
+import uuid
+import pytest
+import numpy as np
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.chunk_store import ChunkStore, StoreReplaced, OFFSETS_FILE, TEXTS_FILE
+from services.dense_index import DenseIndex
+from services.embeddings import HashingEmbedder
+from services.inverted_index import InvertedIndex, tokenize
+from services import vector_service
+from services.vector_service import (
+    add_to_vectorstore, search_vector_db, search_vector_db_batch, init_vectorstore, refresh_vectorstore,
+    get_doc_id_by_hash, is_pdf_exists
+)
+
+@pytest.fixture(autouse=True)
+def isolated_store(tmp_path):
+    """Point the global vector store at a throwaway directory"""
+    init_vectorstore(str(tmp_path / "index"), persist=True)
+    yield
+    init_vectorstore(persist=False)
+
+def test_tokenize_lowercases_words():
+    """Test tokenizer splits on non-word characters"""
+    assert tokenize("Hello, World! RAG-system") == ["hello", "world", "rag", "system"]
+
+def test_bm25_ranks_rarer_and_denser_matches_higher():
+    """Test BM25 prefers chunks with more occurrences of rarer terms"""
+    index = InvertedIndex()
+    index.add(0, "the cat sat on the mat")
+    index.add(1, "the dog chased the cat around the cat tree")
+    index.add(2, "the weather is nice today")
+
+    hits = index.search("cat tree", k=5)
+    assert [chunk_id for chunk_id, _ in hits] == [1, 0]
+    assert hits[0][1] > hits[1][1] > 0
+
+def test_bm25_top_k_and_ranges():
+    """Test top-k truncation and chunk id range scoping"""
+    index = InvertedIndex()
+    for i in range(10):
+        index.add(i, f"common term number {i}")
+
+    assert len(index.search("common", k=3)) == 3
+    hits = index.search("common", k=10, ranges=[(0, 2), (6, 8)])
+    assert sorted(chunk_id for chunk_id, _ in hits) == [0, 1, 6, 7]
+    assert index.search("missing", k=3) == []
+
+def test_bm25_rejects_out_of_order_ids():
+    """Test chunk ids must be dense and in insertion order"""
+    index = InvertedIndex()
+    index.add(0, "first")
+    try:
+        index.add(5, "gap")
+        assert False, "expected ValueError"
+    except ValueError:
+        pass
+
+def test_search_vector_db_scoped_by_doc_id():
+    """Test end-to-end add and search with doc_id scoping"""
+    doc_a, doc_b = str(uuid.uuid4()), str(uuid.uuid4())
+    add_to_vectorstore(["zebrafish regeneration study", "unrelated text"], doc_id=doc_a)
+    add_to_vectorstore(["zebrafish habitat survey"], doc_id=doc_b)
+
+    results = search_vector_db("zebrafish", k=5)
+    assert {r["metadata"]["doc_id"] for r in results} >= {doc_a, doc_b}
+
+    scoped = search_vector_db("zebrafish", k=5, doc_id=doc_b)
+    assert len(scoped) == 1
+    assert scoped[0]["content"] == "zebrafish habitat survey"
+
+def test_chunk_store_reopens_from_disk(tmp_path):
+    """Test appended chunks survive closing and reopening the store"""
+    store = ChunkStore(str(tmp_path))
+    store.append([("a_0", "first chunk", {"doc_id": "a"}), ("a_1", "ikinci parça", {"doc_id": "a"})])
+    store.append([("b_0", "third", {"doc_id": "b"})])
+    store.close()
+
+    reopened = ChunkStore(str(tmp_path))
+    assert len(reopened) == 3
+    assert reopened.get_text(1) == "ikinci parça"
+    assert reopened.get_record(2) == {"id": "b_0", "content": "third", "metadata": {"doc_id": "b"}}
+
+def test_chunk_store_discards_torn_append(tmp_path):
+    """Test uncommitted bytes after the last offsets entry are dropped"""
+    store = ChunkStore(str(tmp_path))
+    store.append([("a_0", "kept", {})])
+    store.close()
+    with open(tmp_path / TEXTS_FILE, "ab") as f:
+        f.write(b"partial")
+    with open(tmp_path / OFFSETS_FILE, "ab") as f:
+        f.write(b"\x01\x02")
+
+    reopened = ChunkStore(str(tmp_path))
+    assert len(reopened) == 1
+    reopened.append([("a_1", "next", {})])
+    assert reopened.get_text(1) == "next"
+
+def test_search_after_restart_uses_persisted_chunks(tmp_path):
+    """Test the index is rebuilt from the persisted store on reopen"""
+    directory = str(tmp_path / "restart")
+    init_vectorstore(directory, persist=True)
+    add_to_vectorstore(["persistent quokka facts"], doc_id="doc-q")
+
+    init_vectorstore(directory, persist=True)
+    results = search_vector_db("quokka", k=3)
+    assert [r["metadata"]["doc_id"] for r in results] == ["doc-q"]
+
+def test_chunk_store_shared_between_handles(tmp_path):
+    """Test two handles on one directory (two workers) see each other's appends"""
+    worker_a = ChunkStore(str(tmp_path))
+    worker_b = ChunkStore(str(tmp_path))
+
+    worker_a.append([("a_0", "from a", {"doc_id": "a"})])
+    assert len(worker_b) == 0
+    assert list(worker_b.refresh()) == [0]
+    assert worker_b.get_text(0) == "from a"
+
+    assigned = worker_b.append([("b_0", "from b", {"doc_id": "b"})])
+    assert list(assigned) == [1]
+    assigned = worker_a.append([("a_1", "again a", {"doc_id": "a"})])
+    assert list(assigned) == [2]
+    assert worker_a.get_text(1) == "from b"
+    assert worker_b.refresh() == range(2, 3)
+
+def test_refresh_vectorstore_indexes_sibling_appends(tmp_path):
+    """Test the global index picks up chunks written by another process"""
+    directory = str(tmp_path / "shared")
+    init_vectorstore(directory, persist=True)
+    sibling = ChunkStore(directory)
+    sibling.append([("s_0", "platypus venom research", {"doc_id": "sib"})])
+
+    assert refresh_vectorstore() == 1
+    results = search_vector_db("platypus", k=3)
+    assert [r["metadata"]["doc_id"] for r in results] == ["sib"]
+
+def test_hashing_embedder_is_normalized_and_deterministic():
+    """Test hashing embeddings are unit length and stable"""
+    embedder = HashingEmbedder(dimension=64)
+    vectors = embedder.embed(["solar panel efficiency", "solar panel efficiency", ""])
+    assert vectors.shape == (3, 64)
+    assert np.allclose(np.linalg.norm(vectors[0]), 1.0)
+    assert np.array_equal(vectors[0], vectors[1])
+    assert not vectors[2].any()
+
+def test_dense_index_grows_and_scopes_rows():
+    """Test matrix growth, argpartition top-k and row scoping"""
+    index = DenseIndex(dimension=4, initial_capacity=2)
+    vectors = np.eye(4, dtype=np.float32)
+    index.add(vectors[:2])
+    index.add(vectors[2:])
+    assert len(index) == 4
+
+    query = np.array([0.1, 0.2, 0.9, 0.3], dtype=np.float32)
+    assert [row for row, _ in index.search(query, k=2)] == [2, 3]
+    scoped = index.search(query, k=2, rows=np.array([0, 1]))
+    assert [row for row, _ in scoped] == [1, 0]
+
+def test_dense_index_search_many_matches_single_queries():
+    """Test a block of queries scored in one product ranks like one query at a time"""
+    rng = np.random.default_rng(0)
+    index = DenseIndex(dimension=8, initial_capacity=4)
+    index.add(rng.standard_normal((50, 8)).astype(np.float32))
+    queries = rng.standard_normal((5, 8)).astype(np.float32)
+    rows = np.arange(10, 30)
+
+    for batch, single_rows in ((index.search_many(queries, k=3), None),
+                               (index.search_many(queries, k=3, rows=rows), rows)):
+        for query, hits in zip(queries, batch):
+            expected = index.search(query, k=3, rows=single_rows)
+            assert [row for row, _ in hits] == [row for row, _ in expected]
+            assert [score for _, score in hits] == pytest.approx([score for _, score in expected])
+
+def test_dense_retrieval_mode_end_to_end(tmp_path):
+    """Test dense mode search, doc_id masking and reopen"""
+    directory = str(tmp_path / "dense")
+    init_vectorstore(directory, persist=True, retrieval_mode="dense",
+                     embedder=HashingEmbedder(dimension=128))
+    add_to_vectorstore(["neural network training tricks", "bread baking guide"], doc_id="ml")
+    add_to_vectorstore(["sourdough bread starter"], doc_id="food")
+
+    results = search_vector_db("bread", k=5)
+    assert {r["metadata"]["doc_id"] for r in results} == {"ml", "food"}
+    scoped = search_vector_db("bread", k=5, doc_id="food")
+    assert [r["content"] for r in scoped] == ["sourdough bread starter"]
+    assert search_vector_db("bread", k=5, doc_id="missing") == []
+
+    init_vectorstore(directory, persist=True, retrieval_mode="dense",
+                     embedder=HashingEmbedder(dimension=128))
+    assert search_vector_db("neural network", k=1)[0]["metadata"]["doc_id"] == "ml"
+
+class CountingEmbedder(HashingEmbedder):
+    """HashingEmbedder that counts the texts it embeds"""
+    def __init__(self, dimension=64):
+        super().__init__(dimension)
+        self.embedded = 0
+
+    def embed(self, texts):
+        self.embedded += len(texts)
+        return super().embed(texts)
+
+def test_dense_embeddings_persist_across_reopen(tmp_path):
+    """Test reopening a dense store reads persisted embeddings instead of re-embedding chunks"""
+    directory = str(tmp_path / "dense")
+    first = CountingEmbedder()
+    init_vectorstore(directory, persist=True, retrieval_mode="dense", embedder=first)
+    add_to_vectorstore(["glacier melt measurements", "volcano eruption history"], doc_id="geo")
+    assert first.embedded == 2
+    expected = search_vector_db("glacier melt", k=2)
+
+    second = CountingEmbedder()
+    init_vectorstore(directory, persist=True, retrieval_mode="dense", embedder=second)
+    assert second.embedded == 0
+    add_to_vectorstore(["tidal pool survey"], doc_id="sea")
+    assert second.embedded == 1  # only the new chunk
+    assert search_vector_db("glacier melt", k=2) == expected
+
+    other = CountingEmbedder(dimension=32)  # different embedder: persisted rows are discarded
+    init_vectorstore(directory, persist=True, retrieval_mode="dense", embedder=other)
+    assert other.embedded == 3
+    assert search_vector_db("tidal pool", k=1)[0]["metadata"]["doc_id"] == "sea"
+
+def test_chunk_store_vectors_stay_a_prefix(tmp_path):
+    """Test persisted embeddings skip rows already on disk and never leave a gap"""
+    store = ChunkStore(str(tmp_path / "store"))
+    store.append([(f"c{i}", f"text {i}", {}) for i in range(4)])
+    store.bind_vectors("test", 2)
+    vectors = np.arange(8, dtype=np.float32).reshape(4, 2)
+    store.append_vectors(2, vectors[2:])  # would leave rows 0-1 missing
+    assert store.vector_count() == 0
+    store.append_vectors(0, vectors[:3])
+    store.append_vectors(1, vectors[1:])  # rows 1-2 already written by a "sibling"
+    assert store.vector_count() == 4
+    assert np.array_equal(store.get_vectors(range(0, 4)), vectors)
+    assert np.array_equal(store.get_vectors([3, 1]), vectors[[3, 1]])
+
+def test_ivf_index_type_end_to_end():
+    """Test dense retrieval through the IVF index type"""
+    init_vectorstore(persist=False, retrieval_mode="dense", index_type="ivf",
+                     embedder=HashingEmbedder(dimension=64))
+    add_to_vectorstore(["glacier melt measurements", "volcano eruption history"], doc_id="geo")
+    results = search_vector_db("glacier melt", k=1)
+    assert results[0]["content"] == "glacier melt measurements"
+
+def test_ivf_trains_outside_the_index_lock(monkeypatch):
+    """Test k-means runs while searches can still take the index lock"""
+    from concurrent.futures import ThreadPoolExecutor
+    from services import ann_index
+
+    init_vectorstore(persist=False, retrieval_mode="dense", index_type="ivf",
+                     embedder=HashingEmbedder(dimension=64))
+    vector_service._dense.nlist = 2  # train after 32 chunks
+    lock_free = []
+
+    def reader_can_lock():
+        if not vector_service._lock.acquire(blocking=False):
+            return False
+        vector_service._lock.release()
+        return True
+
+    def watched_kmeans(*args, **kwargs):
+        with ThreadPoolExecutor(1) as pool:
+            lock_free.append(pool.submit(reader_can_lock).result())
+        return real_kmeans(*args, **kwargs)
+
+    real_kmeans = ann_index.kmeans
+    monkeypatch.setattr(ann_index, "kmeans", watched_kmeans)
+    add_to_vectorstore([f"field note {i} on {['lichen', 'moss', 'fern'][i % 3]}" for i in range(40)], doc_id="bio")
+    assert lock_free == [True]
+    assert vector_service._dense.is_trained and len(vector_service._dense) == 40
+    assert "lichen" in search_vector_db("field note on lichen", k=1)[0]["content"]
+
+def test_quantized_dense_mode_end_to_end():
+    """Test dense retrieval with int8 storage, forced past training"""
+    init_vectorstore(persist=False, retrieval_mode="dense", quantization="int8",
+                     embedder=HashingEmbedder(dimension=64))
+    vector_service._dense.train_size = 2
+    add_to_vectorstore(["coral reef bleaching", "desert dune formation", "coral spawning"], doc_id="sea")
+    assert vector_service._dense._pending is None
+
+    results = search_vector_db("coral reef", k=2)
+    assert results[0]["content"] == "coral reef bleaching"
+
+def test_inverted_index_ranges_restrict_scoring():
+    """Test range-restricted BM25 only scores chunks inside the spans"""
+    index = InvertedIndex()
+    for i in range(6):
+        index.add(i, f"shared token {i}")
+    hits = index.search("shared", k=10, ranges=[(1, 3), (5, 6)])
+    assert sorted(chunk_id for chunk_id, _ in hits) == [1, 2, 5]
+
+def test_multi_document_scope_bm25_and_dense():
+    """Test list-of-doc_ids scoping in both retrieval modes"""
+    for mode in ("bm25", "dense"):
+        init_vectorstore(persist=False, retrieval_mode=mode, embedder=HashingEmbedder(dimension=64))
+        add_to_vectorstore(["lighthouse keeper diary"], doc_id="a")
+        add_to_vectorstore(["lighthouse construction"], doc_id="b")
+        add_to_vectorstore(["lighthouse lens optics"], doc_id="c")
+        add_to_vectorstore(["more lighthouse notes"], doc_id="a")
+
+        results = search_vector_db("lighthouse", k=10, doc_id=["a", "c"])
+        assert sorted(r["metadata"]["doc_id"] for r in results) == ["a", "a", "c"]
+        assert search_vector_db("lighthouse", k=10, doc_id=["missing"]) == []
+
+def test_batch_search_matches_per_query_search():
+    """Test batch search returns each query's own results, in order, in both retrieval modes"""
+    for mode in ("bm25", "dense"):
+        init_vectorstore(persist=False, retrieval_mode=mode, embedder=HashingEmbedder(dimension=64))
+        add_to_vectorstore(["otter dens by the river", "otter diet of fish"], doc_id="otters")
+        add_to_vectorstore(["heron nesting colonies", "heron fishing in shallows"], doc_id="herons")
+
+        queries = ["otter diet", "heron fishing", "heron nesting", "otter diet"]
+        ks = [1, 2, 5, 1]
+        scopes = [None, "herons", ["otters"], "missing"]
+        batch = search_vector_db_batch(queries, ks, scopes)
+        assert batch == [search_vector_db(query, k=k, doc_id=scope)
+                         for query, k, scope in zip(queries, ks, scopes)]
+        assert batch[3] == [] and len(batch[1]) == 2
+        assert all(r["metadata"]["doc_id"] == "otters" for r in batch[2])
+
+def test_hash_index_finds_documents_by_content_hash(tmp_path):
+    """Test pdf_hash lookups are served from the hash index and survive reopen"""
+    directory = str(tmp_path / "hashes")
+    init_vectorstore(directory, persist=True)
+    add_to_vectorstore(["some text"], doc_id="doc-1", pdf_hash="abc123")
+    assert get_doc_id_by_hash("abc123") == "doc-1"
+    assert is_pdf_exists("abc123")
+    assert not is_pdf_exists("other")
+
+    init_vectorstore(directory, persist=True)
+    assert get_doc_id_by_hash("abc123") == "doc-1"
+
+@pytest.mark.parametrize("mode", ["bm25", "dense"])
+def test_purged_document_is_hidden_until_retried(tmp_path, mode):
+    """Test tombstoned chunks leave search, partitions and the hash index, also after reopen"""
+    directory = str(tmp_path / "purge")
+    init_vectorstore(directory, persist=True, retrieval_mode=mode, embedder=HashingEmbedder(dimension=64))
+    add_to_vectorstore(["partial walrus chunk", "partial walrus tusk"], doc_id="doc-x", pdf_hash="dup")
+    add_to_vectorstore(["complete walrus chunk"], doc_id="doc-y", pdf_hash="dup")
+    assert get_doc_id_by_hash("dup") == "doc-x"
+
+    assert vector_service.purge_document("doc-x") == 2
+    assert [r["metadata"]["doc_id"] for r in search_vector_db("walrus", k=5)] == ["doc-y"]
+    assert search_vector_db("walrus", k=5, doc_id="doc-x") == []
+    assert vector_service.get_document_chunk_count("doc-x") == 0
+    assert get_doc_id_by_hash("dup") == "doc-y"
+    assert search_vector_db_batch(["walrus"], [5]) == [search_vector_db("walrus", k=5)]
+
+    add_to_vectorstore(["retried walrus chunk"], doc_id="doc-x", pdf_hash="dup")
+    init_vectorstore(directory, persist=True, retrieval_mode=mode, embedder=HashingEmbedder(dimension=64))
+    assert vector_service.get_document_chunk_count("doc-x") == 1
+    assert {r["content"] for r in search_vector_db("walrus", k=5)} == {"complete walrus chunk",
+                                                                        "retried walrus chunk"}
+
+def test_chunks_purged_during_a_rebuild_stay_purged(tmp_path):
+    """Test a document purged after the rebuild copied it is tombstoned in the swapped-in store"""
+    directory = str(tmp_path / "live")
+    init_vectorstore(directory, persist=True)
+    add_to_vectorstore(["finished ibis chunk"], doc_id="done")
+    add_to_vectorstore(["partial ibis chunk", "partial ibis notes"], doc_id="partial")
+
+    staging = vector_service.open_staging_store()
+    seen = vector_service.tombstone_count()
+    copied_until = vector_service.copy_chunks(staging, lambda metadata: True)
+    vector_service.purge_document("partial")
+    vector_service.swap_vectorstore(staging, lambda metadata: True, copied_until, seen)
+
+    assert [r["metadata"]["doc_id"] for r in search_vector_db("ibis", k=5)] == ["done"]
+    init_vectorstore(directory, persist=True)
+    assert vector_service.get_document_chunk_count("partial") == 0
+
+def test_refresh_vectorstore_reopens_swapped_store(tmp_path):
+    """Test a process notices a store rebuilt and swapped in by a sibling"""
+    directory = str(tmp_path / "shared")
+    init_vectorstore(directory, persist=True)
+    add_to_vectorstore(["old wombat chunk"], doc_id="old")
+
+    rebuilt = ChunkStore(str(tmp_path / "rebuilt"))
+    rebuilt.append([("new_0", "rebuilt wombat chunk", {"doc_id": "new"})])
+    rebuilt.close()
+    os.replace(directory, str(tmp_path / "retired"))
+    os.replace(str(tmp_path / "rebuilt"), directory)
+
+    assert vector_service._get_store().is_replaced()
+    refresh_vectorstore()
+    assert [r["metadata"]["doc_id"] for r in search_vector_db("wombat", k=5)] == ["new"]
+
+def test_append_to_replaced_store_goes_to_the_new_one(tmp_path):
+    """Test a writer of a swapped-out store gets StoreReplaced and add_to_vectorstore reopens"""
+    directory = str(tmp_path / "shared")
+    init_vectorstore(directory, persist=True)
+    add_to_vectorstore(["old lemur chunk"], doc_id="old")
+    retired_handle = vector_service._get_store()
+
+    rebuilt = ChunkStore(str(tmp_path / "rebuilt"))
+    rebuilt.append([("new_0", "rebuilt lemur chunk", {"doc_id": "new"})])
+    rebuilt.close()
+    os.replace(directory, str(tmp_path / "retired"))
+    os.replace(str(tmp_path / "rebuilt"), directory)
+
+    with pytest.raises(StoreReplaced):
+        retired_handle.append([("late_0", "late lemur chunk", {"doc_id": "late"})])
+    assert add_to_vectorstore(["late lemur chunk"], doc_id="late")["success"]
+    assert len(ChunkStore(directory)) == 2
+    assert sorted(r["metadata"]["doc_id"] for r in search_vector_db("lemur", k=5)) == ["late", "new"]
+
+def test_swap_keeps_serving_searches_while_indexing(tmp_path, monkeypatch):
+    """Test searches answer from the old indexes while a swapped-in store is indexed"""
+    import threading
+    init_vectorstore(str(tmp_path / "live"), persist=True)
+    add_to_vectorstore(["old gibbon chunk"], doc_id="old")
+    staging = vector_service.open_staging_store()
+    vector_service.append_staging(staging, [("new_0", "rebuilt gibbon chunk", {"doc_id": "new"})])
+
+    building, release = threading.Event(), threading.Event()
+    index_pending = vector_service._index_pending
+
+    def slow_index_pending(indexes, lock):
+        if indexes["store"] is not vector_service._documents_store:
+            building.set()
+            release.wait(5)
+        index_pending(indexes, lock)
+
+    monkeypatch.setattr(vector_service, "_index_pending", slow_index_pending)
+    swap = threading.Thread(target=vector_service.swap_vectorstore, args=(staging, lambda metadata: False, 1))
+    swap.start()
+    assert building.wait(5)
+    found = []
+    search = threading.Thread(target=lambda: found.extend(search_vector_db("gibbon", k=5)))
+    search.start()
+    search.join(2)
+    assert not search.is_alive()
+    assert [r["metadata"]["doc_id"] for r in found] == ["old"]
+
+    release.set()
+    swap.join(5)
+    assert [r["metadata"]["doc_id"] for r in search_vector_db("gibbon", k=5)] == ["new"]